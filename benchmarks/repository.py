@@ -0,0 +1,237 @@
+"""
+Micro-benchmarks of the disk repository and the disk manager.
+
+Every case runs in a fresh process against a local stand-in for the object storage, so the peak RSS reported belongs
+to that case alone. Results can be stored as a baseline and later runs compared against it:
+
+    python benchmarks/repository.py --save
+    python benchmarks/repository.py --compare
+
+Baselines are only comparable between runs on the same machine and with the same options.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+import argparse
+import asyncio
+import json
+import multiprocessing
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from httpdisk.libraries.object_storage.in_memory_storage import InMemoryObjectStorage  # noqa: E402
+from httpdisk.libraries.object_storage.local_fs_storage import LocalFsStorage  # noqa: E402
+from httpdisk.models.disk_deletion import DiskDeletionState  # noqa: E402
+from httpdisk.repositories.disk.azure_disk import AzureDiskRepository  # noqa: E402
+from httpdisk.repositories.disk.azure_disk_manager import AzureDiskManager  # noqa: E402
+
+Operation = Callable[[int], Awaitable[Any]]
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+KiB = 1024
+MiB = 1024 * KiB
+
+# (operation, object size, number of objects on the disk, iterations or None for the default)
+CASES: list[tuple[str, int, int, int | None]] = [
+    ("get_object", 1 * KiB, 10, None),
+    ("get_object", 64 * KiB, 10, None),
+    ("get_object", 1 * MiB, 10, None),
+    ("get_object", 1 * KiB, 1000, None),
+    ("create_object", 1 * KiB, 10, None),
+    ("create_object", 64 * KiB, 10, None),
+    ("create_object", 1 * MiB, 10, None),
+    ("create_object", 1 * KiB, 1000, None),
+    ("list_objects", 1 * KiB, 10, None),
+    ("list_objects", 1 * KiB, 1000, None),
+    ("list_objects", 1 * KiB, 10000, 20),
+    ("get_used_total_space", 1 * KiB, 10, None),
+    ("get_used_total_space", 1 * KiB, 1000, None),
+    ("create_disk", 0, 0, None),
+    ("if_exists", 0, 1000, None),
+    ("delete_disk", 1 * KiB, 10, None),
+    ("delete_disk", 1 * KiB, 1000, 20),
+]
+
+
+def case_id(operation: str, size: int, population: int) -> str:
+    """
+    Names a case, e.g. "get_object[size=64KiB,population=10]".
+    """
+    if size >= MiB:
+        label = f"{size // MiB}MiB"
+    elif size >= KiB:
+        label = f"{size // KiB}KiB"
+    else:
+        label = f"{size}B"
+    return f"{operation}[size={label},population={population}]"
+
+
+async def populate(repository: AzureDiskRepository, manager: AzureDiskManager, user_id: str, size: int, count: int):
+    await manager.create_disk(user_id, "benchmark@example.com")
+    data = b"x" * size
+    for i in range(count):
+        await repository.create_object(f"{user_id}/object-{i:06}", data)
+
+
+async def prepare(
+    operation: str, size: int, population: int, repository: AzureDiskRepository, manager: AzureDiskManager
+) -> tuple[Operation, Operation | None]:
+    """
+    Sets up the storage for a case and returns the operation to measure, given the iteration number, along with
+    the work to do before every iteration without the clock running, such as filling the disk a deletion empties.
+    """
+    if operation in ("get_object", "create_object", "list_objects", "get_used_total_space"):
+        await populate(repository, manager, "user", size, population)
+    data = b"x" * size
+
+    if operation == "get_object":
+        return (lambda i: repository.get_object(f"user/object-{i % population:06}"), None)
+    if operation == "create_object":
+        return (lambda i: repository.create_object(f"user/new-{i:06}", data), None)
+    if operation == "list_objects":
+        return (lambda i: repository.list_objects("user"), None)
+    if operation == "get_used_total_space":
+        return (lambda i: repository.get_used_total_space("user"), None)
+    if operation == "create_disk":
+        return (lambda i: manager.create_disk(f"user-{i:06}", "benchmark@example.com"), None)
+    if operation == "if_exists":
+        for i in range(population):
+            await manager.create_disk(f"user-{i:06}", "benchmark@example.com")
+        manager.existence_cache.clear()
+        return (lambda i: manager.if_exists(f"user-{i % population:06}"), None)
+    if operation == "delete_disk":
+
+        async def delete(i: int) -> None:
+            user_id = f"user-{i:06}"
+            await manager.delete_disk(user_id)
+            while True:
+                status = await manager.get_deletion_status(user_id)
+                if status is None or status.state == DiskDeletionState.COMPLETED:
+                    return
+                if status.state == DiskDeletionState.FAILED:
+                    raise RuntimeError(f"Deletion of {user_id} failed: {status.error}")
+                await asyncio.sleep(0)
+
+        return (delete, lambda i: populate(repository, manager, f"user-{i:06}", size, population))
+    raise ValueError(f"Unknown operation: {operation}")
+
+
+async def measure(operation: str, size: int, population: int, iterations: int, options: dict) -> dict:
+    with tempfile.TemporaryDirectory() as root:
+        if options["backend"] == "local":
+            storage = LocalFsStorage(root)
+        else:
+            storage = InMemoryObjectStorage(latency=options["latency"], seed=0)
+        async for _ in storage.context():
+            break
+        repository = AzureDiskRepository(storage)
+        manager = AzureDiskManager(storage, repository.listing_cache, metadata_cache=repository.metadata_cache)
+        run, setup = await prepare(operation, size, population, repository, manager)
+
+        latencies = []
+        for i in range(options["warmup"]):
+            if setup is not None:
+                await setup(iterations + i)
+            await run(iterations + i)
+        for i in range(iterations):
+            if setup is not None:
+                await setup(i)
+            start = time.perf_counter_ns()
+            await run(i)
+            latencies.append(time.perf_counter_ns() - start)
+
+    total = sum(latencies) / 1e9
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "iterations": iterations,
+        "ops_per_second": iterations / total if total else float("inf"),
+        "p50_ms": quantiles[49] / 1e6,
+        "p99_ms": quantiles[98] / 1e6,
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / KiB,
+    }
+
+
+def run_case(operation: str, size: int, population: int, iterations: int, options: dict) -> dict:
+    return asyncio.run(measure(operation, size, population, iterations, options))
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Lists the cases whose median latency or throughput regressed by more than the tolerance against the baseline.
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline["cases"].get(name)
+        if previous is None:
+            continue
+        if result["p50_ms"] > previous["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {previous['p50_ms']:.3f} ms -> {result['p50_ms']:.3f} ms")
+        if result["ops_per_second"] < previous["ops_per_second"] / (1 + tolerance):
+            regressions.append(
+                f"{name}: throughput {previous['ops_per_second']:.0f} -> {result['ops_per_second']:.0f} ops/s"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backend", choices=("memory", "local"), default="memory")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated storage round trip, in seconds")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--filter", default="", help="only run the cases whose name contains this string")
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="fail if the results regressed against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    arguments = parser.parse_args()
+    options = {"backend": arguments.backend, "latency": arguments.latency, "warmup": arguments.warmup}
+
+    results = {}
+    print(f"{'case':<50} {'ops/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'rss MiB':>8}")
+    for operation, size, population, iterations in CASES:
+        name = case_id(operation, size, population)
+        if arguments.filter not in name:
+            continue
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            result = executor.submit(
+                run_case, operation, size, population, iterations or arguments.iterations, options
+            ).result()
+        results[name] = result
+        print(
+            f"{name:<50} {result['ops_per_second']:>10.0f} {result['p50_ms']:>9.3f} "
+            f"{result['p99_ms']:>9.3f} {result['peak_rss_mib']:>8.1f}"
+        )
+
+    if arguments.save:
+        baseline = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "options": options,
+            "cases": results,
+        }
+        arguments.baseline.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"Baseline stored in {arguments.baseline}")
+    if arguments.compare:
+        baseline = json.loads(arguments.baseline.read_text())
+        if baseline.get("options") != options:
+            print("The baseline was recorded with different options, the comparison is not meaningful")
+            return 1
+        regressions = compare(results, baseline, arguments.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
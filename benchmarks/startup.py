@@ -0,0 +1,145 @@
+"""
+Startup benchmark of the application, from starting the process to the first request served.
+
+Every run starts the server in a fresh process against the in-memory object storage and polls it until it answers,
+then reads the startup phases the server recorded itself from /metrics. Results can be stored as a baseline and
+later runs compared against it:
+
+    python benchmarks/startup.py --save
+    python benchmarks/startup.py --compare
+
+Baselines are only comparable between runs on the same machine.
+"""
+
+from pathlib import Path
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parents[1]
+BASELINE = Path(__file__).resolve().parent / "startup.json"
+SERVER = "from httpdisk.__main__ import start_server; start_server()"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def get(port: int, path: str) -> tuple[int, str]:
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        return response.status, response.read().decode()
+    finally:
+        connection.close()
+
+
+def startup_phases(metrics: str) -> dict[str, float]:
+    """
+    Reads the startup phases from the Prometheus exposition of the server, e.g. {"ready": 0.61}.
+    """
+    phases = {}
+    for line in metrics.splitlines():
+        if line.startswith('httpdisk_startup_seconds{phase="'):
+            labels, value = line.rsplit(" ", 1)
+            phases[labels.split('"')[1]] = float(value)
+    return phases
+
+
+def run_once(timeout: float) -> dict[str, float]:
+    """
+    Starts the server and returns the time until it first answered, along with the phases it recorded.
+    """
+    port = free_port()
+    environment = {
+        **os.environ,
+        "OBJECT_STORAGE": "memory",
+        "API_PORT": str(port),
+        "PYTHONPATH": str(ROOT / "src"),
+    }
+    environment.pop("APPLICATIONINSIGHTS_CONNECTION_STRING", None)
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-c", SERVER],
+        cwd=ROOT / "src" / "httpdisk",
+        env=environment,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f"The server did not answer within {timeout} seconds")
+            if server.poll() is not None:
+                raise RuntimeError(f"The server exited with code {server.returncode}")
+            try:
+                status, _ = get(port, "/metrics")
+            except OSError:
+                time.sleep(0.005)
+                continue
+            if status == 200:
+                break
+        result = {"process_to_first_response": time.perf_counter() - start}
+        _, metrics = get(port, "/metrics")
+        result.update(startup_phases(metrics))
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Lists the measurements whose median regressed by more than the tolerance against the baseline.
+    """
+    regressions = []
+    for name, seconds in results.items():
+        previous = baseline["results"].get(name)
+        if previous is not None and seconds > previous * (1 + tolerance):
+            regressions.append(f"{name}: {previous * 1000:.0f} ms -> {seconds * 1000:.0f} ms")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for the server to answer")
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="fail if the results regressed against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    arguments = parser.parse_args()
+
+    runs = [run_once(arguments.timeout) for _ in range(arguments.runs)]
+    results = {name: statistics.median(run[name] for run in runs) for name in runs[0]}
+    print(f"{'measurement':<30} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+    for name, median in results.items():
+        values = [run[name] for run in runs]
+        print(f"{name:<30} {median * 1000:>10.0f} {min(values) * 1000:>10.0f} {max(values) * 1000:>10.0f}")
+
+    if arguments.save:
+        baseline = {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+        arguments.baseline.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"Baseline stored in {arguments.baseline}")
+    if arguments.compare:
+        regressions = compare(results, json.loads(arguments.baseline.read_text()), arguments.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,37 +1,125 @@
-import uvicorn
-import os
-from fastapi import FastAPI
-from .controllers.user_controller import router as user_router
-from .controllers.disk_controller import router as disk_router
-from .controllers.file_controller import router as file_router
-from .controllers.landing import router as landing_router
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncGenerator, cast
+import asyncio
+import datetime
+import json
 import logging
-from fastapi.staticfiles import StaticFiles
-from .dependencies.dev import initialize
-from azure.monitor.opentelemetry import configure_azure_monitor
+import os
+import tempfile
+import time
+
+if TYPE_CHECKING:
+    from fastapi import FastAPI
+
+# Taken before main() imports the application, so the startup phases recorded below include that import.
+STARTED = time.perf_counter()
 
-configure_azure_monitor()
 logging.basicConfig(level=logging.INFO)
 
-from contextlib import asynccontextmanager
-from .injector import Injector
+# Cache-Control of each route, by path template. Files are revalidated through their ETag on every use.
+CACHE_POLICIES = {
+    "/file/{filename}": "private, no-cache",
+    "/api/disk/files": "private, no-store",
+    "/api/disk/archive": "private, no-store",
+    "/api/disk/deletion": "no-store",
+    "/api/uploads/{session_id}": "no-store",
+    "/stats/caches": "no-store",
+    "/stats/pools": "no-store",
+    "/metrics": "no-store",
+    **json.loads(os.getenv("CACHE_POLICIES", "{}")),
+}
+
 
 @asynccontextmanager
-async def lifespan(app: FastAPI):
+async def lifespan(app: "FastAPI") -> AsyncGenerator[None, None]:
+    from .injector import Injector
+    from .libraries.metrics.metrics import record_startup
+
     await Injector._application_startup()
+    record_startup("ready", time.perf_counter() - STARTED)
+    logging.getLogger(__name__).info(
+        {
+            "time": datetime.datetime.now(),
+            "message": "Worker started",
+            "pid": os.getpid(),
+            "loop": type(asyncio.get_running_loop()).__module__,
+        }
+    )
     yield
     await Injector._application_shutdown()
 
 def main():
+    """
+    Builds the application and its dependencies. The server calls it once in every worker process, so each worker
+    has its own clients, caches and background tasks.
+
+    The application is imported here rather than along with this module, so the process running the server does not
+    import it, and the time the import takes is recorded as the "imported" startup phase.
+
+    Returns:
+        FastAPI: The application.
+    """
+    from fastapi import FastAPI
+    from fastapi.staticfiles import StaticFiles
+    from .controllers.user_controller import router as user_router
+    from .controllers.disk_controller import router as disk_router
+    from .controllers.file_controller import router as file_router
+    from .controllers.landing import router as landing_router
+    from .controllers.stats_controller import router as stats_router
+    from .controllers.upload_controller import router as upload_router
+    from .dependencies.dev import initialize
+    from .libraries.http.cache_policy import CachePolicyMiddleware
+    from .libraries.http.errors import invalid_path_handler, storage_unavailable_handler
+    from .libraries.http.metrics import MetricsMiddleware
+    from .libraries.metrics.metrics import record_startup
+    from .libraries.object_storage.exceptions import InvalidPathError, StorageUnavailableError
+
+    record_startup("imported", time.perf_counter() - STARTED)
     initialize()
     app = FastAPI(lifespan=lifespan)
+    app.add_middleware(CachePolicyMiddleware, policies=CACHE_POLICIES, default=os.getenv("CACHE_POLICY_DEFAULT"))
+    app.add_middleware(MetricsMiddleware, started=STARTED)
+    app.add_exception_handler(StorageUnavailableError, storage_unavailable_handler)
+    app.add_exception_handler(InvalidPathError, invalid_path_handler)
     app.mount("/templates", StaticFiles(directory="templates"), name="templates")
     app.include_router(user_router)
     app.include_router(disk_router)
     app.include_router(file_router)
     app.include_router(landing_router)
+    app.include_router(stats_router)
+    app.include_router(upload_router)
     return app
 
 def start_server():
-    port = int(os.getenv("API_PORT", 8000))
-    uvicorn.run(main(), host="0.0.0.0", port=port, reload=False)
+    """
+    Runs the server in SERVER_WORKERS processes, each building its own application through main().
+
+    Workers share the storage only: the caches of each worker are turned off, or revalidated on every use, by default
+    when there are several, and their metrics are shared through METRICS_DIR, a temporary directory unless set, so
+    /metrics reports those of every worker. /stats/caches and /stats/pools report the worker answering the request.
+    Disk deletions are resumed by a single worker, as every job leases its marker.
+
+    The event loop and HTTP parser default to uvloop and httptools when they are installed, and can be chosen with
+    SERVER_LOOP and SERVER_HTTP. On SIGINT or SIGTERM every worker stops accepting connections and waits up to
+    SERVER_SHUTDOWN_TIMEOUT seconds for the requests in flight, streamed uploads and downloads included, before its
+    dependencies are shut down.
+    """
+    import uvicorn
+    from uvicorn.config import HTTPProtocolType, LoopSetupType
+
+    workers = int(os.getenv("SERVER_WORKERS", 1))
+    if workers > 1:
+        # Inherited by the worker processes.
+        os.environ.setdefault("METRICS_DIR", tempfile.mkdtemp(prefix="httpdisk-metrics-"))
+    uvicorn.run(
+        f"{__name__}:main",
+        factory=True,
+        host="0.0.0.0",
+        port=int(os.getenv("API_PORT", 8000)),
+        workers=workers,
+        # Unknown values are rejected by uvicorn.
+        loop=cast(LoopSetupType, os.getenv("SERVER_LOOP", "auto")),
+        http=cast(HTTPProtocolType, os.getenv("SERVER_HTTP", "auto")),
+        timeout_graceful_shutdown=int(os.getenv("SERVER_SHUTDOWN_TIMEOUT", 30)),
+        reload=False,
+    )
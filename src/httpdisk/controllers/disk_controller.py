@@ -1,23 +1,30 @@
 from fastapi.routing import APIRouter
-from fastapi import Depends, Request
-from ..security.user import get_logged_user
-from fastapi_sso.sso.base import OpenID
+from fastapi import Depends, Request, Query, HTTPException
+from ..security.user import LoggedUser, get_logged_user
 from ..helpers.disk import create_disk as create_disk_helper
 from ..helpers.disk import check_disk as check_disk_helper
-from ..helpers.disk import list_disk_elements
-from fastapi.templating import Jinja2Templates
+from ..helpers.disk import list_disk_page
+from ..helpers.disk import delete_disk as delete_disk_helper
+from ..helpers.disk import get_disk_deletion_status
+from ..helpers.disk import stream_disk_archive, is_archivable
+from ..models.disk_deletion import DiskDeletionStatus
+from fastapi.responses import JSONResponse, StreamingResponse
+import starlette.status as status
+from ..libraries.object_storage.models import ObjectPage
+from ..libraries.http.templates import get_templates
 import logging
 import datetime
+import urllib.parse
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-templates = Jinja2Templates(directory="templates")
+DISK_PAGE_SIZE = 100
 
 
 @router.post("/disk")
 async def create_disk(
-    user: OpenID = Depends(get_logged_user),
+    user: LoggedUser = Depends(get_logged_user),
 ):
     """
     Create a disk for the logged-in user.
@@ -35,6 +42,45 @@ async def create_disk(
     response = await create_disk_helper(user.id, user.email)
     return response
 
+@router.delete("/disk")
+async def delete_disk(user: LoggedUser = Depends(get_logged_user)) -> JSONResponse:
+    """
+    Start deleting the logged-in user's disk in the background.
+
+    Parameters:
+    - user: The logged-in user's OpenID.
+
+    Returns:
+    - A 202 response with the progress of the deletion, which can be followed at /api/disk/deletion, or 404 if the
+      user has no disk.
+    """
+    logger.info({
+            "time": datetime.datetime.now(),
+            "message": "Deleting disk for user",
+        })
+    if not await check_disk_helper(user.id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Disk not found")
+    deletion = await delete_disk_helper(user.id)
+    if deletion is None:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Disk not deleted")
+    return JSONResponse(content=deletion.model_dump(mode="json"), status_code=status.HTTP_202_ACCEPTED)
+
+@router.get("/api/disk/deletion")
+async def read_disk_deletion(user: LoggedUser = Depends(get_logged_user)) -> DiskDeletionStatus:
+    """
+    Report the progress of the deletion of the logged-in user's disk.
+
+    Parameters:
+    - user: The logged-in user's OpenID.
+
+    Returns:
+    - The state of the deletion and the number of objects deleted so far.
+    """
+    deletion = await get_disk_deletion_status(user.id)
+    if deletion is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No disk deletion in progress")
+    return deletion
+
 @router.get("/upload")
 async def upload_file_form(request: Request):
     """
@@ -46,23 +92,90 @@ async def upload_file_form(request: Request):
     Returns:
     - TemplateResponse: The response containing the rendered upload file form.
     """
-    return templates.TemplateResponse("upload_file_form.html", context={"request": request})
+    return get_templates().TemplateResponse("upload_file_form.html", context={"request": request})
 
 @router.get("/disk")
-async def read_disk(request: Request, user: OpenID = Depends(get_logged_user)):
+async def read_disk(request: Request, cursor: str | None = None, user: LoggedUser = Depends(get_logged_user)):
     """
-    Read the disk contents for a specific user.
+    Read the disk contents for a specific user, one page at a time.
 
     Args:
         request (Request): The incoming request object.
-        user (OpenID): The logged-in user.
+        cursor (str | None): The continuation token of the page to render. Defaults to the first page.
+        user (LoggedUser): The logged-in user.
 
     Returns:
         TemplateResponse: The template response containing the disk contents or the create disk form.
+
+    Raises:
+        HTTPException: If the continuation token is invalid.
     """
     exists = await check_disk_helper(user.id)
     if exists:
-        elements = await list_disk_elements(user.id)
-        return templates.TemplateResponse("disk.html", context={"request": request, "elements": elements})
-    return templates.TemplateResponse("create_disk_form.html", context={"request": request})
+        try:
+            page = await list_disk_page(user.id, DISK_PAGE_SIZE, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor") from e
+        return get_templates().TemplateResponse(
+            "disk.html", context={"request": request, "elements": page.items, "cursor": page.cursor}
+        )
+    return get_templates().TemplateResponse("create_disk_form.html", context={"request": request})
+
+@router.get("/api/disk/files")
+async def list_disk_files(
+    limit: int = Query(DISK_PAGE_SIZE, ge=1, le=5000),
+    cursor: str | None = None,
+    user: LoggedUser = Depends(get_logged_user),
+) -> ObjectPage:
+    """
+    List a single page of the files on the user's disk.
+
+    Args:
+        limit (int): The maximum number of files on the page.
+        cursor (str | None): The continuation token returned with the previous page. Defaults to the first page.
+        user (LoggedUser): The logged-in user.
+
+    Returns:
+        ObjectPage: The name, size, etag and last modification time of every file on the page, and the continuation
+            token of the next page, or None if this is the last page.
+
+    Raises:
+        HTTPException: If the continuation token is invalid.
+    """
+    try:
+        return await list_disk_page(user.id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor") from e
+
+@router.get("/api/disk/archive", response_class=StreamingResponse)
+async def download_disk_archive(
+    file: list[str] | None = Query(None),
+    folder: str = "",
+    user: LoggedUser = Depends(get_logged_user),
+) -> StreamingResponse:
+    """
+    Download the selected files, or every file in a folder of the user's disk, as a single ZIP archive.
 
+    The archive is streamed while it is being written, so it has no Content-Length and starts before all of the files
+    are listed.
+
+    Args:
+        file (list[str] | None): The names of the files to archive, repeated once per file. Defaults to every file in
+            the folder.
+        folder (str): The folder to archive if no files are selected. Defaults to the whole disk.
+        user (LoggedUser): The logged-in user.
+
+    Returns:
+        StreamingResponse: The ZIP archive, as an attachment named after the folder.
+
+    Raises:
+        HTTPException: If a file or folder name is not a plain relative path, or the user has no disk.
+    """
+    folder_name = folder.strip("/")
+    if any(not is_archivable(name) for name in file or []) or (folder_name and not is_archivable(folder_name)):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid filename")
+    if not await check_disk_helper(user.id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Disk not found")
+    name = folder.strip("/").rsplit("/", 1)[-1] or "disk"
+    headers = {"Content-Disposition": f"attachment; filename*=UTF-8''{urllib.parse.quote(name)}.zip"}
+    return StreamingResponse(stream_disk_archive(user.id, file, folder), headers=headers, media_type="application/zip")
@@ -1,10 +1,22 @@
 from fastapi.routing import APIRouter
-from fastapi import UploadFile, Depends, Request, File, Form
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import RedirectResponse, Response
-from ..security.user import get_logged_user
-from fastapi_sso.sso.base import OpenID
-from ..helpers.file import upload_file, delete_file, get_file
+from fastapi import UploadFile, Depends, Request, File, Form, HTTPException
+from ..libraries.http.templates import get_templates
+from fastapi.responses import RedirectResponse, Response, StreamingResponse, JSONResponse, FileResponse
+from ..security.user import LoggedUser, get_logged_user
+from ..models.file import UploadStatus
+from ..libraries.object_storage.paths import is_valid_path
+from ..helpers.file import (
+    upload_files,
+    delete_file,
+    get_file_stream,
+    get_file_properties,
+    parse_range_header,
+    accepts_encoding,
+    validator_headers,
+    is_not_modified,
+    if_range_matches,
+)
+from starlette.background import BackgroundTask
 import starlette.status as status
 
 from typing import Optional
@@ -13,62 +25,144 @@ import logging
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-templates = Jinja2Templates(directory="templates")
-
 @router.post("/upload")
-async def upload_file_endpoint(request: Request, files: list[UploadFile] = File(...), filenames: list[Optional[str]] = Form(...), user: OpenID = Depends(get_logged_user)):
+async def upload_file_endpoint(
+    request: Request,
+    files: list[UploadFile] = File(...),
+    filenames: list[Optional[str]] = Form(...),
+    user: LoggedUser = Depends(get_logged_user),
+):
     """
-    Uploads files to the server.
+    Uploads files to the server concurrently.
 
     Args:
         request (Request): The incoming request object.
         files (list[UploadFile]): The list of files to be uploaded.
         filenames (list[Optional[str]]): The list of optional filenames for the files.
-        user (OpenID): The logged-in user.
+        user (LoggedUser): The logged-in user.
 
     Returns:
-        TemplateResponse: The response containing the rendered template.
+        TemplateResponse | JSONResponse: The rendered template with the result of every upload, or the results as JSON
+            if the client accepts it. The status is 207 Multi-Status if any of the uploads did not succeed.
     """
+    uploads = []
     for idx, file in enumerate(files):
-        if not filenames[idx]:
-            filename = file.filename
-        else:
-            filename = filenames[idx]
+        filename = filenames[idx] if idx < len(filenames) else None
+        # A file sent without any name is rejected as an invalid name.
+        uploads.append((file, filename or file.filename or ""))
 
-        result = await upload_file(user.id, file, filename)
+    results = await upload_files(user.id, uploads)
 
-    return templates.TemplateResponse("upload_file_form.html", context={"request": request})
+    status_code = status.HTTP_200_OK
+    if any(r.status != UploadStatus.SUCCESS for r in results):
+        status_code = status.HTTP_207_MULTI_STATUS
+    if "application/json" in request.headers.get("accept", ""):
+        return JSONResponse(content=[r.model_dump(mode="json") for r in results], status_code=status_code)
+    return get_templates().TemplateResponse(
+        "upload_file_form.html", context={"request": request, "results": results}, status_code=status_code
+    )
 
 @router.post("/file/")
-async def delete_file_endpoint(request: Request, filename: str = Form(...), user: OpenID = Depends(get_logged_user)):
+async def delete_file_endpoint(
+    request: Request, filename: str = Form(...), user: LoggedUser = Depends(get_logged_user)
+):
     """
     Delete a file from the disk.
 
     Args:
         request (Request): The incoming request.
         filename (str): The name of the file to be deleted.
-        user (OpenID): The logged-in user.
+        user (LoggedUser): The logged-in user.
 
     Returns:
         RedirectResponse: A redirect response to the "/disk" endpoint.
+
+    Raises:
+        HTTPException: If the filename is not a plain relative path.
     """
-    result = await delete_file(user.id, filename)
-    
+    if not is_valid_path(filename):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid filename")
+    await delete_file(user.id, filename)
     return RedirectResponse("/disk", status_code=status.HTTP_302_FOUND)
 
-@router.get("/file/{filename}", response_class=Response)
-async def get_file_endpoint(request: Request, filename: str, user: OpenID = Depends(get_logged_user)):
+@router.get("/file/{filename}", response_class=StreamingResponse)
+async def get_file_endpoint(request: Request, filename: str, user: LoggedUser = Depends(get_logged_user)):
     """
-    Retrieve a file from the server.
+    Retrieve a file from the server, streaming it chunk by chunk.
+
+    A single-range Range header is answered with 206 Partial Content and only the requested bytes are read from
+    storage. Malformed and multi-range headers are ignored and the whole file is sent. Files the storage keeps on the
+    local file system, cached copies included, are served directly from disk. Whole files the storage keeps compressed
+    are sent compressed, with a Content-Encoding header, to clients that accept the encoding.
+
+    Responses carry the ETag and Last-Modified of the file. If-None-Match and If-Modified-Since are evaluated against
+    the file's properties alone and answered with 304 Not Modified, without reading the file, if the client's copy is
+    current. A Range header is ignored if an If-Range header shows the client's partial copy is outdated.
 
     Args:
         request (Request): The incoming request object.
         filename (str): The name of the file to retrieve.
-        user (OpenID): The logged-in user.
+        user (LoggedUser): The logged-in user.
 
     Returns:
-        Response: The file content as a response object with the appropriate headers.
+        StreamingResponse: The file content as a streaming response with the appropriate headers.
+
+    Raises:
+        HTTPException: If the filename is not a plain relative path, the file does not exist or the requested range
+            cannot be satisfied.
     """
-    result = await get_file(user.id, filename)    
+    if not is_valid_path(filename):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid filename")
+    headers = {"Content-Disposition": "attachment", "Accept-Ranges": "bytes"}
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if range_header or if_none_match is not None or if_modified_since is not None:
+        properties = await get_file_properties(user.id, filename)
+        if properties is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+        if is_not_modified(if_none_match, if_modified_since, properties):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=validator_headers(properties))
+        if range_header and if_range_matches(request.headers.get("if-range"), properties):
+            try:
+                byte_range = parse_range_header(range_header, properties.size)
+            except ValueError:
+                return Response(
+                    status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                    headers={**headers, "Content-Range": f"bytes */{properties.size}"},
+                )
+
+    offset, length = byte_range or (None, None)
+    stream = await get_file_stream(user.id, filename, offset=offset, length=length)
+    if stream is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    headers.update(validator_headers(stream.properties))
+
+    if byte_range is None and stream.local_path is not None:
+        return FileResponse(
+            stream.local_path,
+            headers=headers,
+            media_type="application/octet-stream",
+            background=BackgroundTask(stream.aclose),
+        )
+
+    if byte_range is None and stream.encoding is not None and stream.encoded_chunks is not None:
+        headers["Vary"] = "Accept-Encoding"
+        if accepts_encoding(request.headers.get("accept-encoding"), stream.encoding):
+            headers["Content-Encoding"] = stream.encoding
+            headers["Content-Length"] = str(stream.encoded_length)
+            return StreamingResponse(stream.encoded_chunks, headers=headers, media_type="application/octet-stream")
+
+    headers["Content-Length"] = str(stream.length)
+    if byte_range is None:
+        return StreamingResponse(stream.chunks, headers=headers, media_type="application/octet-stream")
 
-    return Response(result, headers={"Content-Disposition": "attachment"})
\ No newline at end of file
+    last = stream.offset + stream.length - 1
+    headers["Content-Range"] = f"bytes {stream.offset}-{last}/{stream.properties.size}"
+    return StreamingResponse(
+        stream.chunks,
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        headers=headers,
+        media_type="application/octet-stream",
+    )
@@ -2,12 +2,10 @@ from fastapi import Request
 from fastapi.routing import APIRouter
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+from ..libraries.http.templates import get_templates
 
 router = APIRouter()
 
-templates = Jinja2Templates(directory="templates")
-
 @router.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     """
@@ -19,4 +17,4 @@ async def read_root(request: Request):
     Returns:
         TemplateResponse: The rendered HTML template response.
     """
-    return templates.TemplateResponse("index.html", {"request": request})
\ No newline at end of file
+    return get_templates().TemplateResponse("index.html", {"request": request})
\ No newline at end of file
@@ -0,0 +1,41 @@
+from fastapi.routing import APIRouter
+from fastapi.responses import PlainTextResponse
+from ..libraries.cache.ttl_cache import CacheStats, cache_stats
+from ..libraries.http.connection_pool import ConnectionPoolStats, pool_stats
+from ..libraries.metrics.metrics import render_metrics
+
+router = APIRouter()
+
+
+@router.get("/stats/caches")
+async def read_cache_stats() -> dict[str, CacheStats]:
+    """
+    Report the hit, miss and eviction counters of every in-process cache of the worker answering the request.
+
+    Returns:
+        dict[str, CacheStats]: The counters of every cache, by cache name.
+    """
+    return cache_stats()
+
+
+@router.get("/stats/pools")
+async def read_pool_stats() -> dict[str, ConnectionPoolStats]:
+    """
+    Report the live usage of every pool of outgoing connections of the worker answering the request.
+
+    Returns:
+        dict[str, ConnectionPoolStats]: The usage of every pool, by pool name.
+    """
+    return pool_stats()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics() -> PlainTextResponse:
+    """
+    Report the operation, request, cache and connection pool metrics in the Prometheus text exposition format, those
+    of every worker labelled by worker when the server runs several.
+
+    Returns:
+        PlainTextResponse: The metrics, one sample per line.
+    """
+    return PlainTextResponse(await render_metrics(), media_type="text/plain; version=0.0.4")
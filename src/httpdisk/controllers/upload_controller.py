@@ -0,0 +1,177 @@
+from fastapi.routing import APIRouter
+from fastapi import Depends, Request, HTTPException
+from fastapi.responses import JSONResponse, Response
+from ..security.user import LoggedUser, get_logged_user
+from ..helpers.disk import check_disk
+from ..helpers.upload import (
+    create_upload_session,
+    get_upload_status,
+    put_upload_chunk,
+    commit_upload_session,
+    abort_upload_session,
+)
+from ..models.file import UploadResult, UploadStatus
+from ..models.upload_session import UploadSession, UploadSessionRequest, UploadSessionStatus
+from ..repositories.disk.exceptions import QuotaExceededError
+from ..repositories.upload.azure_upload_session_repository import (
+    UPLOAD_SESSION_CHUNK_CONCURRENCY,
+    UPLOAD_SESSION_MAX_CHUNK_SIZE,
+)
+from ..repositories.upload.exceptions import IncompleteUploadError
+import starlette.status as status
+import asyncio
+import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+# Bounds the memory taken by the chunks being received, each held whole until it is staged.
+_chunk_slots = asyncio.Semaphore(UPLOAD_SESSION_CHUNK_CONCURRENCY)
+
+
+@router.post("/api/uploads", status_code=status.HTTP_201_CREATED)
+async def create_upload_session_endpoint(
+    body: UploadSessionRequest, user: LoggedUser = Depends(get_logged_user)
+) -> UploadSession:
+    """
+    Start a resumable upload of a file, to be sent as numbered chunks of the session's chunk size.
+
+    Args:
+        body (UploadSessionRequest): The name and size of the file, and optionally the chunk size.
+        user (LoggedUser): The logged-in user.
+
+    Returns:
+        UploadSession: The created session, with its ID and the number of chunks to send.
+
+    Raises:
+        HTTPException: If the user has no disk, the sizes are out of bounds, the file already exists or it does not
+            fit on the disk.
+    """
+    if not await check_disk(user.id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Disk not found")
+    try:
+        return await create_upload_session(user.id, body.filename, body.size, chunk_size=body.chunk_size)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+    except FileExistsError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="File already exists") from e
+    except QuotaExceededError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Disk quota exceeded") from e
+
+
+@router.get("/api/uploads/{session_id}")
+async def read_upload_session(session_id: str, user: LoggedUser = Depends(get_logged_user)) -> UploadSessionStatus:
+    """
+    Report which chunks of a resumable upload were received, so an interrupted upload can send only the others.
+
+    Args:
+        session_id (str): The ID of the session.
+        user (LoggedUser): The logged-in user.
+
+    Returns:
+        UploadSessionStatus: The session and the numbers of the received and missing chunks.
+
+    Raises:
+        HTTPException: If the session does not exist or expired.
+    """
+    upload = await get_upload_status(user.id, session_id)
+    if upload is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found")
+    return upload
+
+
+@router.put("/api/uploads/{session_id}/chunks/{index}", status_code=status.HTTP_204_NO_CONTENT)
+async def put_upload_chunk_endpoint(
+    request: Request, session_id: str, index: int, user: LoggedUser = Depends(get_logged_user)
+) -> Response:
+    """
+    Store a chunk of a resumable upload, sent as the raw request body. Chunks may be sent in any order and in
+    parallel, and sending a chunk again replaces it. Every chunk is held in memory until it is stored, so only
+    UPLOAD_SESSION_CHUNK_CONCURRENCY chunks are received at once and the others wait.
+
+    Args:
+        request (Request): The incoming request, whose body is the chunk.
+        session_id (str): The ID of the session.
+        index (int): The number of the chunk, starting from 0.
+        user (LoggedUser): The logged-in user.
+
+    Returns:
+        Response: An empty 204 response once the chunk is stored.
+
+    Raises:
+        HTTPException: If the session does not exist, or the number or size of the chunk does not match it.
+    """
+    if int(request.headers.get("content-length") or 0) > UPLOAD_SESSION_MAX_CHUNK_SIZE:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Chunk too large")
+    async with _chunk_slots:
+        data = bytearray()
+        async for part in request.stream():
+            data += part
+            if len(data) > UPLOAD_SESSION_MAX_CHUNK_SIZE:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Chunk too large")
+        try:
+            stored = await put_upload_chunk(user.id, session_id, index, bytes(data))
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+    if not stored:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.post("/api/uploads/{session_id}/commit")
+async def commit_upload_session_endpoint(session_id: str, user: LoggedUser = Depends(get_logged_user)) -> JSONResponse:
+    """
+    Create the file from the chunks of a resumable upload and end the session.
+
+    Args:
+        session_id (str): The ID of the session.
+        user (LoggedUser): The logged-in user.
+
+    Returns:
+        JSONResponse: The result of the upload, with status 201 if the file was created, 409 if it already exists and
+            413 if it does not fit on the disk, or the numbers of the missing chunks with status 400.
+
+    Raises:
+        HTTPException: If the session does not exist.
+    """
+    upload = await get_upload_status(user.id, session_id)
+    if upload is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found")
+    filename = upload.session.filename
+    try:
+        committed = await commit_upload_session(user.id, session_id)
+    except IncompleteUploadError as e:
+        return JSONResponse(content={"missing": e.missing}, status_code=status.HTTP_400_BAD_REQUEST)
+    except FileExistsError:
+        result, status_code = UploadStatus.CONFLICT, status.HTTP_409_CONFLICT
+    except QuotaExceededError:
+        result, status_code = UploadStatus.QUOTA_EXCEEDED, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    else:
+        if committed:
+            result, status_code = UploadStatus.SUCCESS, status.HTTP_201_CREATED
+        else:
+            logger.critical({"time": datetime.datetime.now(), "message": "Failed to commit an upload session"})
+            result, status_code = UploadStatus.ERROR, status.HTTP_500_INTERNAL_SERVER_ERROR
+    content = UploadResult(filename=filename, status=result).model_dump(mode="json")
+    return JSONResponse(content=content, status_code=status_code)
+
+
+@router.delete("/api/uploads/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def abort_upload_session_endpoint(session_id: str, user: LoggedUser = Depends(get_logged_user)) -> Response:
+    """
+    End a resumable upload without creating the file, discarding the chunks received so far.
+
+    Args:
+        session_id (str): The ID of the session.
+        user (LoggedUser): The logged-in user.
+
+    Returns:
+        Response: An empty 204 response once the session is ended.
+
+    Raises:
+        HTTPException: If the session does not exist.
+    """
+    if not await abort_upload_session(user.id, session_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,20 +1,138 @@
 from ..injector import Injector, DependencyProvider
-from ..libraries.object_storage.azure_blob_storage import AzureBlobStorage
+from ..libraries.object_storage.cached_storage import CachedObjectStorage
+from ..libraries.object_storage.coalesced_storage import CoalescedObjectStorage
+from ..libraries.object_storage.compressed_storage import CompressedObjectStorage
+from ..libraries.object_storage.in_memory_storage import InMemoryObjectStorage
+from ..libraries.object_storage.local_fs_storage import LocalFsStorage
+from ..libraries.object_storage.models import ObjectPage
+from ..libraries.object_storage.object_storage import ObjectStorageProtocol
+from ..libraries.object_storage.resilient_storage import ResiliencePolicy, ResilientObjectStorage
 from ..repositories.disk.azure_disk import AzureDiskRepository
 from ..repositories.disk.azure_disk_manager import AzureDiskManager
+from ..repositories.disk.usage_reconciler import DiskUsageReconciler
 from ..repositories.file.azure_file_repository import AzureFileRepository
+from ..repositories.upload.azure_upload_session_repository import AzureUploadSessionRepository
+from ..libraries.cache.disk_cache import DiskCache
+from ..libraries.cache.ttl_cache import TTLCache
+from ..libraries.metrics.azure_monitor import AzureMonitorSink
+from ..libraries.metrics.instrumented import instrument
+from ..libraries.metrics.metrics import MultiprocessCollector
+from ..models.disk_metadata import DiskMetadata
+import json
 import os
 
 def initialize():
     dependencies = []
-    storage = AzureBlobStorage(
-       os.getenv("BLOB_CONNECTION_STRING"), "test"
-    )
+    # The caches are private to every worker, so with several workers a change made through one of them only reaches
+    # the caches of the others once their entries expire. They are then off, or revalidated on every use, by default.
+    several_workers = int(os.getenv("SERVER_WORKERS", 1)) > 1
+    backend = os.getenv("OBJECT_STORAGE", "azure")
+    resilient = os.getenv("STORAGE_RESILIENCE", "true").lower() == "true"
+    storage: ObjectStorageProtocol
+    if backend == "local":
+        storage = LocalFsStorage(os.getenv("LOCAL_STORAGE_ROOT", "data"))
+    elif backend == "memory":
+        storage = InMemoryObjectStorage(
+            latency=float(os.getenv("MEMORY_STORAGE_LATENCY", 0)),
+            failure_rate=float(os.getenv("MEMORY_STORAGE_FAILURE_RATE", 0)),
+        )
+    else:
+        # The Azure SDK takes a large share of the import time, so it is only imported when it is used.
+        from ..libraries.object_storage.azure_blob_storage import AzureBlobStorage, AzureBlobStorageConfig
+
+        config = AzureBlobStorageConfig(
+            max_connections=int(os.getenv("BLOB_MAX_CONNECTIONS", 100)),
+            max_connections_per_host=int(os.getenv("BLOB_MAX_CONNECTIONS_PER_HOST", 0)),
+            keepalive_timeout=float(os.getenv("BLOB_KEEPALIVE_TIMEOUT", 15)),
+            connection_timeout=float(os.getenv("BLOB_CONNECTION_TIMEOUT", 20)),
+            read_timeout=float(os.getenv("BLOB_READ_TIMEOUT", 60)),
+            max_single_put_size=int(os.getenv("BLOB_MAX_SINGLE_PUT_SIZE", 64 * 1024**2)),
+            max_block_size=int(os.getenv("BLOB_MAX_BLOCK_SIZE", 4 * 1024**2)),
+            max_single_get_size=int(os.getenv("BLOB_MAX_SINGLE_GET_SIZE", 4 * 1024**2)),
+            max_chunk_get_size=int(os.getenv("BLOB_MAX_CHUNK_GET_SIZE", 4 * 1024**2)),
+            max_concurrency=int(os.getenv("BLOB_MAX_CONCURRENCY", 1)),
+            # Retries of the client would multiply those of the resilience layer.
+            retries=int(os.getenv("BLOB_RETRIES", 0 if resilient else 3)),
+        )
+        storage = AzureBlobStorage(os.getenv("BLOB_CONNECTION_STRING", ""), "test", config)
+    instrumented = os.getenv("INSTRUMENT_OPERATIONS", "true").lower() == "true"
+    if instrumented:
+        storage = instrument(storage, "object_storage")
+    if resilient:
+        hedge_percentile = os.getenv("STORAGE_HEDGE_PERCENTILE")
+        storage = ResilientObjectStorage(
+            storage,
+            ResiliencePolicy(
+                deadline=float(os.getenv("STORAGE_DEADLINE", 30)),
+                deadlines=json.loads(os.getenv("STORAGE_DEADLINES", "{}")),
+                max_attempts=int(os.getenv("STORAGE_MAX_ATTEMPTS", 4)),
+                backoff_base=float(os.getenv("STORAGE_BACKOFF_BASE", 0.1)),
+                backoff_max=float(os.getenv("STORAGE_BACKOFF_MAX", 5)),
+                hedge_percentile=float(hedge_percentile) if hedge_percentile else None,
+                hedge_min_samples=int(os.getenv("STORAGE_HEDGE_MIN_SAMPLES", 100)),
+            ),
+        )
+    if os.getenv("COALESCE_READS", "true").lower() == "true":
+        storage = CoalescedObjectStorage(storage, max_lag=int(os.getenv("COALESCE_MAX_LAG", 8 * 1024**2)))
+    if os.getenv("BLOB_CACHE_DIR"):
+        storage = CachedObjectStorage(
+            storage,
+            DiskCache("blob_cache", os.getenv("BLOB_CACHE_DIR", ""), int(os.getenv("BLOB_CACHE_SIZE", 1024**3))),
+            max_object_size=int(os.getenv("BLOB_CACHE_MAX_OBJECT_SIZE", 64 * 1024**2)),
+            freshness=float(os.getenv("BLOB_CACHE_FRESHNESS", 0 if several_workers else 5)),
+        )
+    if os.getenv("COMPRESS_OBJECTS", "false").lower() == "true":
+        storage = CompressedObjectStorage(
+            storage,
+            level=int(os.getenv("COMPRESSION_LEVEL", 6)),
+            workers=int(os.getenv("COMPRESSION_WORKERS", 4)),
+            max_size=int(os.getenv("COMPRESSION_MAX_SIZE", 8 * 1024**2)),
+        )
     dependencies.append(DependencyProvider(instance=storage, name="object_storage"))
 
-    dependencies.append(DependencyProvider(instance=AzureDiskRepository(storage), name="disk_repository"))
-    dependencies.append(DependencyProvider(instance=AzureDiskManager(storage), name="disk_manager"))
-    dependencies.append(DependencyProvider(instance=AzureFileRepository(storage), name="file_repository"))
+    listing_cache: TTLCache[tuple[str, int, str | None], ObjectPage] = TTLCache(
+        "disk_listing",
+        max_size=int(os.getenv("LISTING_CACHE_SIZE", 0 if several_workers else 1024)),
+        ttl=float(os.getenv("LISTING_CACHE_TTL", 30)),
+    )
+    metadata_cache: TTLCache[str, tuple[DiskMetadata, str | None, float]] = TTLCache(
+        "disk_metadata",
+        max_size=int(os.getenv("METADATA_CACHE_SIZE", 4096)),
+        ttl=float(os.getenv("METADATA_CACHE_TTL", 300)),
+    )
+    disk_repository = AzureDiskRepository(
+        storage,
+        listing_cache,
+        metadata_cache,
+        metadata_freshness=float(os.getenv("METADATA_CACHE_FRESHNESS", 0 if several_workers else 5)),
+        deduplicate=os.getenv("DEDUPLICATE_UPLOADS", "false").lower() == "true",
+    )
+    if instrumented:
+        disk_repository = instrument(disk_repository, "disk_repository")
+    dependencies.append(DependencyProvider(instance=disk_repository, name="disk_repository"))
+    existence_cache: TTLCache[str, bool] = TTLCache(
+        "disk_existence",
+        max_size=int(os.getenv("EXISTENCE_CACHE_SIZE", 0 if several_workers else 4096)),
+        ttl=float(os.getenv("EXISTENCE_CACHE_TTL", 60)),
+    )
+    disk_manager = AzureDiskManager(storage, listing_cache, existence_cache, metadata_cache)
+    file_repository = AzureFileRepository(disk_repository)
+    upload_session_repository = AzureUploadSessionRepository(storage, disk_repository)
+    if instrumented:
+        disk_manager = instrument(disk_manager, "disk_manager")
+        file_repository = instrument(file_repository, "file_repository")
+        upload_session_repository = instrument(upload_session_repository, "upload_session_repository")
+    dependencies.append(DependencyProvider(instance=disk_manager, name="disk_manager"))
+    dependencies.append(DependencyProvider(instance=file_repository, name="file_repository"))
+    dependencies.append(DependencyProvider(instance=upload_session_repository, name="upload_session_repository"))
+    dependencies.append(
+        DependencyProvider(instance=DiskUsageReconciler(storage, disk_repository), name="disk_usage_reconciler")
+    )
+    if os.getenv("METRICS_DIR"):
+        collector = MultiprocessCollector(os.getenv("METRICS_DIR", ""), float(os.getenv("METRICS_INTERVAL", 5)))
+        dependencies.append(DependencyProvider(instance=collector, name="metrics_collector"))
+    if os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING"):
+        dependencies.append(DependencyProvider(instance=AzureMonitorSink(), name="telemetry"))
 
 
 
@@ -3,10 +3,38 @@ from fastapi import Depends
 from ..repositories.disk.disk_manager_protocol import DiskManagerProtocol
 from ..repositories.disk.disk_protocol import DiskProtocol
 from fastapi.responses import JSONResponse
+from ..libraries.archive.models import ZipEntry
+from ..libraries.archive.zip_stream import stream_zip
+from ..libraries.object_storage.models import ObjectPage, ObjectStream
+from ..libraries.object_storage.paths import is_valid_path
+from ..repositories.disk.consts import MANGLED
+from ..models.disk_deletion import DiskDeletionStatus
+from typing import AsyncIterator
+import asyncio
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+ARCHIVE_READ_AHEAD = int(os.getenv("ARCHIVE_READ_AHEAD", 4))
+ARCHIVE_LISTING_PAGE_SIZE = 1000
+
+
+def is_archivable(name: str) -> bool:
+    """
+    Tells whether a file name can be archived, being a plain relative path that stays on the user's disk and is safe
+    to extract.
+
+    Args:
+        name (str): The name of the file, relative to the disk.
+
+    Returns:
+        bool: False if the name has empty, "." or ".." segments, starts with "/", holds a "\\" that extractors
+            may take for a separator, or names an internal object.
+    """
+    return is_valid_path(name) and "\\" not in name and MANGLED not in name
+
+
 @Injector.disk_manager
 async def create_disk(user_id: str, user_email: str, disk_manager: DiskManagerProtocol = Depends()) -> JSONResponse:
     """
@@ -27,6 +55,38 @@ async def create_disk(user_id: str, user_email: str, disk_manager: DiskManagerPr
         return JSONResponse(content={"message": "Disk created"}, status_code=201)
     return JSONResponse(content={"message": "Disk not created"}, status_code=400)
 
+@Injector.disk_manager
+async def delete_disk(user_id: str, disk_manager: DiskManagerProtocol = Depends()) -> DiskDeletionStatus | None:
+    """
+    Start deleting the disk of a user in the background.
+
+    Args:
+        user_id (str): The ID of the user.
+        disk_manager (DiskManagerProtocol, optional): The disk manager instance. Defaults to Depends().
+
+    Returns:
+        DiskDeletionStatus | None: The progress of the started deletion, or None if it could not be started.
+    """
+    if not await disk_manager.delete_disk(user_id):
+        return None
+    return await disk_manager.get_deletion_status(user_id)
+
+@Injector.disk_manager
+async def get_disk_deletion_status(
+    user_id: str, disk_manager: DiskManagerProtocol = Depends()
+) -> DiskDeletionStatus | None:
+    """
+    Retrieve the progress of the deletion of a user's disk.
+
+    Args:
+        user_id (str): The ID of the user.
+        disk_manager (DiskManagerProtocol, optional): The disk manager instance. Defaults to Depends().
+
+    Returns:
+        DiskDeletionStatus | None: The progress of the deletion, or None if the disk was not deleted recently.
+    """
+    return await disk_manager.get_deletion_status(user_id)
+
 @Injector.disk_manager
 async def check_disk(user_id: str, disk_manager: DiskManagerProtocol = Depends) -> JSONResponse:
     """
@@ -44,7 +104,7 @@ async def check_disk(user_id: str, disk_manager: DiskManagerProtocol = Depends)
     return result
 
 @Injector.disk_repository
-async def list_disk_elements(user_id: str, disk_repository: DiskProtocol = Depends()) -> JSONResponse:
+async def list_disk_elements(user_id: str, disk_repository: DiskProtocol = Depends()) -> list[str]:
     """
     Retrieve a list of disk elements for a given user.
 
@@ -53,7 +113,103 @@ async def list_disk_elements(user_id: str, disk_repository: DiskProtocol = Depen
         disk_repository (DiskProtocol, optional): The disk repository to use. Defaults to Depends().
 
     Returns:
-        JSONResponse: The response containing the list of disk elements.
+        list[str]: The names of the disk elements.
     """
     result = await disk_repository.list_objects(user_id)
-    return result
\ No newline at end of file
+    return result
+
+@Injector.disk_repository
+async def list_disk_page(
+    user_id: str, limit: int, cursor: str | None = None, disk_repository: DiskProtocol = Depends()
+) -> ObjectPage:
+    """
+    Retrieve a single page of the disk elements of a given user.
+
+    Args:
+        user_id (str): The ID of the user.
+        limit (int): The maximum number of elements on the page.
+        cursor (str | None, optional): The continuation token returned with the previous page. Defaults to None.
+        disk_repository (DiskProtocol, optional): The disk repository to use. Defaults to Depends().
+
+    Returns:
+        ObjectPage: The elements on the page and the continuation token of the next page.
+    """
+    return await disk_repository.list_objects_page(user_id, limit, cursor)
+
+
+@Injector.disk_repository
+async def stream_disk_archive(
+    user_id: str,
+    filenames: list[str] | None = None,
+    folder: str = "",
+    disk_repository: DiskProtocol = Depends(),
+    read_ahead: int = ARCHIVE_READ_AHEAD,
+) -> AsyncIterator[bytes]:
+    """
+    Stream a ZIP archive of the selected files, or of every file in a folder of the disk of a given user.
+
+    The files are listed a page at a time while the archive is being written, and up to read_ahead of the files
+    following the one being written are opened concurrently, so the archive starts before the listing ends and the
+    downloads overlap. Files that no longer exist when they are opened are left out, and so are names that are not
+    archivable, which callers should reject up front.
+
+    Args:
+        user_id (str): The ID of the user.
+        filenames (list[str] | None, optional): The names of the files to archive. Defaults to None, which archives
+            every file in the folder.
+        folder (str, optional): The folder to archive if no files are selected. Defaults to the whole disk.
+        disk_repository (DiskProtocol, optional): The disk repository to use. Defaults to Depends().
+        read_ahead (int, optional): The number of files opened ahead of the one being written. Defaults to
+            ARCHIVE_READ_AHEAD.
+
+    Yields:
+        bytes: The consecutive pieces of the archive.
+    """
+    folder = folder.strip("/")
+    opened: asyncio.Queue[tuple[str, asyncio.Task[ObjectStream | None]] | None] = asyncio.Queue(max(read_ahead, 1))
+
+    async def list_names() -> AsyncIterator[str]:
+        if filenames is not None:
+            for name in dict.fromkeys(filenames):
+                if is_archivable(name):
+                    yield name
+            return
+        path = f"{user_id}/{folder}" if folder else user_id
+        cursor = None
+        while True:
+            page = await disk_repository.list_objects_page(path, ARCHIVE_LISTING_PAGE_SIZE, cursor)
+            for item in page.items:
+                name = f"{folder}/{item.name}" if folder else item.name
+                if is_archivable(name):
+                    yield name
+            if page.cursor is None:
+                return
+            cursor = page.cursor
+
+    async def open_files() -> None:
+        try:
+            async for name in list_names():
+                await opened.put((name, asyncio.create_task(disk_repository.get_object_stream(f"{user_id}/{name}"))))
+        finally:
+            await opened.put(None)
+
+    async def list_entries() -> AsyncIterator[ZipEntry]:
+        while (item := await opened.get()) is not None:
+            name, opening = item
+            stream = await opening
+            if stream is not None:
+                yield ZipEntry(
+                    name=name, size=stream.length, last_modified=stream.properties.last_modified, chunks=stream.chunks
+                )
+        await producer
+
+    producer = asyncio.create_task(open_files())
+    try:
+        async for piece in stream_zip(list_entries()):
+            yield piece
+    finally:
+        producer.cancel()
+        while not opened.empty():
+            item = opened.get_nowait()
+            if item is not None:
+                item[1].cancel()
@@ -1,35 +1,281 @@
-from fastapi.responses import JSONResponse
 from fastapi import UploadFile
-from ..injector import Injector
+from ..injector import Dependency, Injector
 from ..repositories.file.file_repository_protocol import FileRepositoryProtocol
+from ..libraries.object_storage.models import ObjectProperties, ObjectStream
+from ..models.file import UploadResult, UploadStatus
+from ..repositories.disk.exceptions import QuotaExceededError
+from ..libraries.object_storage.exceptions import InvalidPathError, StorageUnavailableError
+from typing import AsyncIterator, BinaryIO
+import asyncio
+import datetime
+import email.utils
+import hashlib
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 4 * 1024 * 1024))
+UPLOAD_CONCURRENCY_PER_REQUEST = int(os.getenv("UPLOAD_CONCURRENCY_PER_REQUEST", 4))
+UPLOAD_CONCURRENCY_GLOBAL = int(os.getenv("UPLOAD_CONCURRENCY_GLOBAL", 32))
+
+_global_upload_slots = asyncio.Semaphore(UPLOAD_CONCURRENCY_GLOBAL)
+
+
+async def read_chunks(file: UploadFile, chunk_size: int = UPLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    Reads an uploaded file in fixed-size chunks.
+
+    Args:
+        file (UploadFile): The file to be read.
+        chunk_size (int, optional): The maximum size of a single chunk in bytes. Defaults to UPLOAD_CHUNK_SIZE.
+
+    Yields:
+        bytes: The consecutive chunks of the file.
+    """
+    while chunk := await file.read(chunk_size):
+        yield chunk
+
+
+def parse_range_header(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parses a single-range HTTP Range header against an object of the given size.
+
+    Args:
+        header (str): The value of the Range header, e.g. "bytes=0-499", "bytes=500-" or "bytes=-500".
+        size (int): The size of the requested object in bytes.
+
+    Returns:
+        tuple[int, int] | None: The offset and length of the requested range, or None if the header is malformed or
+            asks for multiple ranges, in which case it should be ignored.
+
+    Raises:
+        ValueError: If the range is well-formed but cannot be satisfied for an object of the given size.
+    """
+    unit, _, byte_range = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in byte_range:
+        return None
+    first, separator, last = (part.strip() for part in byte_range.partition("-"))
+    if not separator or not (first or last) or not (first or "0").isdigit() or not (last or "0").isdigit():
+        return None
+
+    if not first:
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise ValueError("Range not satisfiable")
+        return (max(size - suffix, 0), min(suffix, size))
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and end < start:
+        return None
+    if start >= size:
+        raise ValueError("Range not satisfiable")
+    return (start, min(end, size - 1) - start + 1)
+
+
+def accepts_encoding(header: str | None, coding: str) -> bool:
+    """
+    Checks whether an HTTP Accept-Encoding header accepts a content coding.
+
+    Args:
+        header (str | None): The value of the Accept-Encoding header, e.g. "gzip, deflate;q=0.5".
+        coding (str): The content coding, e.g. "gzip".
+
+    Returns:
+        bool: True if the coding, or any coding through "*", is listed with a non-zero quality.
+    """
+    accepted = {}
+    for entry in (header or "").split(","):
+        name, _, parameters = entry.partition(";")
+        quality = 1.0
+        for parameter in parameters.split(";"):
+            key, _, value = parameter.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted.get(coding.lower(), accepted.get("*", 0.0)) > 0
+
+
+def validator_headers(properties: ObjectProperties) -> dict[str, str]:
+    """
+    Returns the ETag and Last-Modified headers describing the current version of a file.
+
+    Args:
+        properties (ObjectProperties): The properties of the file.
+
+    Returns:
+        dict[str, str]: The headers, leaving out those the properties have no value for.
+    """
+    headers = {}
+    if properties.etag:
+        headers["ETag"] = properties.etag
+    if properties.last_modified is not None:
+        headers["Last-Modified"] = email.utils.format_datetime(
+            properties.last_modified.astimezone(datetime.timezone.utc), usegmt=True
+        )
+    return headers
+
+
+def _parse_http_date(value: str) -> datetime.datetime | None:
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=datetime.timezone.utc)
+
+
+def is_not_modified(if_none_match: str | None, if_modified_since: str | None, properties: ObjectProperties) -> bool:
+    """
+    Evaluates the If-None-Match and If-Modified-Since headers of a GET request against the current version of a file.
+
+    If-Modified-Since is only considered if there is no If-None-Match header, and is ignored if it cannot be parsed.
+
+    Args:
+        if_none_match (str | None): The value of the If-None-Match header, e.g. '"0x8DB", W/"0x8DC"' or "*".
+        if_modified_since (str | None): The value of the If-Modified-Since header, an HTTP date.
+        properties (ObjectProperties): The properties of the file.
+
+    Returns:
+        bool: True if the client's copy is current and the request should be answered with 304 Not Modified.
+    """
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        if not properties.etag:
+            return False
+        etag = properties.etag.removeprefix("W/")
+        return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+    if if_modified_since is not None and properties.last_modified is not None:
+        since = _parse_http_date(if_modified_since)
+        return since is not None and properties.last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def if_range_matches(if_range: str | None, properties: ObjectProperties) -> bool:
+    """
+    Evaluates the If-Range header of a range request against the current version of a file.
+
+    Args:
+        if_range (str | None): The value of the If-Range header, a strong entity tag or an HTTP date.
+        properties (ObjectProperties): The properties of the file.
+
+    Returns:
+        bool: True if the range should be sent, False if the whole file should be sent instead because the client's
+            partial copy is outdated.
+    """
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return properties.etag is not None and not properties.etag.startswith("W/") and if_range == properties.etag
+    since = _parse_http_date(if_range)
+    if since is None or properties.last_modified is None:
+        return False
+    return properties.last_modified.replace(microsecond=0) == since
+
+
+async def file_digest(file: UploadFile) -> str:
+    """
+    Computes the SHA-256 digest of an uploaded file, which was already received in full, and rewinds it.
+
+    Args:
+        file (UploadFile): The file to be hashed.
+
+    Returns:
+        str: The digest of the file in hexadecimal.
+    """
+    await file.seek(0)
+    digest = await asyncio.to_thread(_sha256, file.file)
+    await file.seek(0)
+    return digest
+
+
+def _sha256(file: BinaryIO) -> str:
+    digest = hashlib.sha256()
+    while chunk := file.read(UPLOAD_CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
 
 @Injector.file_repository
-async def upload_file(user_id: str, file: UploadFile, filename: str, file_repository: FileRepositoryProtocol) -> JSONResponse:
+async def upload_file(
+    user_id: str, file: UploadFile, filename: str, file_repository: FileRepositoryProtocol = Dependency()
+) -> bool:
     """
-    Uploads a file to the file repository.
+    Uploads a file to the file repository, streaming it in chunks of UPLOAD_CHUNK_SIZE bytes.
+
+    The size of the file, when known, is passed along so the disk's quota is checked before anything is written. If
+    the repository deduplicates files, the digest of the file is computed first, so content that is already stored
+    is not uploaded again.
 
     Args:
         user_id (str): The ID of the user uploading the file.
         file (UploadFile): The file to be uploaded.
         filename (str): The name of the file.
-        file_repository (FileRepositoryProtocol): The file repository to store the file.
+        file_repository (FileRepositoryProtocol, optional): The file repository to store the file. Defaults to the
+            injected one.
+
+    Returns:
+        bool: True if the file was uploaded successfully, False otherwise.
+
+    Raises:
+        FileExistsError: If a file with the same name already exists.
+        QuotaExceededError: If the file does not fit in the space left on the user's disk.
+    """
+    digest = await file_digest(file) if file_repository.deduplicates else None
+    return await file_repository.create_file(user_id, filename, read_chunks(file), size=file.size, digest=digest)
+
+
+async def upload_files(user_id: str, uploads: list[tuple[UploadFile, str]]) -> list[UploadResult]:
+    """
+    Uploads several files concurrently.
+
+    At most UPLOAD_CONCURRENCY_PER_REQUEST files of a single call, and UPLOAD_CONCURRENCY_GLOBAL files across the
+    whole process, are being uploaded at any time.
+
+    Args:
+        user_id (str): The ID of the user uploading the files.
+        uploads (list[tuple[UploadFile, str]]): The files to be uploaded, each with the name to store it under.
 
     Returns:
-        JSONResponse: The response indicating the success or failure of the file upload.
+        list[UploadResult]: The result of every upload, in the order of the given files.
     """
-    file_data = await file.read()
-    return await file_repository.create_file(user_id, filename, file_data)
-    
+    request_slots = asyncio.Semaphore(UPLOAD_CONCURRENCY_PER_REQUEST)
+
+    async def upload(file: UploadFile, filename: str) -> UploadResult:
+        async with request_slots, _global_upload_slots:
+            try:
+                uploaded = await upload_file(user_id, file, filename)
+            except FileExistsError:
+                return UploadResult(filename=filename, status=UploadStatus.CONFLICT)
+            except QuotaExceededError:
+                return UploadResult(filename=filename, status=UploadStatus.QUOTA_EXCEEDED)
+            except StorageUnavailableError:
+                return UploadResult(filename=filename, status=UploadStatus.UNAVAILABLE)
+            except InvalidPathError:
+                return UploadResult(filename=filename, status=UploadStatus.INVALID_NAME)
+            except Exception as e:
+                logger.critical({"time": datetime.datetime.now(), "message": "Failed to upload a file", "exception": e})
+                uploaded = False
+        return UploadResult(filename=filename, status=UploadStatus.SUCCESS if uploaded else UploadStatus.ERROR)
+
+    return list(await asyncio.gather(*(upload(file, filename) for file, filename in uploads)))
+
 
 @Injector.file_repository
-async def delete_file(user_id: str, filename: str, file_repository: FileRepositoryProtocol):
+async def delete_file(user_id: str, filename: str, file_repository: FileRepositoryProtocol = Dependency()):
     """
     Deletes a file for a given user.
 
     Args:
         user_id (str): The ID of the user.
         filename (str): The name of the file to be deleted.
-        file_repository (FileRepositoryProtocol): The file repository used to delete the file.
+        file_repository (FileRepositoryProtocol, optional): The file repository used to delete the file. Defaults to
+            the injected one.
 
     Returns:
         The result of the file deletion operation.
@@ -50,4 +296,44 @@ async def get_file(user_id: str, filename: str, file_repository: FileRepositoryP
         The contents of the file.
 
     """
-    return await file_repository.read_file(user_id, filename)
\ No newline at end of file
+    return await file_repository.read_file(user_id, filename)
+
+@Injector.file_repository
+async def get_file_stream(
+    user_id: str,
+    filename: str,
+    offset: int | None = None,
+    length: int | None = None,
+    file_repository: FileRepositoryProtocol = Dependency(),
+) -> ObjectStream | None:
+    """
+    Opens a streaming download of a file, or of a byte range of it, from the file repository.
+
+    Args:
+        user_id (str): The ID of the user.
+        filename (str): The name of the file to retrieve.
+        offset (int | None, optional): The offset of the first byte to download. Defaults to the start of the file.
+        length (int | None, optional): The number of bytes to download. Defaults to the rest of the file.
+        file_repository (FileRepositoryProtocol, optional): The file repository to use. Defaults to the injected one.
+
+    Returns:
+        ObjectStream | None: The open download, or None if the file doesn't exist.
+    """
+    return await file_repository.read_file_stream(user_id, filename, offset, length)
+
+@Injector.file_repository
+async def get_file_properties(
+    user_id: str, filename: str, file_repository: FileRepositoryProtocol = Dependency()
+) -> ObjectProperties | None:
+    """
+    Retrieves the properties of a file from the file repository.
+
+    Args:
+        user_id (str): The ID of the user.
+        filename (str): The name of the file.
+        file_repository (FileRepositoryProtocol, optional): The file repository to use. Defaults to the injected one.
+
+    Returns:
+        ObjectProperties | None: The properties of the file, or None if the file doesn't exist.
+    """
+    return await file_repository.get_file_properties(user_id, filename)
\ No newline at end of file
@@ -0,0 +1,111 @@
+from ..injector import Dependency, Injector
+from ..models.upload_session import UploadSession, UploadSessionStatus
+from ..repositories.upload.upload_session_repository_protocol import UploadSessionRepositoryProtocol
+
+
+@Injector.upload_session_repository
+async def create_upload_session(
+    user_id: str,
+    filename: str,
+    size: int,
+    chunk_size: int | None = None,
+    upload_session_repository: UploadSessionRepositoryProtocol = Dependency(),
+) -> UploadSession:
+    """
+    Starts a resumable upload of a file.
+
+    Args:
+        user_id (str): The ID of the user.
+        filename (str): The name the file is stored under once the session is committed.
+        size (int): The size of the whole file in bytes.
+        chunk_size (int | None, optional): The size of every chunk but the last one in bytes. Defaults to the
+            repository's default chunk size.
+        upload_session_repository (UploadSessionRepositoryProtocol, optional): The upload session repository to
+            use. Defaults to the injected one.
+
+    Returns:
+        UploadSession: The created session.
+    """
+    return await upload_session_repository.create_session(user_id, filename, size, chunk_size)
+
+
+@Injector.upload_session_repository
+async def get_upload_status(
+    user_id: str, session_id: str, upload_session_repository: UploadSessionRepositoryProtocol = Dependency()
+) -> UploadSessionStatus | None:
+    """
+    Retrieves the progress of a resumable upload.
+
+    Args:
+        user_id (str): The ID of the user.
+        session_id (str): The ID of the session.
+        upload_session_repository (UploadSessionRepositoryProtocol, optional): The upload session repository to use.
+            Defaults to the injected one.
+
+    Returns:
+        UploadSessionStatus | None: The progress of the upload, or None if the user has no such session.
+    """
+    return await upload_session_repository.get_status(user_id, session_id)
+
+
+@Injector.upload_session_repository
+async def put_upload_chunk(
+    user_id: str,
+    session_id: str,
+    index: int,
+    data: bytes,
+    upload_session_repository: UploadSessionRepositoryProtocol = Dependency(),
+) -> bool:
+    """
+    Stores a chunk of a resumable upload.
+
+    Args:
+        user_id (str): The ID of the user.
+        session_id (str): The ID of the session.
+        index (int): The number of the chunk, starting from 0.
+        data (bytes): The content of the chunk.
+        upload_session_repository (UploadSessionRepositoryProtocol, optional): The upload session repository to use.
+            Defaults to the injected one.
+
+    Returns:
+        bool: True if the chunk was stored, False if the user has no such session.
+    """
+    return await upload_session_repository.put_chunk(user_id, session_id, index, data)
+
+
+@Injector.upload_session_repository
+async def commit_upload_session(
+    user_id: str, session_id: str, upload_session_repository: UploadSessionRepositoryProtocol = Dependency()
+) -> bool:
+    """
+    Creates the file from the chunks of a resumable upload and ends the session.
+
+    Args:
+        user_id (str): The ID of the user.
+        session_id (str): The ID of the session.
+        upload_session_repository (UploadSessionRepositoryProtocol, optional): The upload session repository to use.
+            Defaults to the injected one.
+
+    Returns:
+        bool: True if the file was created, False if the user has no such session or an error occurs.
+    """
+    return await upload_session_repository.commit_session(user_id, session_id)
+
+
+@Injector.upload_session_repository
+async def abort_upload_session(
+    user_id: str, session_id: str, upload_session_repository: UploadSessionRepositoryProtocol = Dependency()
+) -> bool:
+    """
+    Ends a resumable upload without creating the file.
+
+    Args:
+        user_id (str): The ID of the user.
+        session_id (str): The ID of the session.
+        upload_session_repository (UploadSessionRepositoryProtocol, optional): The upload session repository to use.
+            Defaults to the injected one.
+
+    Returns:
+        bool: True if the session was ended, False if the user has no such session.
+    """
+    return await upload_session_repository.abort_session(user_id, session_id)
@@ -20,6 +20,12 @@ class DependencyProvider(BaseModel):
 
 class Injector:
     _contexts: list[AsyncGenerator[None, None]] = []
+    # Set by initialize(), one attribute per dependency name.
+    _user_repository: Any
+    _disk_manager: Any
+    _disk_repository: Any
+    _file_repository: Any
+    _upload_session_repository: Any
 
     @staticmethod
     def initialize(dependencies: Iterable[DependencyProvider]):
@@ -37,7 +43,8 @@ class Injector:
 
     @staticmethod
     async def _application_shutdown() -> None:
-        for context in Injector._contexts:
+        # In reverse order of startup, so dependencies are stopped before the clients they use are closed.
+        for context in reversed(Injector._contexts):
             try:
                 await context.asend(None)
             except StopAsyncIteration:
@@ -77,3 +84,11 @@ class Injector:
             return fn(*args, **kwargs)
 
         return wrapped
+
+    @staticmethod
+    def upload_session_repository(fn: Callable[_P, _T]) -> Callable[_P, _T]:
+        def wrapped(*args: _P.args, **kwargs: _P.kwargs) -> _T:
+            kwargs.update({"upload_session_repository": Injector._upload_session_repository})
+            return fn(*args, **kwargs)
+
+        return wrapped
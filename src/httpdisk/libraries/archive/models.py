@@ -0,0 +1,21 @@
+from pydantic import BaseModel, ConfigDict
+from typing import AsyncIterator
+import datetime
+
+
+class ZipEntry(BaseModel):
+    """
+    Represents a file to be written into a streamed ZIP archive.
+
+    Attributes:
+        name (str): The path of the file inside the archive.
+        size (int): The size of the file in bytes.
+        last_modified (datetime.datetime | None): The time the file was last modified.
+        chunks (AsyncIterator[bytes]): The content of the file, in order.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    name: str
+    size: int
+    last_modified: datetime.datetime | None = None
+    chunks: AsyncIterator[bytes]
@@ -0,0 +1,156 @@
+from .models import ZipEntry
+from typing import AsyncIterator
+import datetime
+import struct
+import zlib
+
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_DATA_DESCRIPTOR = struct.Struct("<IIII")
+_DATA_DESCRIPTOR_64 = struct.Struct("<IIQQ")
+_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_END_OF_DIRECTORY = struct.Struct("<IHHHHIIH")
+_END_OF_DIRECTORY_64 = struct.Struct("<IQHHIIQQQQ")
+_END_OF_DIRECTORY_64_LOCATOR = struct.Struct("<IIQI")
+
+_VERSION = 20
+_VERSION_64 = 45
+_MADE_BY_UNIX = 3 << 8
+_FLAGS = 0x0008 | 0x0800
+_FILE_ATTRIBUTES = 0o100644 << 16
+_MAX_32 = 0xFFFFFFFF
+_MAX_16 = 0xFFFF
+
+
+def _dos_time(last_modified: datetime.datetime | None) -> tuple[int, int]:
+    if last_modified is None or last_modified.year < 1980:
+        return 0, (1 << 5) | 1
+    if last_modified.year > 2107:
+        return (23 << 11) | (59 << 5) | 29, (127 << 9) | (12 << 5) | 31
+    time = (last_modified.hour << 11) | (last_modified.minute << 5) | (last_modified.second // 2)
+    date = ((last_modified.year - 1980) << 9) | (last_modified.month << 5) | last_modified.day
+    return time, date
+
+
+def _timestamp_extra(last_modified: datetime.datetime | None) -> bytes:
+    if last_modified is None:
+        return b""
+    timestamp = int(last_modified.timestamp())
+    if not 0 <= timestamp <= _MAX_32:
+        return b""
+    return struct.pack("<HHBI", 0x5455, 5, 1, timestamp)
+
+
+async def stream_zip(entries: AsyncIterator[ZipEntry]) -> AsyncIterator[bytes]:
+    """
+    Writes files into a ZIP archive as they arrive, yielding the archive piece by piece.
+
+    Files are stored without compression, each followed by a data descriptor carrying its checksum and size, so
+    nothing has to be known about a file before its content is read and no part of the archive has to be revisited.
+    Only the central directory records of the files are kept until the end of the archive. Files of 4 GiB or more,
+    archives past 4 GiB and archives of 65535 files or more use the ZIP64 extensions.
+
+    Args:
+        entries (AsyncIterator[ZipEntry]): The files to write, in order.
+
+    Yields:
+        bytes: The consecutive pieces of the archive.
+
+    Raises:
+        ValueError: If the name of a file is absolute or has empty, "." or ".." segments, so extracting it could
+            write outside of the target directory, or if the content of a file is longer than its declared size
+            allows for.
+    """
+    directory = []
+    offset = 0
+    count = 0
+    async for entry in entries:
+        if any(segment in ("", ".", "..") for segment in entry.name.replace("\\", "/").split("/")):
+            raise ValueError(f"Unsafe entry name: {entry.name}")
+        name = entry.name.encode()
+        zip64 = entry.size >= _MAX_32
+        version = _VERSION_64 if zip64 else _VERSION
+        time, date = _dos_time(entry.last_modified)
+        extra = _timestamp_extra(entry.last_modified)
+        local_extra = extra + (struct.pack("<HHQQ", 0x0001, 16, 0, 0) if zip64 else b"")
+        sizes = _MAX_32 if zip64 else 0
+        header = _LOCAL_HEADER.pack(
+            0x04034B50, version, _FLAGS, 0, time, date, 0, sizes, sizes, len(name), len(local_extra)
+        )
+        yield header + name + local_extra
+
+        crc = 0
+        size = 0
+        async for chunk in entry.chunks:
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            yield chunk
+        if size >= _MAX_32 and not zip64:
+            raise ValueError(f"{entry.name} is longer than its declared size of {entry.size} bytes")
+        if zip64:
+            yield _DATA_DESCRIPTOR_64.pack(0x08074B50, crc, size, size)
+        else:
+            yield _DATA_DESCRIPTOR.pack(0x08074B50, crc, size, size)
+
+        fields = []
+        if zip64:
+            fields += [size, size]
+        if offset >= _MAX_32:
+            fields.append(offset)
+        central_extra = extra
+        if fields:
+            central_extra += struct.pack(f"<HH{len(fields)}Q", 0x0001, 8 * len(fields), *fields)
+        central_header = _CENTRAL_HEADER.pack(
+            0x02014B50,
+            _MADE_BY_UNIX | _VERSION_64,
+            _VERSION_64 if fields else _VERSION,
+            _FLAGS,
+            0,
+            time,
+            date,
+            crc,
+            _MAX_32 if zip64 else size,
+            _MAX_32 if zip64 else size,
+            len(name),
+            len(central_extra),
+            0,
+            0,
+            0,
+            _FILE_ATTRIBUTES,
+            min(offset, _MAX_32),
+        )
+        directory.append(central_header + name + central_extra)
+        offset += len(header) + len(name) + len(local_extra) + size
+        offset += _DATA_DESCRIPTOR_64.size if zip64 else _DATA_DESCRIPTOR.size
+        count += 1
+
+    directory_offset = offset
+    directory_size = 0
+    for record in directory:
+        directory_size += len(record)
+        yield record
+
+    if count >= _MAX_16 or directory_offset >= _MAX_32 or directory_size >= _MAX_32:
+        end_offset = directory_offset + directory_size
+        yield _END_OF_DIRECTORY_64.pack(
+            0x06064B50,
+            _END_OF_DIRECTORY_64.size - 12,
+            _MADE_BY_UNIX | _VERSION_64,
+            _VERSION_64,
+            0,
+            0,
+            count,
+            count,
+            directory_size,
+            directory_offset,
+        )
+        yield _END_OF_DIRECTORY_64_LOCATOR.pack(0x07064B50, 0, end_offset, 1)
+    yield _END_OF_DIRECTORY.pack(
+        0x06054B50,
+        0,
+        0,
+        min(count, _MAX_16),
+        min(count, _MAX_16),
+        min(directory_size, _MAX_32),
+        min(directory_offset, _MAX_32),
+        0,
+    )
@@ -0,0 +1,196 @@
+from .ttl_cache import CacheStats, register_cache
+from collections import OrderedDict
+from typing import Generic, Hashable, TypeVar
+import contextlib
+import os
+import shutil
+import tempfile
+import uuid
+
+_K = TypeVar("_K", bound=Hashable)
+_V = TypeVar("_V")
+
+
+class DiskCache(Generic[_K, _V]):
+    """
+    A cache of files on the local disk, bounded by their total size in bytes, evicting the least recently used files
+    once it is full.
+
+    Every entry is a file along with a value describing it. Files are written by the caller to a path reserved in the
+    cache directory and handed over once complete, and are never modified afterwards, so a file that is open while
+    its entry is evicted stays readable until it is closed. The cache directory is private to the process and removed
+    by close().
+
+    Args:
+        name (str): The name the cache's counters are reported under.
+        root (str): The directory the cache directory is created in.
+        max_bytes (int): The maximum total size of the cached files.
+    """
+
+    def __init__(self, name: str, root: str, max_bytes: int):
+        self.name = name
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix=f"{name}-", dir=root)
+        self._entries: OrderedDict[_K, tuple[str, int, _V]] = OrderedDict()
+        self._bytes = 0
+        self._stats = CacheStats()
+        register_cache(name, self)
+
+    def get(self, key: _K) -> tuple[str, _V] | None:
+        """
+        Looks up an entry, marking it as the most recently used.
+
+        Args:
+            key (_K): The key of the entry.
+
+        Returns:
+            tuple[str, _V] | None: The path of the cached file and its value, or None if there is no entry for the key.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats.hits += 1
+        return (entry[0], entry[2])
+
+    def peek(self, key: _K) -> tuple[str, _V] | None:
+        """
+        Looks up an entry without counting the lookup or changing the eviction order.
+
+        Args:
+            key (_K): The key of the entry.
+
+        Returns:
+            tuple[str, _V] | None: The path of the cached file and its value, or None if there is no entry for the key.
+        """
+        entry = self._entries.get(key)
+        return None if entry is None else (entry[0], entry[2])
+
+    def reserve(self) -> str:
+        """
+        Reserves the path of a new file in the cache directory, to be written and then handed over with put().
+
+        Returns:
+            str: The path to write the file to.
+        """
+        return os.path.join(self.directory, uuid.uuid4().hex)
+
+    def put(self, key: _K, file: str, size: int, value: _V) -> bool:
+        """
+        Hands a complete file over to the cache, replacing the entry for the key and evicting the least recently
+        used entries until the cache fits within its size in bytes. Files larger than the whole cache are deleted.
+
+        Args:
+            key (_K): The key of the entry.
+            file (str): The path of the file, as returned by reserve().
+            size (int): The size of the file in bytes.
+            value (_V): The value describing the file.
+
+        Returns:
+            bool: True if the file was cached.
+        """
+        self.invalidate(key)
+        if size > self.max_bytes:
+            self.unlink(file)
+            return False
+        self._entries[key] = (file, size, value)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (evicted, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.unlink(evicted)
+            self._stats.evictions += 1
+        return True
+
+    def refresh(self, key: _K, file: str, value: _V) -> None:
+        """
+        Replaces the value describing a cached file, if the entry for the key still holds that file.
+
+        Args:
+            key (_K): The key of the entry.
+            file (str): The path of the cached file, as returned by get().
+            value (_V): The new value describing the file.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == file:
+            self._entries[key] = (file, entry[1], value)
+
+    def pin(self, file: str) -> str:
+        """
+        Links a cached file to a new path in the cache directory, which stays in place when the entry is evicted.
+        Pinned paths don't count towards the size of the cache and are unlinked by the caller once it is done with
+        them.
+
+        Args:
+            file (str): The path of the cached file, as returned by get().
+
+        Returns:
+            str: The pinned path of the file.
+
+        Raises:
+            FileNotFoundError: If the file was evicted in the meantime.
+        """
+        pinned = self.reserve()
+        os.link(file, pinned)
+        return pinned
+
+    def invalidate(self, key: _K) -> None:
+        """
+        Drops the entry for the key and deletes its file, if there is one.
+
+        Args:
+            key (_K): The key of the entry.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+            self.unlink(entry[0])
+
+    def expire(self, key: _K) -> None:
+        """
+        Drops an entry that get() returned but turned out to be stale, counting that lookup as a miss.
+
+        Args:
+            key (_K): The key of the entry.
+        """
+        self.invalidate(key)
+        self._stats.hits -= 1
+        self._stats.misses += 1
+        self._stats.expirations += 1
+
+    def clear(self) -> None:
+        """
+        Drops every entry and deletes its file.
+        """
+        for key in list(self._entries):
+            self.invalidate(key)
+
+    def close(self) -> None:
+        """
+        Drops every entry and removes the cache directory.
+        """
+        self._entries.clear()
+        self._bytes = 0
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def stats(self) -> CacheStats:
+        """
+        Returns a snapshot of the cache's counters.
+
+        Returns:
+            CacheStats: The counters of the cache.
+        """
+        return self._stats.model_copy(update={"size": len(self._entries), "bytes": self._bytes})
+
+    @staticmethod
+    def unlink(file: str) -> None:
+        """
+        Deletes a file of the cache directory, such as a pinned path, if it still exists.
+
+        Args:
+            file (str): The path of the file.
+        """
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(file)
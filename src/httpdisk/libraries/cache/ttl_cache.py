@@ -0,0 +1,171 @@
+from collections import OrderedDict
+from pydantic import BaseModel, computed_field
+from typing import Callable, Generic, Hashable, Protocol, TypeVar
+import time
+
+_K = TypeVar("_K", bound=Hashable)
+_V = TypeVar("_V")
+
+
+class _ReportsStats(Protocol):
+    def stats(self) -> "CacheStats": ...
+
+
+_caches: dict[str, _ReportsStats] = {}
+
+
+class CacheStats(BaseModel):
+    """
+    Represents the counters of a cache.
+
+    Attributes:
+        size (int): The number of entries currently held.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups that found no live entry.
+        evictions (int): The number of entries dropped to stay within the size bound.
+        expirations (int): The number of entries dropped because their time to live had passed.
+        bytes (int): The number of bytes held, for caches bounded by their size in bytes.
+        hit_rate (float): The share of lookups answered from the cache.
+    """
+    size: int = 0
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    bytes: int = 0
+
+    @computed_field  # type: ignore[misc]
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class TTLCache(Generic[_K, _V]):
+    """
+    An in-process cache with a per-entry time to live and least recently used eviction once it is full.
+
+    Every cache registers itself under its name, so its counters can be reported by cache_stats().
+
+    Args:
+        name (str): The name the cache's counters are reported under.
+        max_size (int): The maximum number of entries held at once.
+        ttl (float): The default number of seconds an entry stays valid for.
+    """
+
+    def __init__(self, name: str, max_size: int, ttl: float):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[_K, tuple[float, _V]] = OrderedDict()
+        self._stats = CacheStats()
+        register_cache(name, self)
+
+    def get(self, key: _K) -> _V | None:
+        """
+        Looks up a live entry, marking it as the most recently used.
+
+        Args:
+            key (_K): The key of the entry.
+
+        Returns:
+            _V | None: The cached value, or None if there is no live entry for the key.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats.misses += 1
+            return None
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            self._stats.expirations += 1
+            self._stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats.hits += 1
+        return value
+
+    def peek(self, key: _K) -> _V | None:
+        """
+        Looks up a live entry without counting the lookup or changing the eviction order.
+
+        Args:
+            key (_K): The key of the entry.
+
+        Returns:
+            _V | None: The cached value, or None if there is no live entry for the key.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, key: _K, value: _V, ttl: float | None = None) -> None:
+        """
+        Stores an entry, evicting the least recently used entries if the cache is full.
+
+        Args:
+            key (_K): The key of the entry.
+            value (_V): The value to be cached.
+            ttl (float | None, optional): The number of seconds the entry stays valid for. Defaults to the cache's ttl.
+        """
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    def invalidate(self, key: _K) -> None:
+        """
+        Drops the entry for the key, if there is one.
+
+        Args:
+            key (_K): The key of the entry.
+        """
+        self._entries.pop(key, None)
+
+    def invalidate_matching(self, predicate: Callable[[_K], bool]) -> None:
+        """
+        Drops every entry whose key matches the predicate.
+
+        Args:
+            predicate (Callable[[_K], bool]): Decides whether the entry for a key should be dropped.
+        """
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        """
+        Drops every entry.
+        """
+        self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        """
+        Returns a snapshot of the cache's counters.
+
+        Returns:
+            CacheStats: The counters of the cache.
+        """
+        return self._stats.model_copy(update={"size": len(self._entries)})
+
+
+def register_cache(name: str, cache: _ReportsStats) -> None:
+    """
+    Registers a cache under its name, so its counters are reported by cache_stats().
+
+    Args:
+        name (str): The name the cache's counters are reported under.
+        cache (_ReportsStats): The cache, reporting its counters through stats().
+    """
+    _caches[name] = cache
+
+
+def cache_stats() -> dict[str, CacheStats]:
+    """
+    Returns a snapshot of the counters of every cache created in this process.
+
+    Returns:
+        dict[str, CacheStats]: The counters of every cache, by cache name.
+    """
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,38 @@
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class CachePolicyMiddleware:
+    """
+    Sets the Cache-Control header of responses by the route that handled the request.
+
+    Routes are identified by their path template, e.g. "/file/{filename}". Responses that set Cache-Control
+    themselves keep their own header.
+
+    Args:
+        app (ASGIApp): The application to wrap.
+        policies (dict[str, str]): The Cache-Control header value for each route path template.
+        default (str | None, optional): The Cache-Control header value for the other routes. Defaults to None, which
+            leaves their responses as they are.
+    """
+
+    def __init__(self, app: ASGIApp, policies: dict[str, str], default: str | None = None):
+        self.app = app
+        self.policies = policies
+        self.default = default
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_policy(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                path = getattr(scope.get("route"), "path", None)
+                policy = self.policies.get(path, self.default) if path is not None else self.default
+                if policy is not None:
+                    headers = MutableHeaders(scope=message)
+                    headers.setdefault("Cache-Control", policy)
+            await send(message)
+
+        await self.app(scope, receive, send_with_policy)
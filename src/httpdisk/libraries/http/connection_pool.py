@@ -0,0 +1,141 @@
+from pydantic import BaseModel
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Protocol
+import time
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+class _ReportsStats(Protocol):
+    def stats(self) -> "ConnectionPoolStats": ...
+
+
+_pools: dict[str, _ReportsStats] = {}
+
+
+class ConnectionPoolStats(BaseModel):
+    """
+    Represents the usage of a pool of outgoing HTTP connections.
+
+    Attributes:
+        limit (int): The maximum number of connections open at once, or 0 if unbounded.
+        in_use (int): The number of connections currently serving a request.
+        idle (int): The number of open connections kept alive for reuse.
+        waiting (int): The number of requests currently queued for a free connection.
+        opened (int): The number of connections opened.
+        reused (int): The number of requests served by a kept-alive connection.
+        queued (int): The number of requests that had to wait for a free connection.
+        queued_seconds (float): The total time requests spent waiting for a free connection.
+    """
+    limit: int = 0
+    in_use: int = 0
+    idle: int = 0
+    waiting: int = 0
+    opened: int = 0
+    reused: int = 0
+    queued: int = 0
+    queued_seconds: float = 0.0
+
+
+class ConnectionPool:
+    """
+    A pool of outgoing HTTP connections shared by every request of an aiohttp session, which reports its usage.
+
+    The pool registers itself under its name, so its usage can be reported by pool_stats(). The session is only
+    created by session(), which must be called from a running event loop.
+
+    Args:
+        name (str): The name the pool's usage is reported under.
+        limit (int): The maximum number of connections open at once, or 0 for no limit.
+        limit_per_host (int): The maximum number of connections open to the same host at once, or 0 for no limit.
+        keepalive_timeout (float): The number of seconds an idle connection is kept open for reuse.
+    """
+
+    def __init__(self, name: str, limit: int = 100, limit_per_host: int = 0, keepalive_timeout: float = 15.0):
+        self.name = name
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self._connector: "aiohttp.TCPConnector | None" = None
+        self._stats = ConnectionPoolStats(limit=limit)
+        register_pool(name, self)
+
+    def session(self, **kwargs: Any) -> "aiohttp.ClientSession":
+        """
+        Creates a client session whose requests share the connections of the pool.
+
+        Args:
+            **kwargs: The other arguments of the session.
+
+        Returns:
+            aiohttp.ClientSession: The session, closing the pool's connections once it is closed.
+        """
+        # aiohttp is only needed by the backends talking HTTP, so it is not imported along with the application.
+        import aiohttp
+
+        self._connector = aiohttp.TCPConnector(
+            limit=self.limit, limit_per_host=self.limit_per_host, keepalive_timeout=self.keepalive_timeout
+        )
+        trace = aiohttp.TraceConfig()
+        # aiosignal types the callbacks of a signal as taking a single argument, unlike aiohttp's trace signals.
+        trace.on_connection_create_end.append(self._on_connection_opened)  # type: ignore[arg-type]
+        trace.on_connection_reuseconn.append(self._on_connection_reused)  # type: ignore[arg-type]
+        trace.on_connection_queued_start.append(self._on_connection_queued_start)  # type: ignore[arg-type]
+        trace.on_connection_queued_end.append(self._on_connection_queued_end)  # type: ignore[arg-type]
+        return aiohttp.ClientSession(connector=self._connector, trace_configs=[trace], **kwargs)
+
+    async def _on_connection_opened(self, session: object, context: SimpleNamespace, params: object) -> None:
+        self._stats.opened += 1
+
+    async def _on_connection_reused(self, session: object, context: SimpleNamespace, params: object) -> None:
+        self._stats.reused += 1
+
+    async def _on_connection_queued_start(self, session: object, context: SimpleNamespace, params: object) -> None:
+        context.queued_at = time.monotonic()
+        self._stats.queued += 1
+
+    async def _on_connection_queued_end(self, session: object, context: SimpleNamespace, params: object) -> None:
+        self._stats.queued_seconds += time.monotonic() - context.queued_at
+
+    def stats(self) -> ConnectionPoolStats:
+        """
+        Returns a snapshot of the pool's usage.
+
+        The connections currently in use, idle and waited for are read from the connector, as aiohttp only reports
+        them through its internal state.
+
+        Returns:
+            ConnectionPoolStats: The usage of the pool.
+        """
+        connector = self._connector
+        if connector is None or connector.closed:
+            return self._stats.model_copy()
+        return self._stats.model_copy(
+            update={
+                "in_use": len(getattr(connector, "_acquired", ())),
+                "idle": sum(len(connections) for connections in getattr(connector, "_conns", {}).values()),
+                "waiting": sum(len(waiters) for waiters in getattr(connector, "_waiters", {}).values()),
+            }
+        )
+
+
+def register_pool(name: str, pool: _ReportsStats) -> None:
+    """
+    Registers a connection pool under its name, so its usage is reported by pool_stats().
+
+    Args:
+        name (str): The name the pool's usage is reported under.
+        pool (_ReportsStats): The pool, reporting its usage through stats().
+    """
+    _pools[name] = pool
+
+
+def pool_stats() -> dict[str, ConnectionPoolStats]:
+    """
+    Returns a snapshot of the usage of every connection pool created in this process.
+
+    Returns:
+        dict[str, ConnectionPoolStats]: The usage of every pool, by pool name.
+    """
+    return {name: pool.stats() for name, pool in _pools.items()}
@@ -0,0 +1,59 @@
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from ..object_storage.exceptions import StorageTimeoutError, StorageUnavailableError
+import starlette.status as status
+import datetime
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Seconds clients are asked to wait before retrying a request the object storage could not serve.
+STORAGE_RETRY_AFTER = int(os.getenv("STORAGE_RETRY_AFTER", 1))
+
+
+async def storage_unavailable_handler(request: Request, exc: Exception) -> JSONResponse:
+    """
+    Answers requests that failed because the object storage could not be reached with 503 Service Unavailable, or
+    504 Gateway Timeout if the storage did not answer in time, asking the client to retry.
+
+    Args:
+        request (Request): The request that failed.
+        exc (Exception): The error of the storage, a StorageUnavailableError. Other errors are raised again.
+
+    Returns:
+        JSONResponse: The error response, with a Retry-After header.
+    """
+    if not isinstance(exc, StorageUnavailableError):
+        raise exc
+    logger.critical(
+        {
+            "time": datetime.datetime.now(),
+            "message": "Object storage unavailable",
+            "operation": exc.operation,
+            "attempts": exc.attempts,
+            "exception": exc.__cause__,
+        }
+    )
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    if isinstance(exc, StorageTimeoutError):
+        status_code = status.HTTP_504_GATEWAY_TIMEOUT
+    return JSONResponse(
+        content={"detail": "Storage unavailable, try again later"},
+        status_code=status_code,
+        headers={"Retry-After": str(STORAGE_RETRY_AFTER)},
+    )
+
+
+async def invalid_path_handler(request: Request, exc: Exception) -> JSONResponse:
+    """
+    Answers requests naming a file by a path that could resolve outside of the user's disk with 400 Bad Request.
+
+    Args:
+        request (Request): The request that failed.
+        exc (Exception): The InvalidPathError raised for the path.
+
+    Returns:
+        JSONResponse: The error response.
+    """
+    return JSONResponse(content={"detail": "Invalid filename"}, status_code=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,46 @@
+from ..metrics.metrics import record_request, record_startup
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import time
+
+
+class MetricsMiddleware:
+    """
+    Records the latency and status of every HTTP request by the route that handled it.
+
+    Routes are identified by their path template, e.g. "/file/{filename}", so the number of recorded series stays
+    bounded. Requests no route matched are recorded under "unmatched". Latency is measured until the last byte of
+    the response is sent, so it includes streaming the body.
+
+    Args:
+        app (ASGIApp): The application to wrap.
+        started (float | None, optional): The time.perf_counter() reading taken when the import of the application
+            started. If set, the time until the first request is served is recorded as the "first_request" startup
+            phase. Defaults to None.
+    """
+
+    def __init__(self, app: ASGIApp, started: float | None = None):
+        self.app = app
+        self.started = started
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            record_request(scope["method"], route, status, time.perf_counter() - start)
+            if self.started is not None:
+                record_startup("first_request", time.perf_counter() - self.started)
+                self.started = None
@@ -0,0 +1,22 @@
+from typing import TYPE_CHECKING
+import functools
+
+if TYPE_CHECKING:
+    from fastapi.templating import Jinja2Templates
+
+
+@functools.cache
+def get_templates(directory: str = "templates") -> "Jinja2Templates":
+    """
+    Returns the templates of the HTML pages, importing the templating engine and loading the templates the first time
+    a page is rendered rather than when the application starts.
+
+    Args:
+        directory (str, optional): The directory the templates are loaded from. Defaults to "templates".
+
+    Returns:
+        Jinja2Templates: The templates, shared by every caller asking for the same directory.
+    """
+    from fastapi.templating import Jinja2Templates
+
+    return Jinja2Templates(directory=directory)
@@ -0,0 +1,114 @@
+from .metrics import add_sink
+from typing import Any, AsyncGenerator
+import asyncio
+import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AzureMonitorSink:
+    """
+    Forwards recorded metrics to Azure Monitor through OpenTelemetry.
+
+    The Azure Monitor distribution, which also exports the application's logs and traces, is imported and configured
+    in a worker thread once the application has started, and the sink only starts receiving metrics when that is
+    done. Startup therefore neither waits for the distribution's heavy imports nor hangs when the monitor endpoint
+    cannot be reached, and metrics recorded before the sink is ready are not exported.
+
+    Args:
+        connection_string (str | None, optional): The Application Insights connection string. Defaults to None, which
+            reads it from the APPLICATIONINSIGHTS_CONNECTION_STRING environment variable.
+    """
+
+    def __init__(self, connection_string: str | None = None):
+        self.connection_string = connection_string
+        self._durations: Any = None
+        self._errors: Any = None
+        self._bytes: Any = None
+        self._requests: Any = None
+
+    async def context(self) -> AsyncGenerator[None, None]:
+        """
+        Configures the sink in the background for as long as the application is running.
+        """
+        task = asyncio.create_task(self._start())
+        yield
+        if not task.done():
+            task.cancel()
+
+    async def _start(self) -> None:
+        started = datetime.datetime.now()
+        try:
+            await asyncio.to_thread(self._configure)
+        except Exception as e:
+            logger.critical(
+                {"time": datetime.datetime.now(), "message": "Failed to configure telemetry", "exception": e}
+            )
+            return
+        add_sink(self)
+        elapsed = (datetime.datetime.now() - started).total_seconds()
+        logger.info({"time": datetime.datetime.now(), "message": "Telemetry configured", "seconds": elapsed})
+
+    def _configure(self) -> None:
+        from azure.monitor.opentelemetry import configure_azure_monitor
+        from opentelemetry import metrics
+
+        if self.connection_string is None:
+            configure_azure_monitor()
+        else:
+            configure_azure_monitor(connection_string=self.connection_string)
+        meter = metrics.get_meter("httpdisk")
+        self._durations = meter.create_histogram(
+            "httpdisk.operation.duration", unit="s", description="Latency of storage and repository operations."
+        )
+        self._errors = meter.create_counter(
+            "httpdisk.operation.errors", description="Storage and repository operations that raised, by exception."
+        )
+        self._bytes = meter.create_counter(
+            "httpdisk.operation.bytes", unit="By", description="Bytes passed to and returned by operations."
+        )
+        self._requests = meter.create_histogram(
+            "httpdisk.http.request.duration", unit="s", description="Latency of HTTP requests, by route."
+        )
+
+    def record_operation(self, component: str, operation: str, seconds: float, error: str | None) -> None:
+        """
+        Records a single call of an operation.
+
+        Args:
+            component (str): The name of the component the operation belongs to.
+            operation (str): The name of the operation.
+            seconds (float): The time the call took.
+            error (str | None): The name of the exception the call raised, or None if it succeeded.
+        """
+        attributes = {"component": component, "operation": operation}
+        self._durations.record(seconds, attributes)
+        if error is not None:
+            self._errors.add(1, {**attributes, "error": error})
+
+    def record_bytes(self, component: str, operation: str, bytes_in: int, bytes_out: int) -> None:
+        """
+        Records bytes passed to or returned by an operation.
+
+        Args:
+            component (str): The name of the component the operation belongs to.
+            operation (str): The name of the operation.
+            bytes_in (int): The number of bytes passed to the operation.
+            bytes_out (int): The number of bytes returned by the operation.
+        """
+        for direction, count in (("in", bytes_in), ("out", bytes_out)):
+            if count:
+                self._bytes.add(count, {"component": component, "operation": operation, "direction": direction})
+
+    def record_request(self, method: str, route: str, status: int, seconds: float) -> None:
+        """
+        Records a single HTTP request.
+
+        Args:
+            method (str): The HTTP method of the request.
+            route (str): The path template of the route that handled the request.
+            status (int): The status code of the response.
+            seconds (float): The time from receiving the request to sending the last byte of the response.
+        """
+        self._requests.record(seconds, {"method": method, "route": route, "status": status})
@@ -0,0 +1,116 @@
+from ..object_storage.models import ObjectStream
+from .metrics import record_bytes, record_operation
+from typing import Any, AsyncIterator, Callable, TypeVar, cast
+import collections.abc
+import functools
+import inspect
+import time
+
+_T = TypeVar("_T")
+
+
+class Instrumented:
+    """
+    Records the latency, errors and bytes transferred of every call made to the coroutine and async generator methods
+    of another object, and passes every other attribute through untouched.
+
+    Bytes objects passed to a call count as bytes in and bytes objects returned as bytes out. Async iterators passed
+    to a call, and the chunks of object streams returned, are counted as they are consumed. Calls of async generator
+    methods are timed from the first item to the last one the caller reads.
+
+    Args:
+        target (Any): The object to instrument, e.g. an object storage or a repository.
+        component (str): The name the object's operations are recorded under.
+    """
+
+    def __init__(self, target: Any, component: str):
+        self._target = target
+        self._component = component
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._target, name)
+        if name.startswith("_") or name == "context":
+            return attribute
+        if inspect.iscoroutinefunction(attribute):
+            wrapped = self._wrap_coroutine(name, attribute)
+        elif inspect.isasyncgenfunction(attribute):
+            wrapped = self._wrap_generator(name, attribute)
+        else:
+            return attribute
+        self.__dict__[name] = wrapped
+        return wrapped
+
+    def _wrap_coroutine(self, operation: str, method: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(method)
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            bytes_in = 0
+            args = tuple(self._count_argument(operation, value) for value in args)
+            kwargs = {key: self._count_argument(operation, value) for key, value in kwargs.items()}
+            for value in (*args, *kwargs.values()):
+                if isinstance(value, (bytes, bytearray, memoryview)):
+                    bytes_in += len(value)
+
+            start = time.perf_counter()
+            try:
+                result = await method(*args, **kwargs)
+            except Exception as e:
+                record_operation(self._component, operation, time.perf_counter() - start, type(e).__name__)
+                raise
+            record_operation(self._component, operation, time.perf_counter() - start)
+
+            bytes_out = 0
+            if isinstance(result, (bytes, bytearray)):
+                bytes_out = len(result)
+            elif isinstance(result, ObjectStream):
+                update = {"chunks": self._count(operation, result.chunks, "out")}
+                if result.encoded_chunks is not None:
+                    update["encoded_chunks"] = self._count(operation, result.encoded_chunks, "out")
+                result = result.model_copy(update=update)
+            if bytes_in or bytes_out:
+                record_bytes(self._component, operation, bytes_in, bytes_out)
+            return result
+
+        return call
+
+    def _wrap_generator(self, operation: str, method: Callable[..., AsyncIterator[Any]]) -> Callable[..., Any]:
+        @functools.wraps(method)
+        async def call(*args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+            start = time.perf_counter()
+            error = None
+            try:
+                async for item in method(*args, **kwargs):
+                    yield item
+            except Exception as e:
+                error = type(e).__name__
+                raise
+            finally:
+                record_operation(self._component, operation, time.perf_counter() - start, error)
+
+        return call
+
+    def _count_argument(self, operation: str, value: Any) -> Any:
+        if isinstance(value, collections.abc.AsyncIterator):
+            return self._count(operation, value, "in")
+        return value
+
+    async def _count(self, operation: str, chunks: AsyncIterator[bytes], direction: str) -> AsyncIterator[bytes]:
+        async for chunk in chunks:
+            if direction == "in":
+                record_bytes(self._component, operation, bytes_in=len(chunk))
+            else:
+                record_bytes(self._component, operation, bytes_out=len(chunk))
+            yield chunk
+
+
+def instrument(target: _T, component: str) -> _T:
+    """
+    Instruments an object, typed as the object itself, as the instrumented object stands in for it everywhere.
+
+    Args:
+        target (_T): The object to instrument.
+        component (str): The name the object's operations are recorded under.
+
+    Returns:
+        _T: The instrumented object.
+    """
+    return cast(_T, Instrumented(target, component))
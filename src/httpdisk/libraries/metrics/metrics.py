@@ -0,0 +1,463 @@
+from ..cache.ttl_cache import cache_stats
+from ..http.connection_pool import pool_stats
+from typing import AsyncGenerator, Mapping, Protocol
+import asyncio
+import bisect
+import datetime
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class MetricsSinkProtocol(Protocol):
+    def record_operation(self, component: str, operation: str, seconds: float, error: str | None) -> None:
+        """
+        Records a single call of an operation.
+
+        Args:
+            component (str): The name of the component the operation belongs to, e.g. "object_storage".
+            operation (str): The name of the operation, e.g. "get_object".
+            seconds (float): The time the call took.
+            error (str | None): The name of the exception the call raised, or None if it succeeded.
+        """
+        ...
+
+    def record_bytes(self, component: str, operation: str, bytes_in: int, bytes_out: int) -> None:
+        """
+        Records bytes passed to or returned by an operation.
+
+        Args:
+            component (str): The name of the component the operation belongs to.
+            operation (str): The name of the operation.
+            bytes_in (int): The number of bytes passed to the operation.
+            bytes_out (int): The number of bytes returned by the operation.
+        """
+        ...
+
+    def record_request(self, method: str, route: str, status: int, seconds: float) -> None:
+        """
+        Records a single HTTP request.
+
+        Args:
+            method (str): The HTTP method of the request.
+            route (str): The path template of the route that handled the request.
+            status (int): The status code of the response.
+            seconds (float): The time from receiving the request to sending the last byte of the response.
+        """
+        ...
+
+
+class Histogram:
+    """
+    Counts observations into cumulative buckets, the way Prometheus histograms do.
+
+    Args:
+        buckets (tuple[float, ...]): The upper bounds of the buckets, in ascending order.
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """
+        Adds an observation.
+
+        Args:
+            value (float): The observed value.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """
+        Returns the number of observations up to every bucket's upper bound, ending with the "+Inf" bucket.
+
+        Returns:
+            list[tuple[str, int]]: The upper bound and cumulative count of every bucket.
+        """
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((repr(bound), total))
+        result.append(("+Inf", self.count))
+        return result
+
+
+def _labels(**labels: str) -> str:
+    pairs = []
+    for name, value in labels.items():
+        escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class MetricsRegistry:
+    """
+    Keeps the recorded metrics in process and renders them in the Prometheus text exposition format.
+
+    Args:
+        buckets (tuple[float, ...], optional): The upper bounds of the latency histogram buckets in seconds.
+            Defaults to DEFAULT_BUCKETS.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._operations: dict[tuple[str, ...], Histogram] = {}
+        self._errors: dict[tuple[str, ...], int] = {}
+        self._bytes: dict[tuple[str, ...], int] = {}
+        self._requests: dict[tuple[str, ...], Histogram] = {}
+        self._startup: dict[tuple[str, ...], float] = {}
+
+    def record_operation(self, component: str, operation: str, seconds: float, error: str | None) -> None:
+        """
+        Records a single call of an operation.
+
+        Args:
+            component (str): The name of the component the operation belongs to.
+            operation (str): The name of the operation.
+            seconds (float): The time the call took.
+            error (str | None): The name of the exception the call raised, or None if it succeeded.
+        """
+        key = (component, operation)
+        histogram = self._operations.get(key)
+        if histogram is None:
+            histogram = self._operations[key] = Histogram(self.buckets)
+        histogram.observe(seconds)
+        if error is not None:
+            error_key = (component, operation, error)
+            self._errors[error_key] = self._errors.get(error_key, 0) + 1
+
+    def record_bytes(self, component: str, operation: str, bytes_in: int, bytes_out: int) -> None:
+        """
+        Records bytes passed to or returned by an operation.
+
+        Args:
+            component (str): The name of the component the operation belongs to.
+            operation (str): The name of the operation.
+            bytes_in (int): The number of bytes passed to the operation.
+            bytes_out (int): The number of bytes returned by the operation.
+        """
+        for direction, count in (("in", bytes_in), ("out", bytes_out)):
+            if count:
+                key = (component, operation, direction)
+                self._bytes[key] = self._bytes.get(key, 0) + count
+
+    def record_request(self, method: str, route: str, status: int, seconds: float) -> None:
+        """
+        Records a single HTTP request.
+
+        Args:
+            method (str): The HTTP method of the request.
+            route (str): The path template of the route that handled the request.
+            status (int): The status code of the response.
+            seconds (float): The time from receiving the request to sending the last byte of the response.
+        """
+        key = (method, route, str(status))
+        histogram = self._requests.get(key)
+        if histogram is None:
+            histogram = self._requests[key] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+    def record_startup(self, phase: str, seconds: float) -> None:
+        """
+        Records the time it took the process to reach a phase of its startup, once per phase.
+
+        Args:
+            phase (str): The name of the phase, e.g. "ready".
+            seconds (float): The time from the start of the import of the application to the phase.
+        """
+        self._startup.setdefault((phase,), seconds)
+
+    def render(self, **constant: str) -> str:
+        """
+        Renders every recorded metric, and the counters of every cache and connection pool, in the Prometheus text
+        exposition format.
+
+        Args:
+            **constant (str): Labels added to every sample, e.g. the worker the metrics were recorded in.
+
+        Returns:
+            str: The metrics, one sample per line.
+        """
+        lines: list[str] = []
+
+        def histograms(
+            name: str, help: str, entries: Mapping[tuple[str, ...], Histogram], names: tuple[str, ...]
+        ) -> None:
+            lines.extend((f"# HELP {name} {help}", f"# TYPE {name} histogram"))
+            for key, histogram in sorted(entries.items()):
+                labels = {**constant, **dict(zip(names, key))}
+                for bound, count in histogram.cumulative():
+                    lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {count}")
+                lines.append(f"{name}_sum{_labels(**labels)} {histogram.sum!r}")
+                lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+
+        def samples(
+            name: str, kind: str, help: str, entries: Mapping[tuple[str, ...], float], names: tuple[str, ...]
+        ) -> None:
+            lines.extend((f"# HELP {name} {help}", f"# TYPE {name} {kind}"))
+            for key, value in sorted(entries.items()):
+                lines.append(f"{name}{_labels(**constant, **dict(zip(names, key)))} {value}")
+
+        histograms(
+            "httpdisk_operation_duration_seconds",
+            "Latency of storage and repository operations.",
+            self._operations,
+            ("component", "operation"),
+        )
+        samples(
+            "httpdisk_operation_errors_total",
+            "counter",
+            "Storage and repository operations that raised, by exception.",
+            self._errors,
+            ("component", "operation", "error"),
+        )
+        samples(
+            "httpdisk_operation_bytes_total",
+            "counter",
+            "Bytes passed to (in) and returned by (out) storage and repository operations.",
+            self._bytes,
+            ("component", "operation", "direction"),
+        )
+        histograms(
+            "httpdisk_http_request_duration_seconds",
+            "Latency of HTTP requests, by route path template.",
+            self._requests,
+            ("method", "route", "status"),
+        )
+
+        samples(
+            "httpdisk_startup_seconds",
+            "gauge",
+            "Time from the start of the import of the application to each phase of its startup.",
+            self._startup,
+            ("phase",),
+        )
+
+        caches = cache_stats()
+        for field, kind, help in (
+            ("size", "gauge", "Entries held by the cache."),
+            ("bytes", "gauge", "Bytes held by the cache, for caches bounded by size in bytes."),
+            ("hits", "counter", "Lookups answered from the cache."),
+            ("misses", "counter", "Lookups that found no live entry."),
+            ("evictions", "counter", "Entries dropped to stay within the size bound."),
+            ("expirations", "counter", "Entries dropped because their time to live passed."),
+        ):
+            name = f"httpdisk_cache_{field}" + ("_total" if kind == "counter" else "")
+            samples(name, kind, help, {(cache,): getattr(stats, field) for cache, stats in caches.items()}, ("cache",))
+
+        pools = pool_stats()
+        for field, kind, help in (
+            ("limit", "gauge", "Maximum number of connections the pool opens at once, or 0 if unbounded."),
+            ("in_use", "gauge", "Connections currently serving a request."),
+            ("idle", "gauge", "Open connections kept alive for reuse."),
+            ("waiting", "gauge", "Requests currently queued for a free connection."),
+            ("opened", "counter", "Connections opened."),
+            ("reused", "counter", "Requests served by a kept-alive connection."),
+            ("queued", "counter", "Requests that had to wait for a free connection."),
+            ("queued_seconds", "counter", "Time requests spent waiting for a free connection."),
+        ):
+            name = f"httpdisk_connection_pool_{field}" + ("_total" if kind == "counter" else "")
+            samples(name, kind, help, {(pool,): getattr(stats, field) for pool, stats in pools.items()}, ("pool",))
+        return "\n".join(lines) + "\n"
+
+
+def merge_rendered(texts: list[str]) -> str:
+    """
+    Merges metrics rendered in the Prometheus text exposition format, so the samples of every metric follow its
+    HELP and TYPE lines once.
+
+    Args:
+        texts (list[str]): The rendered metrics, whose samples are told apart by their labels.
+
+    Returns:
+        str: The merged metrics, one sample per line.
+    """
+    families: dict[str, tuple[list[str], list[str]]] = {}
+    header: list[str] = []
+    samples: list[str] = []
+    for text in texts:
+        for line in text.splitlines():
+            if line.startswith("# HELP "):
+                header, samples = families.setdefault(line.split(" ", 3)[2], ([line], []))
+            elif line.startswith("# TYPE "):
+                if len(header) == 1:
+                    header.append(line)
+            elif line:
+                samples.append(line)
+    return "".join("\n".join(header + samples) + "\n" for header, samples in families.values())
+
+
+class MultiprocessCollector:
+    """
+    Shares the metrics of the processes serving the application, e.g. the workers of a server, through a directory.
+
+    Every process writes its metrics, labelled with its process ID, to a file of the directory every interval and
+    when it stops, and renders those of every process that wrote recently on request. Counters and histograms are
+    therefore summed over the worker label by the scraper, and the metrics of the other processes lag by up to an
+    interval.
+
+    Args:
+        directory (str): The directory shared by the processes.
+        interval (float, optional): The number of seconds between two writes. Defaults to 5.
+    """
+
+    def __init__(self, directory: str, interval: float = 5):
+        self.directory = directory
+        self.interval = interval
+        self.path = os.path.join(directory, f"{os.getpid()}.prom")
+
+    async def context(self) -> AsyncGenerator[None, None]:
+        """
+        Writes the metrics of this process periodically for as long as the application is running, and makes
+        render_metrics() report those of every process.
+        """
+        global _collector
+        await asyncio.to_thread(os.makedirs, self.directory, exist_ok=True)
+        task = asyncio.create_task(self._write_periodically())
+        _collector = self
+        yield
+        _collector = None
+        task.cancel()
+        await asyncio.to_thread(self._write, self._render())
+
+    async def render(self) -> str:
+        """
+        Renders the metrics of every process that wrote them within the last three intervals, the current metrics of
+        this process included.
+
+        Returns:
+            str: The metrics, one sample per line.
+        """
+        return await asyncio.to_thread(self._merge, self._render())
+
+    def _render(self) -> str:
+        # Rendered on the event loop, which records into the registry while it is iterated.
+        return registry.render(worker=str(os.getpid()))
+
+    def _merge(self, text: str) -> str:
+        self._write(text)
+        texts = []
+        expired = time.time() - 3 * self.interval
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".prom"):
+                continue
+            try:
+                if entry.path != self.path and entry.stat().st_mtime < expired:
+                    continue
+                with open(entry.path) as file:
+                    texts.append(file.read())
+            except FileNotFoundError:
+                continue
+        return merge_rendered(texts)
+
+    async def _write_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self._write, self._render())
+            except Exception as e:
+                logger.critical({"time": datetime.datetime.now(), "message": "Failed to write metrics", "exception": e})
+
+    def _write(self, text: str) -> None:
+        # Replaced at once, so other processes never read a partial file.
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as file:
+            file.write(text)
+        os.replace(temporary, self.path)
+
+
+registry = MetricsRegistry()
+_sinks: list[MetricsSinkProtocol] = [registry]
+_collector: MultiprocessCollector | None = None
+
+
+def add_sink(sink: MetricsSinkProtocol) -> None:
+    """
+    Registers a sink, so it receives every metric recorded from then on along with the in-process registry.
+
+    Args:
+        sink (MetricsSinkProtocol): The sink to add.
+    """
+    _sinks.append(sink)
+
+
+def record_operation(component: str, operation: str, seconds: float, error: str | None = None) -> None:
+    """
+    Records a single call of an operation in every sink.
+
+    Args:
+        component (str): The name of the component the operation belongs to.
+        operation (str): The name of the operation.
+        seconds (float): The time the call took.
+        error (str | None, optional): The name of the exception the call raised. Defaults to None.
+    """
+    for sink in _sinks:
+        sink.record_operation(component, operation, seconds, error)
+
+
+def record_bytes(component: str, operation: str, bytes_in: int = 0, bytes_out: int = 0) -> None:
+    """
+    Records bytes passed to or returned by an operation in every sink.
+
+    Args:
+        component (str): The name of the component the operation belongs to.
+        operation (str): The name of the operation.
+        bytes_in (int, optional): The number of bytes passed to the operation. Defaults to 0.
+        bytes_out (int, optional): The number of bytes returned by the operation. Defaults to 0.
+    """
+    for sink in _sinks:
+        sink.record_bytes(component, operation, bytes_in, bytes_out)
+
+
+def record_request(method: str, route: str, status: int, seconds: float) -> None:
+    """
+    Records a single HTTP request in every sink.
+
+    Args:
+        method (str): The HTTP method of the request.
+        route (str): The path template of the route that handled the request.
+        status (int): The status code of the response.
+        seconds (float): The time from receiving the request to sending the last byte of the response.
+    """
+    for sink in _sinks:
+        sink.record_request(method, route, status, seconds)
+
+
+def record_startup(phase: str, seconds: float) -> None:
+    """
+    Records the time it took the process to reach a phase of its startup in the in-process registry, and logs it.
+
+    Args:
+        phase (str): The name of the phase, e.g. "ready".
+        seconds (float): The time from the start of the import of the application to the phase.
+    """
+    registry.record_startup(phase, seconds)
+    logger.info(
+        {"time": datetime.datetime.now(), "message": "Startup phase reached", "phase": phase, "seconds": seconds}
+    )
+
+
+async def render_metrics() -> str:
+    """
+    Renders the metrics of every process sharing them through a MultiprocessCollector, or those of this process.
+
+    Returns:
+        str: The metrics in the Prometheus text exposition format, one sample per line.
+    """
+    if _collector is not None:
+        return await _collector.render()
+    return registry.render()
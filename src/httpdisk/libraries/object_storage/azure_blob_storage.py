@@ -1,43 +1,122 @@
-from azure.storage.blob.aio import BlobServiceClient, StorageStreamDownloader
-from typing import AsyncGenerator
+from azure.storage.blob import BlobProperties
+from azure.storage.blob.aio import BlobServiceClient, BlobPrefix, ContainerClient, StorageStreamDownloader
+from azure.core import MatchConditions
+from azure.core.async_paging import AsyncPageIterator
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.core.pipeline.transport import AioHttpTransport
+from aiohttp import DummyCookieJar
+from pydantic import BaseModel, Field
+from typing import Any, AsyncGenerator, AsyncIterator, cast
+from ..http.connection_pool import ConnectionPool
+from .models import ObjectPage, ObjectProperties, ObjectStream
+import base64
+import uuid
+
+
+class AzureBlobStorageConfig(BaseModel):
+    """
+    Represents the transport settings of the Azure Blob Storage client. The defaults are those of the SDK, except for
+    max_single_get_size, which is lowered to the chunk size of further requests so a streaming download never
+    buffers more than one chunk before its first chunk is yielded.
+
+    Attributes:
+        max_connections (int): The maximum number of connections open to the account at once, or 0 for no limit.
+        max_connections_per_host (int): The maximum number of connections open to the same host at once, or 0 for no
+            limit.
+        keepalive_timeout (float): The number of seconds an idle connection is kept open for reuse.
+        connection_timeout (float): The number of seconds to wait for a connection to be established.
+        read_timeout (float): The number of seconds to wait for data from the service between two reads.
+        max_single_put_size (int): The largest upload in bytes sent in a single request rather than in blocks.
+        max_block_size (int): The size in bytes of the blocks larger uploads are split into.
+        max_single_get_size (int): The number of bytes fetched by the first request of a download, and buffered before
+            its first chunk is yielded.
+        max_chunk_get_size (int): The number of bytes fetched by every further request of a download.
+        max_concurrency (int): The number of requests a single upload or download of a whole object sends at once.
+        retries (int): The number of times the client retries a failed request itself.
+    """
+    max_connections: int = Field(default=100, ge=0)
+    max_connections_per_host: int = Field(default=0, ge=0)
+    keepalive_timeout: float = Field(default=15.0, gt=0)
+    connection_timeout: float = Field(default=20.0, gt=0)
+    read_timeout: float = Field(default=60.0, gt=0)
+    max_single_put_size: int = Field(default=64 * 1024**2, gt=0)
+    max_block_size: int = Field(default=4 * 1024**2, gt=0)
+    max_single_get_size: int = Field(default=4 * 1024**2, gt=0)
+    max_chunk_get_size: int = Field(default=4 * 1024**2, gt=0)
+    max_concurrency: int = Field(default=1, ge=1)
+    retries: int = Field(default=3, ge=0)
 
 
 class AzureBlobStorage:
-    def __init__(self, connection_string: str, container_name: str):
+    _batch_size = 256
+
+    def __init__(self, connection_string: str, container_name: str, config: AzureBlobStorageConfig | None = None):
         """
         Initializes an instance of the AzureBlobStorage class.
 
         Args:
             connection_string (str): The connection string for the Azure Blob Storage account.
             container_name (str): The name of the container in the Azure Blob Storage account.
+            config (AzureBlobStorageConfig | None, optional): The transport settings of the client. Defaults to the
+                settings of the SDK.
         """
         self.connection_string = connection_string
         self.container_name = container_name
-        self.initialize = self._initialize()
+        self.config = config or AzureBlobStorageConfig()
+        self.connection_pool = ConnectionPool(
+            "azure_blob_storage",
+            limit=self.config.max_connections,
+            limit_per_host=self.config.max_connections_per_host,
+            keepalive_timeout=self.config.keepalive_timeout,
+        )
+        self._blob_service_client: BlobServiceClient | None = None
+        self._container_client: ContainerClient | None = None
 
-    async def _initialize(self):
+    @property
+    def blob_service_client(self) -> BlobServiceClient:
         """
-        Initializes the Azure Blob Storage client by creating the BlobServiceClient and ContainerClient objects.
+        The client of the storage account, created on first use, so creating the storage does no work until it is used.
 
-        This method should be called before performing any operations on the Azure Blob Storage.
+        Every request of the client goes through the connection pool of the storage, configured by its settings.
+        """
+        if self._blob_service_client is None:
+            # The session is set up as the SDK sets up its own, which leaves the responses for it to decode.
+            session = self.connection_pool.session(cookie_jar=DummyCookieJar(), auto_decompress=False, trust_env=True)
+            transport = AioHttpTransport(
+                session=session,
+                session_owner=True,
+                connection_timeout=self.config.connection_timeout,
+                read_timeout=self.config.read_timeout,
+            )
+            self._blob_service_client = BlobServiceClient.from_connection_string(
+                self.connection_string,
+                transport=transport,
+                max_single_put_size=self.config.max_single_put_size,
+                max_block_size=self.config.max_block_size,
+                max_single_get_size=self.config.max_single_get_size,
+                max_chunk_get_size=self.config.max_chunk_get_size,
+                retry_total=self.config.retries,
+            )
+        return self._blob_service_client
 
-        Raises:
-            ValueError: If the connection string or container name is not provided.
+    @property
+    def container_client(self) -> ContainerClient:
+        """
+        The client of the container, created on first use.
         """
-        self.blob_service_client = BlobServiceClient.from_connection_string(self.connection_string)
-        self.container_client = self.blob_service_client.get_container_client(self.container_name)
+        if self._container_client is None:
+            self._container_client = self.blob_service_client.get_container_client(self.container_name)
+        return self._container_client
 
     async def context(self) -> AsyncGenerator[None, None]:
         """
-        A context manager that initializes the object storage and yields control.
-
-        Usage:
-        async with context() as _:
-            # code to be executed within the context
-
+        Yields control for as long as the application is running, then closes the client and its connections if it
+        was created.
         """
-        await self.initialize
         yield
+        if self._blob_service_client is not None:
+            # The SDK leaves close() unannotated.
+            await self._blob_service_client.close()  # type: ignore[no-untyped-call]
 
     async def get_object(self, path: str) -> StorageStreamDownloader[bytes]:
         """
@@ -50,9 +129,76 @@ class AzureBlobStorage:
             StorageStreamDownloader[bytes]: The downloader object for the retrieved object.
         """
         blob_client = self.container_client.get_blob_client(path)
-        return await blob_client.download_blob()
+        return await blob_client.download_blob(max_concurrency=self.config.max_concurrency)
+
+    async def get_object_stream(
+        self, path: str, offset: int | None = None, length: int | None = None, if_none_match: str | None = None
+    ) -> ObjectStream:
+        """
+        Opens a streaming download of an object, or of a byte range of it, from the Azure Blob Storage.
+
+        Args:
+            path (str): The path of the object to retrieve.
+            offset (int | None, optional): The offset of the first byte to download. Defaults to the start of
+                the object.
+            length (int | None, optional): The number of bytes to download. Defaults to the rest of the object.
+            if_none_match (str | None, optional): If set, only downloads the object if its current etag differs.
+                Defaults to None.
+
+        Returns:
+            ObjectStream: The open download, yielding the content chunk by chunk.
+
+        Raises:
+            ResourceNotModifiedError: If if_none_match matches the current etag of the object.
+        """
+        blob_client = self.container_client.get_blob_client(path)
+        # The SDK annotates offset and length as int, although None is their default.
+        options: dict[str, Any] = {"offset": offset, "length": length}
+        if if_none_match is not None:
+            options.update(etag=if_none_match, match_condition=MatchConditions.IfModified)
+        downloader = await blob_client.download_blob(max_concurrency=self.config.max_concurrency, **options)
+        # Both are set once the download has started.
+        blob_properties = cast(BlobProperties, downloader.properties)
+        size = cast(int, downloader.size)
+        content_range = blob_properties.content_range
+        total_size = int(content_range.rsplit("/", 1)[1]) if content_range else size
+        properties = ObjectProperties(
+            name=path,
+            size=total_size,
+            etag=blob_properties.etag,
+            last_modified=blob_properties.last_modified,
+            metadata=blob_properties.metadata or {},
+        )
+        return ObjectStream(properties=properties, offset=offset or 0, length=size, chunks=downloader.chunks())
+
+    async def get_object_properties(self, path: str) -> ObjectProperties:
+        """
+        Retrieves the properties of an object from the Azure Blob Storage without downloading its content.
+
+        Args:
+            path (str): The path of the object.
+
+        Returns:
+            ObjectProperties: The properties of the object.
+        """
+        blob_client = self.container_client.get_blob_client(path)
+        properties = await blob_client.get_blob_properties()
+        return ObjectProperties(
+            name=path,
+            size=properties.size,
+            etag=properties.etag,
+            last_modified=properties.last_modified,
+            metadata=properties.metadata or {},
+        )
 
-    async def create_object(self, path: str, data: bytes, overwrite: bool = False) -> bool:
+    async def create_object(
+        self,
+        path: str,
+        data: bytes,
+        overwrite: bool = False,
+        if_match: str | None = None,
+        metadata: dict[str, str] | None = None,
+    ) -> ObjectProperties:
         """
         Creates a new object in the Azure Blob Storage.
 
@@ -61,28 +207,202 @@ class AzureBlobStorage:
             data (bytes): The data to be uploaded as the object content.
             overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
                 Defaults to False.
+            if_match (str | None, optional): If set, only replaces the object if its current etag matches.
+                Defaults to None.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object. Defaults to None.
 
         Returns:
-            bool: True if the object is created successfully, False otherwise.
+            ObjectProperties: The properties of the created object.
+
+        Raises:
+            ResourceModifiedError: If if_match is set and does not match the current etag of the object.
         """
         blob_client = self.container_client.get_blob_client(path)
-        await blob_client.upload_blob(data, overwrite=overwrite)
-        return True
+        if if_match is not None:
+            result = await blob_client.upload_blob(
+                data,
+                overwrite=True,
+                metadata=metadata,
+                etag=if_match,
+                match_condition=MatchConditions.IfNotModified,
+                max_concurrency=self.config.max_concurrency,
+            )
+        else:
+            result = await blob_client.upload_blob(
+                data, overwrite=overwrite, metadata=metadata, max_concurrency=self.config.max_concurrency
+            )
+        return ObjectProperties(
+            name=path,
+            size=len(data),
+            etag=result.get("etag"),
+            last_modified=result.get("last_modified"),
+            metadata=metadata or {},
+        )
+
+    async def create_object_stream(
+        self,
+        path: str,
+        chunks: AsyncIterator[bytes],
+        overwrite: bool = False,
+        metadata: dict[str, str] | None = None,
+    ) -> int:
+        """
+        Creates a new object in the Azure Blob Storage by staging every chunk as a separate block.
+
+        The blob is only committed once all chunks have been staged, so a failed upload never leaves a partial object
+        behind. Uncommitted blocks are garbage collected by the service.
+
+        Args:
+            path (str): The path of the object in the storage.
+            chunks (AsyncIterator[bytes]): The chunks to be uploaded as the object content, in order.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object, committed with
+                the block list once every chunk is staged. Defaults to None.
+
+        Returns:
+            int: The number of bytes uploaded.
 
-    async def delete_object(self, path: str) -> bool:
+        Raises:
+            ResourceExistsError: If the object already exists and overwrite is False.
+        """
+        blob_client = self.container_client.get_blob_client(path)
+        upload_id = uuid.uuid4().hex
+        block_ids: list[str] = []
+        size = 0
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            block_id = base64.b64encode(f"{upload_id}-{len(block_ids):08d}".encode()).decode()
+            # The SDK's type comment leaves out bytes, which it accepts.
+            await blob_client.stage_block(block_id, chunk, length=len(chunk))  # type: ignore[type-var]
+            block_ids.append(block_id)
+            size += len(chunk)
+
+        conditions: dict[str, Any] = {} if overwrite else {"etag": "*", "match_condition": MatchConditions.IfMissing}
+        try:
+            # The SDK annotates BlobBlocks only, although it accepts their ids.
+            await blob_client.commit_block_list(block_ids, metadata=metadata, **conditions)  # type: ignore[arg-type]
+        except ResourceModifiedError as rme:
+            raise ResourceExistsError(message="The specified blob already exists.", response=rme.response) from rme
+        return size
+
+    async def stage_block(self, path: str, block_id: str, data: bytes) -> None:
+        """
+        Stages a block of a blob in the Azure Blob Storage, to be committed later along with the blob's other blocks.
+
+        Args:
+            path (str): The path of the object in the storage.
+            block_id (str): The id of the block. Every block of a blob must have an id of the same length.
+            data (bytes): The content of the block.
+        """
+        blob_client = self.container_client.get_blob_client(path)
+        # The SDK's type comment leaves out bytes, which it accepts.
+        await blob_client.stage_block(block_id, data, length=len(data))  # type: ignore[type-var]
+
+    async def list_staged_blocks(self, path: str) -> dict[str, int]:
+        """
+        Lists the uncommitted blocks of a blob in the Azure Blob Storage.
+
+        Args:
+            path (str): The path of the object in the storage.
+
+        Returns:
+            dict[str, int]: The size of every uncommitted block, by block id.
+        """
+        blob_client = self.container_client.get_blob_client(path)
+        try:
+            _, uncommitted = await blob_client.get_block_list("uncommitted")
+        except ResourceNotFoundError:
+            return {}
+        return {block.id: block.size or 0 for block in uncommitted}
+
+    async def commit_blocks(
+        self,
+        path: str,
+        block_ids: list[str],
+        overwrite: bool = False,
+        metadata: dict[str, str] | None = None,
+    ) -> ObjectProperties:
+        """
+        Commits the block list of a blob in the Azure Blob Storage. The service discards every other uncommitted
+        block of the blob.
+
+        Args:
+            path (str): The path of the object in the storage.
+            block_ids (list[str]): The ids of the uncommitted blocks making up the blob, in order.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object. Defaults to None.
+
+        Returns:
+            ObjectProperties: The properties of the committed object.
+
+        Raises:
+            ResourceExistsError: If the object already exists and overwrite is False.
+        """
+        blob_client = self.container_client.get_blob_client(path)
+        conditions: dict[str, Any] = {} if overwrite else {"etag": "*", "match_condition": MatchConditions.IfMissing}
+        try:
+            # The SDK annotates BlobBlocks only, although it accepts their ids.
+            await blob_client.commit_block_list(block_ids, metadata=metadata, **conditions)  # type: ignore[arg-type]
+        except ResourceModifiedError as rme:
+            raise ResourceExistsError(message="The specified blob already exists.", response=rme.response) from rme
+        return await self.get_object_properties(path)
+
+    async def discard_blocks(self, path: str, block_ids: list[str]) -> None:
+        """
+        Leaves uncommitted blocks to the Azure Blob Storage, which garbage collects them after a week, or as soon as
+        another block list of the blob is committed. The service offers no way to delete them individually.
+
+        Args:
+            path (str): The path of the object in the storage.
+            block_ids (list[str]): The ids of the uncommitted blocks to discard.
+        """
+        return None
+
+    async def delete_object(self, path: str, if_match: str | None = None) -> bool:
         """
         Deletes an object from the Azure Blob Storage.
 
         Args:
             path (str): The path of the object to be deleted.
+            if_match (str | None, optional): If set, only deletes the object if its current etag matches.
+                Defaults to None.
 
         Returns:
             bool: True if the object is successfully deleted, False otherwise.
+
+        Raises:
+            ResourceModifiedError: If if_match is set and does not match the current etag of the object.
         """
         blob_client = self.container_client.get_blob_client(path)
+        if if_match is not None:
+            await blob_client.delete_blob(etag=if_match, match_condition=MatchConditions.IfNotModified)
+            return True
         await blob_client.delete_blob()
         return True
 
+    async def delete_objects(self, paths: list[str]) -> int:
+        """
+        Deletes several objects from the Azure Blob Storage using batch requests of up to 256 objects each.
+
+        Args:
+            paths (list[str]): The paths of the objects to be deleted.
+
+        Returns:
+            int: The number of objects that no longer exist, including the ones that did not exist in the first place.
+        """
+        deleted = 0
+        for start in range(0, len(paths), self._batch_size):
+            responses = await self.container_client.delete_blobs(
+                *paths[start : start + self._batch_size], raise_on_any_failure=False
+            )
+            async for response in responses:
+                if response.status_code in (202, 404):
+                    deleted += 1
+        return deleted
+
     async def list_objects(self, prefix: str) -> list[str]:
         """
         Lists the objects in the Azure Blob Storage container that have the specified prefix.
@@ -93,7 +413,70 @@ class AzureBlobStorage:
         Returns:
             list[str]: A list of object names that match the specified prefix.
         """
-        blobs = self.blob_service_client.get_container_client(self.container_name).list_blob_names(
+        blobs = self.container_client.list_blob_names(
             name_starts_with=prefix
         )
         return [blob async for blob in blobs]
+
+    async def list_object_properties(self, prefix: str) -> AsyncIterator[ObjectProperties]:
+        """
+        Iterates over the properties of the objects in the Azure Blob Storage container that have the specified prefix.
+
+        Args:
+            prefix (str): The prefix to filter the object names.
+
+        Yields:
+            ObjectProperties: The properties of every matching object.
+        """
+        async for blob in self.container_client.list_blobs(name_starts_with=prefix, include=["metadata"]):
+            yield self._blob_properties(blob)
+
+    async def list_objects_page(self, prefix: str, limit: int, cursor: str | None = None) -> ObjectPage:
+        """
+        Lists a single page of the objects in the Azure Blob Storage container that have the specified prefix.
+
+        Args:
+            prefix (str): The prefix to filter the object names.
+            limit (int): The maximum number of objects on the page.
+            cursor (str | None, optional): The continuation token returned with the previous page. Defaults to None,
+                which lists the first page.
+
+        Returns:
+            ObjectPage: The properties of the objects on the page and the continuation token of the next page.
+        """
+        pages = cast(
+            AsyncPageIterator[BlobProperties],
+            self.container_client.list_blobs(
+                name_starts_with=prefix, include=["metadata"], results_per_page=limit
+            ).by_page(continuation_token=cursor),
+        )
+        try:
+            page = await pages.__anext__()
+        except StopAsyncIteration:
+            return ObjectPage(items=[])
+        items = [self._blob_properties(blob) async for blob in page]
+        return ObjectPage(items=items, cursor=pages.continuation_token or None)
+
+    @staticmethod
+    def _blob_properties(blob: BlobProperties) -> ObjectProperties:
+        return ObjectProperties(
+            name=blob.name,
+            size=blob.size,
+            etag=blob.etag,
+            last_modified=blob.last_modified,
+            metadata=blob.metadata or {},
+        )
+
+    async def list_prefixes(self, prefix: str = "", delimiter: str = "/") -> list[str]:
+        """
+        Lists the virtual directories of the Azure Blob Storage container directly under the specified prefix.
+
+        Args:
+            prefix (str, optional): The prefix to list virtual directories under. Defaults to the container root.
+            delimiter (str, optional): The path segment delimiter. Defaults to "/".
+
+        Returns:
+            list[str]: The names of the virtual directories, each ending with the delimiter.
+        """
+        items = self.container_client.walk_blobs(name_starts_with=prefix or None, delimiter=delimiter)
+        return [item.name async for item in items if isinstance(item, BlobPrefix)]
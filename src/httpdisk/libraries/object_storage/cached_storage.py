@@ -0,0 +1,423 @@
+from ..cache.disk_cache import DiskCache
+from .object_storage import ObjectStorageProtocol
+from .models import ObjectPage, ObjectProperties, ObjectStream
+from azure.core.exceptions import ResourceNotFoundError, ResourceNotModifiedError
+from typing import AsyncGenerator, AsyncIterator, BinaryIO
+import asyncio
+import os
+import time
+import weakref
+
+
+class CachedObjectStorage:
+    """
+    Keeps copies of recently read objects of another object storage on the local disk.
+
+    Whole-object reads fill the cache while the object is being streamed. A cached copy is served as is for
+    freshness seconds after it was last validated. Afterwards, the underlying storage is asked for the object on the
+    condition that its etag changed, which costs a round trip but no transfer while the copy is current, so copies
+    never stay stale for longer than the freshness window, even when the object is replaced by another process.
+    Objects written or deleted through this storage are dropped from the cache right away.
+
+    Cached copies are pinned as soon as they are found current, so they can be served from their local path, and a
+    copy evicted while it is being sent is still sent in full. The pin is released once the stream is closed.
+
+    Args:
+        storage (ObjectStorageProtocol): The object storage to cache objects of.
+        cache (DiskCache[str, tuple[ObjectProperties, float]]): The cache of object copies, by object path, along
+            with the properties of the object and the time the copy was last validated.
+        max_object_size (int | None, optional): The size above which objects are not cached. Defaults to the size of
+            the whole cache.
+        chunk_size (int, optional): The size of the chunks cached copies are streamed in. Defaults to 1 MiB.
+        freshness (float, optional): The number of seconds a cached copy is served without revalidation. Defaults to
+            0, which revalidates on every read.
+    """
+
+    def __init__(
+        self,
+        storage: ObjectStorageProtocol,
+        cache: DiskCache[str, tuple[ObjectProperties, float]],
+        max_object_size: int | None = None,
+        chunk_size: int = 1024 * 1024,
+        freshness: float = 0,
+    ):
+        self.storage = storage
+        self.cache = cache
+        self.max_object_size = cache.max_bytes if max_object_size is None else max_object_size
+        self.chunk_size = chunk_size
+        self.freshness = freshness
+
+    async def context(self) -> AsyncGenerator[None, None]:
+        """
+        Runs the context of the underlying storage, and removes the cached copies on shutdown.
+        """
+        async for _ in self.storage.context():
+            yield
+        await asyncio.to_thread(self.cache.close)
+
+    async def get_object(self, path: str) -> bytes:
+        """
+        Retrieves the whole content of an object, from the cache if the cached copy is current.
+
+        Args:
+            path (str): The path of the object to retrieve.
+
+        Returns:
+            bytes: The content of the object.
+        """
+        stream = await self.get_object_stream(path)
+        return b"".join([chunk async for chunk in stream.chunks])
+
+    async def get_object_stream(
+        self, path: str, offset: int | None = None, length: int | None = None, if_none_match: str | None = None
+    ) -> ObjectStream:
+        """
+        Opens a streaming download of an object, or of a byte range of it, from the cache if the cached copy is
+        current. Whole-object reads of objects that are not cached add them to the cache.
+
+        Args:
+            path (str): The path of the object to retrieve.
+            offset (int | None, optional): The offset of the first byte to read. Defaults to the start of the object.
+            length (int | None, optional): The number of bytes to read. Defaults to the rest of the object.
+            if_none_match (str | None, optional): If set, only reads the object if its current etag differs. Such
+                reads bypass the cache. Defaults to None.
+
+        Returns:
+            ObjectStream: The open download, with the local path of the pinned copy if the whole object is read from
+                the cache.
+
+        Raises:
+            ResourceNotModifiedError: If if_none_match matches the current etag of the object.
+        """
+        if if_none_match is not None:
+            return await self.storage.get_object_stream(path, offset, length, if_none_match)
+
+        cached = self.cache.get(path)
+        stream = None
+        if cached is not None:
+            file, (properties, validated) = cached
+            if time.monotonic() - validated >= self.freshness:
+                try:
+                    stream = await self.storage.get_object_stream(path, offset, length, if_none_match=properties.etag)
+                except ResourceNotModifiedError:
+                    self.cache.refresh(path, file, (properties, time.monotonic()))
+                except ResourceNotFoundError:
+                    self.cache.expire(path)
+                    raise
+            if stream is None:
+                try:
+                    return self._cached(file, properties, offset, length)
+                except FileNotFoundError:
+                    # Evicted while it was revalidated, the object is read from the storage instead.
+                    pass
+            else:
+                self.cache.expire(path)
+        if stream is None:
+            stream = await self.storage.get_object_stream(path, offset, length)
+
+        whole = stream.offset == 0 and stream.length == stream.properties.size
+        if whole and stream.properties.etag is not None and stream.length <= self.max_object_size:
+            return stream.model_copy(update={"chunks": self._fill(path, stream)})
+        return stream
+
+    def _cached(self, file: str, properties: ObjectProperties, offset: int | None, length: int | None) -> ObjectStream:
+        """
+        Opens a range of a cached copy, pinning the copy so it can be evicted while it is being read.
+
+        Raises:
+            FileNotFoundError: If the copy was evicted in the meantime.
+        """
+        start = min(offset or 0, properties.size)
+        count = properties.size - start if length is None else min(length, properties.size - start)
+        pinned = self.cache.pin(file)
+        return ObjectStream(
+            properties=properties,
+            offset=start,
+            length=count,
+            chunks=_PinnedChunks(pinned, start, count, self.chunk_size),
+            local_path=pinned if count == properties.size else None,
+        )
+
+    async def _fill(self, path: str, stream: ObjectStream) -> AsyncIterator[bytes]:
+        """
+        Passes the chunks of a whole-object download through, writing them to a new cached copy of the object. The
+        copy is added to the cache once its last byte is written, and discarded if the download stops short of it.
+
+        Args:
+            path (str): The path of the object.
+            stream (ObjectStream): The open download of the whole object.
+
+        Yields:
+            bytes: The chunks of the download.
+        """
+        file = self.cache.reserve()
+        handle = await asyncio.to_thread(_create, file)
+        written = 0
+        try:
+            async for chunk in stream.chunks:
+                await asyncio.to_thread(handle.write, chunk)
+                written += len(chunk)
+                if written == stream.length:
+                    handle.close()
+                    self.cache.put(path, file, written, (stream.properties, time.monotonic()))
+                yield chunk
+        finally:
+            if not handle.closed:
+                handle.close()
+                self.cache.unlink(file)
+
+    async def get_object_properties(self, path: str) -> ObjectProperties:
+        """
+        Retrieves the properties of an object.
+
+        Args:
+            path (str): The path of the object.
+
+        Returns:
+            ObjectProperties: The properties of the object.
+        """
+        return await self.storage.get_object_properties(path)
+
+    async def create_object(
+        self,
+        path: str,
+        data: bytes,
+        overwrite: bool = False,
+        if_match: str | None = None,
+        metadata: dict[str, str] | None = None,
+    ) -> ObjectProperties:
+        """
+        Creates a new object, dropping the cached copy of the object it replaces.
+
+        Args:
+            path (str): The path of the object.
+            data (bytes): The content of the object.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            if_match (str | None, optional): If set, only replaces the object if its current etag matches.
+                Defaults to None.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object. Defaults to None.
+
+        Returns:
+            ObjectProperties: The properties of the created object.
+        """
+        try:
+            return await self.storage.create_object(path, data, overwrite, if_match, metadata)
+        finally:
+            self.cache.invalidate(path)
+
+    async def create_object_stream(
+        self,
+        path: str,
+        chunks: AsyncIterator[bytes],
+        overwrite: bool = False,
+        metadata: dict[str, str] | None = None,
+    ) -> int:
+        """
+        Creates a new object from a stream of chunks, dropping the cached copy of the object it replaces.
+
+        Args:
+            path (str): The path of the object.
+            chunks (AsyncIterator[bytes]): The content of the object, in order.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object, read once the
+                stream is exhausted. Defaults to None.
+
+        Returns:
+            int: The number of bytes stored.
+        """
+        try:
+            return await self.storage.create_object_stream(path, chunks, overwrite, metadata)
+        finally:
+            self.cache.invalidate(path)
+
+    async def stage_block(self, path: str, block_id: str, data: bytes) -> None:
+        """
+        Stages a block of an object, to be committed later along with the object's other blocks.
+
+        Args:
+            path (str): The path of the object.
+            block_id (str): The id of the block.
+            data (bytes): The content of the block.
+        """
+        await self.storage.stage_block(path, block_id, data)
+
+    async def list_staged_blocks(self, path: str) -> dict[str, int]:
+        """
+        Lists the blocks of an object that were staged but not committed yet.
+
+        Args:
+            path (str): The path of the object.
+
+        Returns:
+            dict[str, int]: The size of every staged block, by block id.
+        """
+        return await self.storage.list_staged_blocks(path)
+
+    async def commit_blocks(
+        self,
+        path: str,
+        block_ids: list[str],
+        overwrite: bool = False,
+        metadata: dict[str, str] | None = None,
+    ) -> ObjectProperties:
+        """
+        Creates an object from staged blocks, dropping the cached copy of the object it replaces.
+
+        Args:
+            path (str): The path of the object.
+            block_ids (list[str]): The ids of the staged blocks making up the object, in order.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object. Defaults to None.
+
+        Returns:
+            ObjectProperties: The properties of the created object.
+        """
+        try:
+            return await self.storage.commit_blocks(path, block_ids, overwrite, metadata)
+        finally:
+            self.cache.invalidate(path)
+
+    async def discard_blocks(self, path: str, block_ids: list[str]) -> None:
+        """
+        Discards staged blocks of an object.
+
+        Args:
+            path (str): The path of the object.
+            block_ids (list[str]): The ids of the staged blocks to discard.
+        """
+        await self.storage.discard_blocks(path, block_ids)
+
+    async def delete_object(self, path: str, if_match: str | None = None) -> bool:
+        """
+        Deletes an object and its cached copy.
+
+        Args:
+            path (str): The path of the object to be deleted.
+            if_match (str | None, optional): If set, only deletes the object if its current etag matches.
+                Defaults to None.
+
+        Returns:
+            bool: True if the object is successfully deleted.
+        """
+        try:
+            return await self.storage.delete_object(path, if_match)
+        finally:
+            self.cache.invalidate(path)
+
+    async def delete_objects(self, paths: list[str]) -> int:
+        """
+        Deletes several objects and their cached copies. Objects that don't exist are skipped.
+
+        Args:
+            paths (list[str]): The paths of the objects to be deleted.
+
+        Returns:
+            int: The number of objects that no longer exist.
+        """
+        try:
+            return await self.storage.delete_objects(paths)
+        finally:
+            for path in paths:
+                self.cache.invalidate(path)
+
+    async def list_objects(self, path: str) -> list[str]:
+        """
+        Lists the objects whose paths start with the specified prefix.
+
+        Args:
+            path (str): The prefix to filter the object paths.
+
+        Returns:
+            list[str]: The matching object paths.
+        """
+        return await self.storage.list_objects(path)
+
+    async def list_object_properties(self, prefix: str) -> AsyncIterator[ObjectProperties]:
+        """
+        Iterates over the properties of the objects whose paths start with the specified prefix.
+
+        Args:
+            prefix (str): The prefix to filter the object paths.
+
+        Yields:
+            ObjectProperties: The properties of every matching object.
+        """
+        async for properties in self.storage.list_object_properties(prefix):
+            yield properties
+
+    async def list_objects_page(self, prefix: str, limit: int, cursor: str | None = None) -> ObjectPage:
+        """
+        Lists a single page of the objects whose paths start with the specified prefix.
+
+        Args:
+            prefix (str): The prefix to filter the object paths.
+            limit (int): The maximum number of objects on the page.
+            cursor (str | None, optional): The continuation token returned with the previous page. Defaults to None,
+                which lists the first page.
+
+        Returns:
+            ObjectPage: The properties of the objects on the page and the continuation token of the next page.
+        """
+        return await self.storage.list_objects_page(prefix, limit, cursor)
+
+    async def list_prefixes(self, prefix: str = "", delimiter: str = "/") -> list[str]:
+        """
+        Lists the distinct path segments directly under the specified prefix.
+
+        Args:
+            prefix (str, optional): The prefix to list segments under. Defaults to the root of the storage.
+            delimiter (str, optional): The path segment delimiter. Defaults to "/".
+
+        Returns:
+            list[str]: The matching prefixes, each ending with the delimiter.
+        """
+        return await self.storage.list_prefixes(prefix, delimiter)
+
+
+def _create(file: str) -> BinaryIO:
+    return open(file, "wb")
+
+
+def _release(pinned: str, handles: list[int]) -> None:
+    while handles:
+        os.close(handles.pop())
+    DiskCache.unlink(pinned)
+
+
+class _PinnedChunks:
+    """
+    Streams a byte range of a pinned copy of an object, opening it on the first read. The pin is released once the
+    range is read, the stream is closed, or the stream is garbage collected.
+    """
+
+    def __init__(self, pinned: str, offset: int, length: int, chunk_size: int):
+        self.pinned = pinned
+        self.offset = offset
+        self.length = length
+        self.chunk_size = chunk_size
+        self._handles: list[int] = []
+        self._release = weakref.finalize(self, _release, pinned, self._handles)
+
+    def __aiter__(self) -> "_PinnedChunks":
+        return self
+
+    async def __anext__(self) -> bytes:
+        if self.length > 0 and self._release.alive:
+            if not self._handles:
+                self._handles.append(await asyncio.to_thread(os.open, self.pinned, os.O_RDONLY))
+            chunk = await asyncio.to_thread(os.pread, self._handles[0], min(self.chunk_size, self.length), self.offset)
+            if chunk:
+                self.offset += len(chunk)
+                self.length -= len(chunk)
+                return chunk
+        self._release()
+        raise StopAsyncIteration
+
+    async def aclose(self) -> None:
+        """
+        Releases the pin, leaving the rest of the range unread.
+        """
+        self._release()
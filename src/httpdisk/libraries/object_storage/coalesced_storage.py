@@ -0,0 +1,597 @@
+from ..cache.ttl_cache import CacheStats, register_cache
+from .object_storage import ObjectStorageProtocol
+from .models import ObjectPage, ObjectProperties, ObjectStream
+from azure.core.exceptions import ResourceModifiedError
+from collections import deque
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Hashable, TypeVar
+import asyncio
+import itertools
+import weakref
+
+_K = TypeVar("_K", bound=Hashable)
+_T = TypeVar("_T")
+
+# Identifies a call by its operation, the path or prefix it reads, and its other arguments.
+_CallKey = tuple[str, str, tuple[Hashable, ...]]
+# Identifies a download by the path, offset, length and etag condition it reads.
+_StreamKey = tuple[str, int | None, int | None, str | None]
+
+# Closes of abandoned downloads, referenced until they are done.
+_closing: set[asyncio.Task[None]] = set()
+
+
+class _SharedStream:
+    """
+    A download read by several readers at once, each at its own pace.
+
+    The reader that needs a chunk nobody fetched yet pulls it from the download for everyone, so no reader waits for
+    more than the next chunk. The first max_lag bytes are kept for readers attaching late, afterwards a chunk is kept
+    until the slowest reader read it. A reader falling behind by more than max_lag bytes is detached and continues
+    with a download of its own from where it stopped, so the slowest reader neither holds up the others nor makes
+    them buffer the whole object.
+
+    Args:
+        stream (ObjectStream): The download to share.
+        max_lag (int): The number of bytes a reader may fall behind before it is detached.
+        resume (Callable[[int], Awaitable[ObjectStream]]): Opens a download of the rest of the content from the given
+            offset relative to the start of the shared download.
+        on_close (Callable[[], None]): Called once every reader is done and the download is closed.
+        stats (CacheStats): The counters detached readers are counted in, as evictions.
+    """
+
+    def __init__(
+        self,
+        stream: ObjectStream,
+        max_lag: int,
+        resume: Callable[[int], Awaitable[ObjectStream]],
+        on_close: Callable[[], None],
+        stats: CacheStats,
+    ):
+        self.stream = stream
+        self.max_lag = max_lag
+        self._resume = resume
+        self._on_close = on_close
+        self._stats = stats
+        self._upstream = stream.chunks.__aiter__()
+        self._chunks: deque[bytes] = deque()
+        self._first = 0
+        self._trimmed = 0
+        self._buffered = 0
+        self._positions: dict[int, int] = {}
+        self._detached: dict[int, int] = {}
+        self._readers = itertools.count()
+        self._pull: asyncio.Future[None] | None = None
+        self._finished = False
+        self._error: Exception | None = None
+        self._closed = False
+
+    @property
+    def buffered(self) -> int:
+        return self._buffered
+
+    def attach(self) -> ObjectStream | None:
+        """
+        Adds a reader of the download, if the start of the content is still buffered.
+
+        A reader is done once it read the whole content, or once its chunks are closed or dropped, even if they were
+        never iterated over.
+
+        Returns:
+            ObjectStream | None: The download as seen by the new reader, or None if it can no longer be joined.
+        """
+        if self._closed or self._first > 0 or self._error is not None:
+            return None
+        reader = next(self._readers)
+        self._positions[reader] = 0
+        chunks = self._read(reader)
+        weakref.finalize(chunks, self._release, reader)
+        return self.stream.model_copy(update={"chunks": chunks})
+
+    async def _read(self, reader: int) -> AsyncIterator[bytes]:
+        try:
+            while True:
+                index = self._positions.get(reader)
+                if index is None:
+                    resumed = await self._resume(self._detached.pop(reader))
+                    async for chunk in resumed.chunks:
+                        yield chunk
+                    return
+                if index < self._first + len(self._chunks):
+                    chunk = self._chunks[index - self._first]
+                    self._positions[reader] = index + 1
+                    self._trim()
+                    yield chunk
+                    continue
+                if self._error is not None:
+                    raise self._error
+                if self._finished:
+                    return
+                if self._pull is None:
+                    self._pull = asyncio.ensure_future(self._fill())
+                # Shielded, so a reader that goes away while pulling does not break the download for the others.
+                await asyncio.shield(self._pull)
+        finally:
+            self._release(reader)
+
+    async def _fill(self) -> None:
+        try:
+            chunk = await anext(self._upstream)
+        except StopAsyncIteration:
+            self._finished = True
+        except Exception as e:
+            self._error = e
+        else:
+            self._chunks.append(chunk)
+            self._buffered += len(chunk)
+            self._detach_laggards()
+        finally:
+            self._pull = None
+
+    def _detach_laggards(self) -> None:
+        """
+        Detaches the readers more than max_lag bytes and more than one chunk behind the end of the buffer.
+        """
+        end = self._first + len(self._chunks)
+        for reader, index in list(self._positions.items()):
+            if index >= end - 1:
+                continue
+            behind = sum(len(self._chunks[i - self._first]) for i in range(index, end))
+            if behind > self.max_lag:
+                del self._positions[reader]
+                self._detached[reader] = self._trimmed + sum(
+                    len(self._chunks[i - self._first]) for i in range(self._first, index)
+                )
+                self._stats.evictions += 1
+        self._trim()
+
+    def _trim(self) -> None:
+        """
+        Drops the chunks every reader read, once the start of the content no longer fits in max_lag bytes.
+        """
+        if self._first == 0 and self._buffered <= self.max_lag:
+            return
+        slowest = min(self._positions.values(), default=self._first + len(self._chunks))
+        while self._first < slowest:
+            chunk = self._chunks.popleft()
+            self._first += 1
+            self._buffered -= len(chunk)
+            self._trimmed += len(chunk)
+
+    def _release(self, reader: int) -> None:
+        """
+        Removes a reader, and closes the download once every reader is done.
+
+        Args:
+            reader (int): The reader, which may already have been removed.
+        """
+        self._positions.pop(reader, None)
+        self._detached.pop(reader, None)
+        if self._closed:
+            return
+        if self._positions or self._detached:
+            self._trim()
+            return
+        self._closed = True
+        self._chunks.clear()
+        self._buffered = 0
+        self._on_close()
+        if self._pull is not None:
+            # Cancelling the pending pull closes the download along with it.
+            self._pull.cancel()
+            return
+        close = getattr(self._upstream, "aclose", None)
+        if close is None or self._finished or self._error is not None:
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(close())
+        except RuntimeError:
+            return
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+
+class CoalescedObjectStorage:
+    """
+    Lets concurrent identical reads of another object storage share a single call.
+
+    Properties reads and listings made while the same call is in flight wait for it and get a copy of its result.
+    Downloads of the same object, range and etag condition share a single download, streamed to every reader as it
+    arrives, see _SharedStream. Readers attaching to a download get the version of the object it read, so a write
+    through this storage makes every later read start a call of its own.
+
+    Streams the underlying storage serves from a local file or encoded are not shared. Whole-object reads and
+    listings of object properties are passed through.
+
+    The storage registers its counters as a cache, by its name: hits count reads that joined a call in flight, misses
+    the calls made, evictions the readers detached from a shared download for falling behind, size the calls in flight
+    and bytes the content buffered for shared downloads.
+
+    Args:
+        storage (ObjectStorageProtocol): The object storage to read from.
+        max_lag (int, optional): The number of bytes kept for readers of a shared download. Defaults to 8 MiB.
+        name (str, optional): The name the counters are reported under. Defaults to "read_coalescing".
+    """
+
+    def __init__(self, storage: ObjectStorageProtocol, max_lag: int = 8 * 1024 * 1024, name: str = "read_coalescing"):
+        self.storage = storage
+        self.max_lag = max_lag
+        self._calls: dict[_CallKey, asyncio.Future[Any]] = {}
+        self._streams: dict[_StreamKey, asyncio.Future[_SharedStream | ObjectStream]] = {}
+        self._stats = CacheStats()
+        register_cache(name, self)
+
+    async def context(self) -> AsyncGenerator[None, None]:
+        """
+        Runs the context of the underlying storage.
+        """
+        async for _ in self.storage.context():
+            yield
+
+    def stats(self) -> CacheStats:
+        """
+        Returns a snapshot of the counters of the storage.
+
+        Returns:
+            CacheStats: The counters, as described in the class documentation.
+        """
+        shared = [
+            flight.result()
+            for flight in self._streams.values()
+            if flight.done() and not flight.cancelled() and flight.exception() is None
+        ]
+        return self._stats.model_copy(
+            update={
+                "size": len(self._calls) + len(self._streams),
+                "bytes": sum(stream.buffered for stream in shared if isinstance(stream, _SharedStream)),
+            }
+        )
+
+    def _drop(self, table: dict[_K, asyncio.Future[_T]], key: _K, flight: asyncio.Future[_T] | None) -> None:
+        if flight is not None and table.get(key) is flight:
+            del table[key]
+
+    def _drop_failed(self, table: dict[_K, asyncio.Future[_T]], key: _K, flight: asyncio.Future[_T]) -> None:
+        if flight.cancelled() or flight.exception() is not None:
+            self._drop(table, key, flight)
+
+    async def _shared(self, key: _CallKey, call: Callable[[], Awaitable[_T]]) -> _T:
+        """
+        Makes a call, or waits for the identical call in flight.
+
+        Args:
+            key (_CallKey): Identifies the call.
+            call (Callable[[], Awaitable[_T]]): Makes the call.
+
+        Returns:
+            _T: The result of the call.
+        """
+        flight = self._calls.get(key)
+        if flight is None:
+            self._stats.misses += 1
+            flight = asyncio.ensure_future(call())
+            self._calls[key] = flight
+            flight.add_done_callback(lambda done: self._drop(self._calls, key, done))
+            # Retrieves the error of calls every caller stopped waiting for, which would otherwise be logged.
+            flight.add_done_callback(lambda done: done.cancelled() or done.exception())
+        else:
+            self._stats.hits += 1
+        # Shielded, so a caller that goes away does not cancel the call for the others.
+        return await asyncio.shield(flight)
+
+    def _forget(self, path: str) -> None:
+        """
+        Makes later reads of an object, and listings it may appear in, start calls of their own.
+
+        Args:
+            path (str): The path of the written or deleted object.
+        """
+        for stream_key in [stream_key for stream_key in self._streams if stream_key[0] == path]:
+            del self._streams[stream_key]
+        for call_key in list(self._calls):
+            operation, prefix, _ = call_key
+            if prefix == path or (operation != "properties" and path.startswith(prefix)):
+                del self._calls[call_key]
+
+    async def _open(
+        self, key: _StreamKey, path: str, offset: int | None, length: int | None, if_none_match: str | None
+    ) -> _SharedStream | ObjectStream:
+        """
+        Opens a download to share between its readers.
+
+        Args:
+            key (_StreamKey): Identifies the download.
+            path (str): The path of the object to retrieve.
+            offset (int | None): The offset of the first byte to download.
+            length (int | None): The number of bytes to download.
+            if_none_match (str | None): If set, only downloads the object if its current etag differs.
+
+        Returns:
+            _SharedStream | ObjectStream: The shared download, or the download itself if it cannot be shared.
+        """
+        stream = await self.storage.get_object_stream(path, offset, length, if_none_match)
+        if stream.local_path is not None or stream.encoding is not None:
+            return stream
+        # The task opening the download, which is its entry in the table unless a write dropped it meanwhile.
+        flight = asyncio.current_task()
+
+        async def resume(position: int) -> ObjectStream:
+            resumed = await self.storage.get_object_stream(path, stream.offset + position, stream.length - position)
+            if resumed.properties.etag != stream.properties.etag:
+                raise ResourceModifiedError(message=f"The object was modified while it was being read: {path}")
+            return resumed
+
+        return _SharedStream(stream, self.max_lag, resume, lambda: self._drop(self._streams, key, flight), self._stats)
+
+    async def get_object(self, path: str) -> Any:
+        """
+        Retrieves an object.
+
+        Args:
+            path (str): The path of the object to retrieve.
+
+        Returns:
+            Any: The object, as returned by the underlying storage.
+        """
+        return await self.storage.get_object(path)
+
+    async def get_object_stream(
+        self, path: str, offset: int | None = None, length: int | None = None, if_none_match: str | None = None
+    ) -> ObjectStream:
+        """
+        Opens a streaming download of an object, or of a byte range of it, joining the identical download in flight
+        if its start is still buffered.
+
+        Args:
+            path (str): The path of the object to retrieve.
+            offset (int | None, optional): The offset of the first byte to download. Defaults to the start of the
+                object.
+            length (int | None, optional): The number of bytes to download. Defaults to the rest of the object.
+            if_none_match (str | None, optional): If set, only downloads the object if its current etag differs.
+                Defaults to None.
+
+        Returns:
+            ObjectStream: The open download, yielding the content chunk by chunk.
+        """
+        key = (path, offset, length, if_none_match)
+        while True:
+            flight = self._streams.get(key)
+            opener = flight is None
+            if flight is None:
+                self._stats.misses += 1
+                flight = asyncio.ensure_future(self._open(key, path, offset, length, if_none_match))
+                self._streams[key] = flight
+                flight.add_done_callback(lambda done: self._drop_failed(self._streams, key, done))
+            try:
+                # The opener is not shielded, so cancelling it cancels an open nobody else may need.
+                shared = await (flight if opener else asyncio.shield(flight))
+            except asyncio.CancelledError:
+                if opener or not flight.cancelled():
+                    raise
+                continue
+            if isinstance(shared, ObjectStream):
+                self._drop(self._streams, key, flight)
+                if opener:
+                    return shared
+                continue
+            stream = shared.attach()
+            if stream is not None:
+                if not opener:
+                    self._stats.hits += 1
+                return stream
+            self._drop(self._streams, key, flight)
+
+    async def get_object_properties(self, path: str) -> ObjectProperties:
+        """
+        Retrieves the properties of an object, joining the identical read in flight.
+
+        Args:
+            path (str): The path of the object.
+
+        Returns:
+            ObjectProperties: The properties of the object.
+        """
+        properties = await self._shared(("properties", path, ()), lambda: self.storage.get_object_properties(path))
+        return properties.model_copy()
+
+    async def create_object(
+        self,
+        path: str,
+        data: bytes,
+        overwrite: bool = False,
+        if_match: str | None = None,
+        metadata: dict[str, str] | None = None,
+    ) -> ObjectProperties:
+        """
+        Creates a new object.
+
+        Args:
+            path (str): The path of the object in the storage.
+            data (bytes): The content of the object.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            if_match (str | None, optional): If set, only replaces the object if its current etag matches.
+                Defaults to None.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object. Defaults to None.
+
+        Returns:
+            ObjectProperties: The properties of the created object.
+        """
+        try:
+            return await self.storage.create_object(path, data, overwrite, if_match, metadata)
+        finally:
+            self._forget(path)
+
+    async def create_object_stream(
+        self,
+        path: str,
+        chunks: AsyncIterator[bytes],
+        overwrite: bool = False,
+        metadata: dict[str, str] | None = None,
+    ) -> int:
+        """
+        Creates a new object from a stream of chunks.
+
+        Args:
+            path (str): The path of the object in the storage.
+            chunks (AsyncIterator[bytes]): The chunks to be uploaded as the object content, in order.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object. Defaults to None.
+
+        Returns:
+            int: The number of bytes uploaded.
+        """
+        try:
+            return await self.storage.create_object_stream(path, chunks, overwrite, metadata)
+        finally:
+            self._forget(path)
+
+    async def stage_block(self, path: str, block_id: str, data: bytes) -> None:
+        """
+        Stages a block of an object.
+
+        Args:
+            path (str): The path of the object the block belongs to.
+            block_id (str): The id of the block.
+            data (bytes): The content of the block.
+        """
+        await self.storage.stage_block(path, block_id, data)
+
+    async def list_staged_blocks(self, path: str) -> dict[str, int]:
+        """
+        Lists the blocks staged for an object and not committed yet.
+
+        Args:
+            path (str): The path of the object.
+
+        Returns:
+            dict[str, int]: The size of every staged block, by block id.
+        """
+        return await self.storage.list_staged_blocks(path)
+
+    async def commit_blocks(
+        self, path: str, block_ids: list[str], overwrite: bool = False, metadata: dict[str, str] | None = None
+    ) -> ObjectProperties:
+        """
+        Creates an object from staged blocks.
+
+        Args:
+            path (str): The path of the object.
+            block_ids (list[str]): The ids of the staged blocks making up the object, in order.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object. Defaults to None.
+
+        Returns:
+            ObjectProperties: The properties of the created object.
+        """
+        try:
+            return await self.storage.commit_blocks(path, block_ids, overwrite, metadata)
+        finally:
+            self._forget(path)
+
+    async def discard_blocks(self, path: str, block_ids: list[str]) -> None:
+        """
+        Discards blocks staged for an object.
+
+        Args:
+            path (str): The path of the object.
+            block_ids (list[str]): The ids of the blocks to discard.
+        """
+        await self.storage.discard_blocks(path, block_ids)
+
+    async def delete_object(self, path: str, if_match: str | None = None) -> bool:
+        """
+        Deletes an object.
+
+        Args:
+            path (str): The path of the object to delete.
+            if_match (str | None, optional): If set, only deletes the object if its current etag matches.
+                Defaults to None.
+
+        Returns:
+            bool: True if the object was deleted.
+        """
+        try:
+            return await self.storage.delete_object(path, if_match)
+        finally:
+            self._forget(path)
+
+    async def delete_objects(self, paths: list[str]) -> int:
+        """
+        Deletes several objects at once.
+
+        Args:
+            paths (list[str]): The paths of the objects to delete.
+
+        Returns:
+            int: The number of objects deleted.
+        """
+        try:
+            return await self.storage.delete_objects(paths)
+        finally:
+            for path in paths:
+                self._forget(path)
+
+    async def list_objects(self, path: str) -> list[str]:
+        """
+        Lists the paths of the objects whose paths start with the specified prefix, joining the identical listing in
+        flight.
+
+        Args:
+            path (str): The prefix to filter the object paths.
+
+        Returns:
+            list[str]: The matching object paths.
+        """
+        return list(await self._shared(("list_objects", path, ()), lambda: self.storage.list_objects(path)))
+
+    async def list_object_properties(self, prefix: str) -> AsyncIterator[ObjectProperties]:
+        """
+        Iterates over the properties of the objects whose paths start with the specified prefix.
+
+        Args:
+            prefix (str): The prefix to filter the object paths.
+
+        Yields:
+            ObjectProperties: The properties of every matching object.
+        """
+        async for properties in self.storage.list_object_properties(prefix):
+            yield properties
+
+    async def list_objects_page(self, prefix: str, limit: int, cursor: str | None = None) -> ObjectPage:
+        """
+        Lists a single page of the objects whose paths start with the specified prefix, joining the identical listing
+        in flight.
+
+        Args:
+            prefix (str): The prefix to filter the object paths.
+            limit (int): The maximum number of objects on the page.
+            cursor (str | None, optional): The continuation token returned with the previous page. Defaults to None,
+                which lists the first page.
+
+        Returns:
+            ObjectPage: The properties of the objects on the page and the continuation token of the next page.
+        """
+        page = await self._shared(
+            ("list_objects_page", prefix, (limit, cursor)),
+            lambda: self.storage.list_objects_page(prefix, limit, cursor),
+        )
+        return page.model_copy(update={"items": [item.model_copy() for item in page.items]})
+
+    async def list_prefixes(self, prefix: str = "", delimiter: str = "/") -> list[str]:
+        """
+        Lists the distinct path segments directly under the specified prefix, joining the identical listing in flight.
+
+        Args:
+            prefix (str, optional): The prefix to list segments under. Defaults to the root of the storage.
+            delimiter (str, optional): The path segment delimiter. Defaults to "/".
+
+        Returns:
+            list[str]: The matching prefixes, each ending with the delimiter.
+        """
+        prefixes = await self._shared(
+            ("list_prefixes", prefix, (delimiter,)), lambda: self.storage.list_prefixes(prefix, delimiter)
+        )
+        return list(prefixes)
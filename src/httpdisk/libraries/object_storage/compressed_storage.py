@@ -0,0 +1,440 @@
+from .object_storage import ObjectStorageProtocol
+from .models import ObjectPage, ObjectProperties, ObjectStream
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncGenerator, AsyncIterator, Callable
+import asyncio
+import zlib
+
+# Leading bytes of formats that are compressed already and are stored as they are.
+COMPRESSED_SIGNATURES = (
+    b"\x1f\x8b",  # gzip
+    b"PK\x03\x04",  # zip, docx, xlsx, jar, apk
+    b"\x28\xb5\x2f\xfd",  # zstd
+    b"BZh",  # bzip2
+    b"\xfd7zXZ\x00",  # xz
+    b"7z\xbc\xaf\x27\x1c",  # 7z
+    b"Rar!\x1a\x07",  # rar
+    b"\x89PNG\r\n\x1a\n",  # png
+    b"\xff\xd8\xff",  # jpeg
+    b"GIF8",  # gif
+    b"OggS",  # ogg
+    b"fLaC",  # flac
+    b"ID3",  # mp3
+    b"\x1a\x45\xdf\xa3",  # webm, mkv
+)
+
+
+class CompressedObjectStorage:
+    """
+    Compresses the objects of another object storage at rest with gzip.
+
+    Objects are compressed unless the content starts like an already compressed format or a trial compression of
+    its first bytes saves too little. Compression and decompression run in a thread pool, off the event loop.
+    Compressed objects are decompressed on read, and whole-object reads also expose the compressed chunks, so they
+    can be sent to clients that accept the encoding as they are.
+
+    Byte ranges of compressed objects are read by decompressing the object from its start, so objects larger than
+    max_size are stored as they are, keeping ranged reads of large files as cheap as without compression. Streamed
+    writes worth compressing are therefore buffered until they are known to fit, up to max_size bytes.
+
+    The properties of compressed objects report their uncompressed size, so the layers above are not aware of the
+    compression.
+
+    Args:
+        storage (ObjectStorageProtocol): The object storage the compressed objects are stored in.
+        level (int, optional): The zlib compression level. Defaults to 6.
+        workers (int, optional): The number of threads compressing and decompressing. Defaults to 4.
+        min_size (int, optional): The size below which objects are stored as they are. Defaults to 1 KiB.
+        sample_size (int, optional): The number of leading bytes compressed on trial. Defaults to 64 KiB.
+        max_ratio (float, optional): The largest compressed to uncompressed size ratio of the trial for which the
+            object is compressed. Defaults to 0.9.
+        chunk_size (int, optional): The maximum size of the decompressed chunks. Defaults to 1 MiB.
+        max_size (int, optional): The size above which objects are stored as they are. Defaults to 8 MiB.
+    """
+
+    encoding = "gzip"
+    _encoding_key = "httpdisk_encoding"
+    _size_key = "httpdisk_decoded_size"
+
+    def __init__(
+        self,
+        storage: ObjectStorageProtocol,
+        level: int = 6,
+        workers: int = 4,
+        min_size: int = 1024,
+        sample_size: int = 64 * 1024,
+        max_ratio: float = 0.9,
+        chunk_size: int = 1024 * 1024,
+        max_size: int = 8 * 1024 * 1024,
+    ):
+        self.storage = storage
+        self.level = level
+        self.min_size = min_size
+        self.sample_size = sample_size
+        self.max_ratio = max_ratio
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="compression")
+
+    async def context(self) -> AsyncGenerator[None, None]:
+        """
+        Runs the context of the underlying storage, and stops the compression threads on shutdown.
+        """
+        async for _ in self.storage.context():
+            yield
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, function: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    @classmethod
+    def _decoded(cls, properties: ObjectProperties) -> ObjectProperties:
+        if cls._encoding_key not in properties.metadata:
+            return properties
+        metadata = {
+            key: value for key, value in properties.metadata.items() if key not in (cls._encoding_key, cls._size_key)
+        }
+        return properties.model_copy(update={"size": int(properties.metadata[cls._size_key]), "metadata": metadata})
+
+    async def _compressible(self, sample: bytes) -> bool:
+        """
+        Decides whether content is worth compressing from its leading bytes.
+
+        Args:
+            sample (bytes): Up to sample_size leading bytes of the content.
+
+        Returns:
+            bool: True if the content should be compressed.
+        """
+        if len(sample) < self.min_size or sample.startswith(COMPRESSED_SIGNATURES):
+            return False
+        if sample[4:8] == b"ftyp" or (sample.startswith(b"RIFF") and sample[8:12] in (b"WEBP", b"AVI ")):
+            return False
+        compressed = await self._run(zlib.compress, sample, self.level)
+        return len(compressed) <= len(sample) * self.max_ratio
+
+    async def _compress(self, data: bytes) -> bytes:
+        encoded: bytes = await self._run(zlib.compress, data, self.level, 16 + zlib.MAX_WBITS)
+        return encoded
+
+    async def get_object(self, path: str) -> bytes:
+        """
+        Retrieves the whole content of an object, decompressed.
+
+        Args:
+            path (str): The path of the object to retrieve.
+
+        Returns:
+            bytes: The content of the object.
+        """
+        stream = await self.get_object_stream(path)
+        return b"".join([chunk async for chunk in stream.chunks])
+
+    async def get_object_stream(
+        self, path: str, offset: int | None = None, length: int | None = None, if_none_match: str | None = None
+    ) -> ObjectStream:
+        """
+        Opens a streaming download of an object, or of a byte range of it, decompressing it if needed.
+
+        Args:
+            path (str): The path of the object to retrieve.
+            offset (int | None, optional): The offset of the first byte to read. Defaults to the start of the object.
+            length (int | None, optional): The number of bytes to read. Defaults to the rest of the object.
+            if_none_match (str | None, optional): If set, only reads the object if its current etag differs.
+                Defaults to None.
+
+        Returns:
+            ObjectStream: The open download, with the compressed chunks if the whole object is read.
+
+        Raises:
+            ResourceNotModifiedError: If if_none_match matches the current etag of the object.
+        """
+        whole = not offset and length is None
+        if not whole:
+            properties = await self.storage.get_object_properties(path)
+            if self._encoding_key not in properties.metadata:
+                stream = await self.storage.get_object_stream(path, offset, length, if_none_match)
+                if self._encoding_key not in stream.properties.metadata:
+                    return stream
+                # Replaced by a compressed object since its properties were read.
+                await stream.aclose()
+        raw = await self.storage.get_object_stream(path, if_none_match=if_none_match)
+        if self._encoding_key not in raw.properties.metadata:
+            if whole:
+                return raw
+            await raw.aclose()
+            return await self.storage.get_object_stream(path, offset, length, if_none_match)
+
+        properties = self._decoded(raw.properties)
+        start = min(offset or 0, properties.size)
+        count = properties.size - start if length is None else min(length, properties.size - start)
+        return ObjectStream(
+            properties=properties,
+            offset=start,
+            length=count,
+            chunks=self._decompress(raw.chunks, start, count),
+            encoding=self.encoding if whole else None,
+            encoded_chunks=raw.chunks if whole else None,
+            encoded_length=raw.length if whole else None,
+        )
+
+    async def _decompress(self, chunks: AsyncIterator[bytes], offset: int, length: int) -> AsyncIterator[bytes]:
+        """
+        Decompresses a gzip stream, yielding only the requested byte range, and closes the stream once the range is
+        yielded or the iteration is stopped.
+
+        Args:
+            chunks (AsyncIterator[bytes]): The compressed content, in order.
+            offset (int): The offset of the first decompressed byte to yield.
+            length (int): The number of decompressed bytes to yield.
+
+        Yields:
+            bytes: The decompressed chunks of the range, each at most chunk_size bytes long.
+        """
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            async for chunk in chunks:
+                data = chunk
+                while data and length > 0:
+                    piece = await self._run(decompressor.decompress, data, self.chunk_size)
+                    data = decompressor.unconsumed_tail
+                    if offset >= len(piece):
+                        offset -= len(piece)
+                        continue
+                    piece = piece[offset : offset + length]
+                    offset = 0
+                    length -= len(piece)
+                    yield piece
+                if length <= 0:
+                    return
+        finally:
+            aclose = getattr(chunks, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    async def get_object_properties(self, path: str) -> ObjectProperties:
+        """
+        Retrieves the properties of an object, with its uncompressed size.
+
+        Args:
+            path (str): The path of the object.
+
+        Returns:
+            ObjectProperties: The properties of the object.
+        """
+        return self._decoded(await self.storage.get_object_properties(path))
+
+    async def create_object(
+        self,
+        path: str,
+        data: bytes,
+        overwrite: bool = False,
+        if_match: str | None = None,
+        metadata: dict[str, str] | None = None,
+    ) -> ObjectProperties:
+        """
+        Creates a new object, compressed if it is worth it and at most max_size bytes long.
+
+        Args:
+            path (str): The path of the object.
+            data (bytes): The content of the object.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            if_match (str | None, optional): If set, only replaces the object if its current etag matches.
+                Defaults to None.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object. Defaults to None.
+
+        Returns:
+            ObjectProperties: The properties of the created object.
+        """
+        if len(data) > self.max_size or not await self._compressible(data[: self.sample_size]):
+            return await self.storage.create_object(path, data, overwrite, if_match, metadata)
+
+        encoded = await self._compress(data)
+        metadata = {**(metadata or {}), self._encoding_key: self.encoding, self._size_key: str(len(data))}
+        return self._decoded(await self.storage.create_object(path, encoded, overwrite, if_match, metadata))
+
+    async def create_object_stream(
+        self,
+        path: str,
+        chunks: AsyncIterator[bytes],
+        overwrite: bool = False,
+        metadata: dict[str, str] | None = None,
+    ) -> int:
+        """
+        Creates a new object from a stream of chunks, compressed if its leading bytes show it is worth it and it is at
+        most max_size bytes long. Content worth compressing is buffered until it is known to fit, and streamed on as
+        it is once it does not.
+
+        Args:
+            path (str): The path of the object.
+            chunks (AsyncIterator[bytes]): The content of the object, in order.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object. Defaults to None.
+
+        Returns:
+            int: The number of uncompressed bytes stored.
+        """
+        iterator = aiter(chunks)
+        head = []
+        buffered = 0
+        worth: bool | None = None
+        async for chunk in iterator:
+            head.append(chunk)
+            buffered += len(chunk)
+            if worth is None and buffered >= self.sample_size:
+                worth = await self._compressible(b"".join(head)[: self.sample_size])
+            if worth is False or buffered > self.max_size:
+                break
+        else:
+            data = b"".join(head)
+            if worth or await self._compressible(data):
+                metadata = {**(metadata or {}), self._encoding_key: self.encoding, self._size_key: str(len(data))}
+                await self.storage.create_object(path, await self._compress(data), overwrite, None, metadata)
+                return len(data)
+
+        async def content() -> AsyncIterator[bytes]:
+            for chunk in head:
+                yield chunk
+            async for chunk in iterator:
+                yield chunk
+
+        return await self.storage.create_object_stream(path, content(), overwrite, metadata)
+
+    async def stage_block(self, path: str, block_id: str, data: bytes) -> None:
+        """
+        Stages a block of an object, to be committed later along with the object's other blocks.
+
+        Args:
+            path (str): The path of the object.
+            block_id (str): The id of the block.
+            data (bytes): The content of the block.
+        """
+        await self.storage.stage_block(path, block_id, data)
+
+    async def list_staged_blocks(self, path: str) -> dict[str, int]:
+        """
+        Lists the blocks of an object that were staged but not committed yet.
+
+        Args:
+            path (str): The path of the object.
+
+        Returns:
+            dict[str, int]: The size of every staged block, by block id.
+        """
+        return await self.storage.list_staged_blocks(path)
+
+    async def commit_blocks(
+        self,
+        path: str,
+        block_ids: list[str],
+        overwrite: bool = False,
+        metadata: dict[str, str] | None = None,
+    ) -> ObjectProperties:
+        """
+        Creates an object from staged blocks, which are stored as they are, without compression.
+
+        Args:
+            path (str): The path of the object.
+            block_ids (list[str]): The ids of the staged blocks making up the object, in order.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object. Defaults to None.
+
+        Returns:
+            ObjectProperties: The properties of the created object.
+        """
+        return await self.storage.commit_blocks(path, block_ids, overwrite, metadata)
+
+    async def discard_blocks(self, path: str, block_ids: list[str]) -> None:
+        """
+        Discards staged blocks of an object.
+
+        Args:
+            path (str): The path of the object.
+            block_ids (list[str]): The ids of the staged blocks to discard.
+        """
+        await self.storage.discard_blocks(path, block_ids)
+
+    async def delete_object(self, path: str, if_match: str | None = None) -> bool:
+        """
+        Deletes an object.
+
+        Args:
+            path (str): The path of the object to be deleted.
+            if_match (str | None, optional): If set, only deletes the object if its current etag matches.
+                Defaults to None.
+
+        Returns:
+            bool: True if the object is successfully deleted.
+        """
+        return await self.storage.delete_object(path, if_match)
+
+    async def delete_objects(self, paths: list[str]) -> int:
+        """
+        Deletes several objects. Objects that don't exist are skipped.
+
+        Args:
+            paths (list[str]): The paths of the objects to be deleted.
+
+        Returns:
+            int: The number of objects that no longer exist.
+        """
+        return await self.storage.delete_objects(paths)
+
+    async def list_objects(self, path: str) -> list[str]:
+        """
+        Lists the objects whose paths start with the specified prefix.
+
+        Args:
+            path (str): The prefix to filter the object paths.
+
+        Returns:
+            list[str]: The matching object paths.
+        """
+        return await self.storage.list_objects(path)
+
+    async def list_object_properties(self, prefix: str) -> AsyncIterator[ObjectProperties]:
+        """
+        Iterates over the properties of the objects whose paths start with the specified prefix, with their
+        uncompressed sizes.
+
+        Args:
+            prefix (str): The prefix to filter the object paths.
+
+        Yields:
+            ObjectProperties: The properties of every matching object.
+        """
+        async for properties in self.storage.list_object_properties(prefix):
+            yield self._decoded(properties)
+
+    async def list_objects_page(self, prefix: str, limit: int, cursor: str | None = None) -> ObjectPage:
+        """
+        Lists a single page of the objects whose paths start with the specified prefix, with their uncompressed
+        sizes.
+
+        Args:
+            prefix (str): The prefix to filter the object paths.
+            limit (int): The maximum number of objects on the page.
+            cursor (str | None, optional): The continuation token returned with the previous page. Defaults to None,
+                which lists the first page.
+
+        Returns:
+            ObjectPage: The properties of the objects on the page and the continuation token of the next page.
+        """
+        page = await self.storage.list_objects_page(prefix, limit, cursor)
+        return ObjectPage(items=[self._decoded(item) for item in page.items], cursor=page.cursor)
+
+    async def list_prefixes(self, prefix: str = "", delimiter: str = "/") -> list[str]:
+        """
+        Lists the distinct path segments directly under the specified prefix.
+
+        Args:
+            prefix (str, optional): The prefix to list segments under. Defaults to the root of the storage.
+            delimiter (str, optional): The path segment delimiter. Defaults to "/".
+
+        Returns:
+            list[str]: The matching prefixes, each ending with the delimiter.
+        """
+        return await self.storage.list_prefixes(prefix, delimiter)
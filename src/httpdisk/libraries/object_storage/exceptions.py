@@ -0,0 +1,19 @@
+class StorageUnavailableError(Exception):
+    """Raised when an operation of the object storage kept failing with errors that may go away on their own."""
+
+    def __init__(self, operation: str, attempts: int):
+        super().__init__(f"{operation} failed after {attempts} attempt(s)")
+        self.operation = operation
+        self.attempts = attempts
+
+
+class StorageTimeoutError(StorageUnavailableError):
+    """Raised when an operation of the object storage did not finish within its deadline."""
+
+
+class InvalidPathError(ValueError):
+    """Raised when an object path could resolve outside of its prefix, or names an object reserved by the storage."""
+
+    def __init__(self, path: str):
+        super().__init__(f"Invalid object path: {path}")
+        self.path = path
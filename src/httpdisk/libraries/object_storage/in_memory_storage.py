@@ -0,0 +1,399 @@
+from azure.core.exceptions import (
+    ResourceExistsError,
+    ResourceModifiedError,
+    ResourceNotFoundError,
+    ResourceNotModifiedError,
+    ServiceResponseError,
+)
+from .models import ObjectPage, ObjectProperties, ObjectStream
+from typing import AsyncGenerator, AsyncIterator, Callable
+import asyncio
+import bisect
+import datetime
+import itertools
+import random
+
+
+class InMemoryObjectStorage:
+    """
+    Keeps objects in process memory, for hermetic tests and benchmarks of the layers above the object storage.
+
+    Every operation can be slowed down by a simulated round trip and made to fail at a given rate, to exercise
+    latency-sensitive and error handling paths without network access.
+
+    Args:
+        latency (float, optional): The number of seconds every operation takes. Defaults to 0.
+        jitter (float, optional): The maximum number of seconds added at random to the latency. Defaults to 0.
+        failure_rate (float, optional): The probability of an operation failing. Defaults to 0.
+        failing_operations (set[str] | None, optional): The names of the operations that may fail, e.g.
+            {"get_object_stream"}. Defaults to None, which makes every operation fail at the failure rate.
+        failure (Callable[[str], Exception], optional): Creates the exception raised by a failing operation, given
+            the operation's name. Defaults to a ServiceResponseError.
+        chunk_size (int, optional): The size of the chunks objects are streamed in. Defaults to 1 MiB.
+        seed (int | None, optional): The seed of the random number generator, for reproducible runs. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        failing_operations: set[str] | None = None,
+        failure: Callable[[str], Exception] = lambda operation: ServiceResponseError(f"Injected {operation} failure"),
+        chunk_size: int = 1024 * 1024,
+        seed: int | None = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failing_operations = failing_operations
+        self.failure = failure
+        self.chunk_size = chunk_size
+        self._random = random.Random(seed)
+        self._objects: dict[str, tuple[bytes, ObjectProperties]] = {}
+        self._names: list[str] = []
+        self._blocks: dict[str, dict[str, bytes]] = {}
+        self._etags = itertools.count(1)
+
+    async def context(self) -> AsyncGenerator[None, None]:
+        """
+        Yields control, the storage needs no initialization.
+        """
+        yield
+
+    async def _round_trip(self, operation: str) -> None:
+        """
+        Simulates the latency of an operation and fails it at the configured rate.
+
+        Args:
+            operation (str): The name of the operation.
+        """
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.failure_rate and (self.failing_operations is None or operation in self.failing_operations):
+            if self._random.random() < self.failure_rate:
+                raise self.failure(operation)
+
+    def _entry(self, path: str) -> tuple[bytes, ObjectProperties]:
+        try:
+            return self._objects[path]
+        except KeyError as e:
+            raise ResourceNotFoundError(message=f"The specified object does not exist: {path}") from e
+
+    def _store(
+        self, path: str, data: bytes, overwrite: bool, if_match: str | None, metadata: dict[str, str] | None = None
+    ) -> ObjectProperties:
+        current = self._objects.get(path)
+        if if_match is not None:
+            if current is None or current[1].etag != if_match:
+                raise ResourceModifiedError(message="The condition specified by if_match is not met.")
+        elif current is not None and not overwrite:
+            raise ResourceExistsError(message=f"The specified object already exists: {path}")
+        properties = ObjectProperties(
+            name=path,
+            size=len(data),
+            etag=f'"{next(self._etags):x}"',
+            last_modified=datetime.datetime.now(tz=datetime.timezone.utc),
+            metadata=metadata or {},
+        )
+        if current is None:
+            bisect.insort(self._names, path)
+        self._objects[path] = (data, properties)
+        return properties
+
+    def _remove(self, path: str, if_match: str | None = None) -> None:
+        _, properties = self._entry(path)
+        if if_match is not None and properties.etag != if_match:
+            raise ResourceModifiedError(message="The condition specified by if_match is not met.")
+        del self._objects[path]
+        del self._names[bisect.bisect_left(self._names, path)]
+
+    def _range(self, prefix: str, after: str | None = None) -> range:
+        start = bisect.bisect_left(self._names, prefix)
+        if after is not None:
+            start = max(start, bisect.bisect_right(self._names, after))
+        return range(start, bisect.bisect_left(self._names, prefix + "\U0010ffff"))
+
+    async def get_object(self, path: str) -> bytes:
+        """
+        Retrieves the whole content of an object.
+
+        Args:
+            path (str): The path of the object to retrieve.
+
+        Returns:
+            bytes: The content of the object.
+        """
+        await self._round_trip("get_object")
+        return self._entry(path)[0]
+
+    async def get_object_stream(
+        self, path: str, offset: int | None = None, length: int | None = None, if_none_match: str | None = None
+    ) -> ObjectStream:
+        """
+        Opens a streaming download of an object, or of a byte range of it.
+
+        Args:
+            path (str): The path of the object to retrieve.
+            offset (int | None, optional): The offset of the first byte to read. Defaults to the start of the object.
+            length (int | None, optional): The number of bytes to read. Defaults to the rest of the object.
+            if_none_match (str | None, optional): If set, only reads the object if its current etag differs.
+                Defaults to None.
+
+        Returns:
+            ObjectStream: The open download.
+
+        Raises:
+            ResourceNotModifiedError: If if_none_match matches the current etag of the object.
+        """
+        await self._round_trip("get_object_stream")
+        data, properties = self._entry(path)
+        if if_none_match is not None and properties.etag == if_none_match:
+            raise ResourceNotModifiedError(message="The condition specified by if_none_match is not met.")
+        start = min(offset or 0, len(data))
+        end = len(data) if length is None else min(start + length, len(data))
+        view = memoryview(data)[start:end]
+
+        async def chunks() -> AsyncIterator[bytes]:
+            for position in range(0, len(view), self.chunk_size):
+                yield bytes(view[position : position + self.chunk_size])
+
+        return ObjectStream(properties=properties, offset=start, length=end - start, chunks=chunks())
+
+    async def get_object_properties(self, path: str) -> ObjectProperties:
+        """
+        Retrieves the properties of an object.
+
+        Args:
+            path (str): The path of the object.
+
+        Returns:
+            ObjectProperties: The properties of the object.
+        """
+        await self._round_trip("get_object_properties")
+        return self._entry(path)[1]
+
+    async def create_object(
+        self,
+        path: str,
+        data: bytes,
+        overwrite: bool = False,
+        if_match: str | None = None,
+        metadata: dict[str, str] | None = None,
+    ) -> ObjectProperties:
+        """
+        Creates a new object.
+
+        Args:
+            path (str): The path of the object.
+            data (bytes): The content of the object.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            if_match (str | None, optional): If set, only replaces the object if its current etag matches.
+                Defaults to None.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object. Defaults to None.
+
+        Returns:
+            ObjectProperties: The properties of the created object.
+        """
+        await self._round_trip("create_object")
+        return self._store(path, bytes(data), overwrite, if_match, metadata)
+
+    async def create_object_stream(
+        self,
+        path: str,
+        chunks: AsyncIterator[bytes],
+        overwrite: bool = False,
+        metadata: dict[str, str] | None = None,
+    ) -> int:
+        """
+        Creates a new object from a stream of chunks. The object only becomes visible once the stream is exhausted.
+
+        Args:
+            path (str): The path of the object.
+            chunks (AsyncIterator[bytes]): The content of the object, in order.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object, read once the
+                stream is exhausted. Defaults to None.
+
+        Returns:
+            int: The number of bytes stored.
+        """
+        await self._round_trip("create_object_stream")
+        data = b"".join([chunk async for chunk in chunks])
+        self._store(path, data, overwrite, None, dict(metadata) if metadata else None)
+        return len(data)
+
+    async def stage_block(self, path: str, block_id: str, data: bytes) -> None:
+        """
+        Stages a block of an object, to be committed later along with the object's other blocks.
+
+        Args:
+            path (str): The path of the object.
+            block_id (str): The id of the block.
+            data (bytes): The content of the block.
+        """
+        await self._round_trip("stage_block")
+        self._blocks.setdefault(path, {})[block_id] = bytes(data)
+
+    async def list_staged_blocks(self, path: str) -> dict[str, int]:
+        """
+        Lists the blocks of an object that were staged but not committed yet.
+
+        Args:
+            path (str): The path of the object.
+
+        Returns:
+            dict[str, int]: The size of every staged block, by block id.
+        """
+        await self._round_trip("list_staged_blocks")
+        return {block_id: len(data) for block_id, data in self._blocks.get(path, {}).items()}
+
+    async def commit_blocks(
+        self,
+        path: str,
+        block_ids: list[str],
+        overwrite: bool = False,
+        metadata: dict[str, str] | None = None,
+    ) -> ObjectProperties:
+        """
+        Creates an object from staged blocks, discarding every other staged block of the object.
+
+        Args:
+            path (str): The path of the object.
+            block_ids (list[str]): The ids of the staged blocks making up the object, in order.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object. Defaults to None.
+
+        Returns:
+            ObjectProperties: The properties of the created object.
+
+        Raises:
+            ResourceNotFoundError: If one of the blocks is not staged.
+        """
+        await self._round_trip("commit_blocks")
+        staged = self._blocks.get(path, {})
+        missing = [block_id for block_id in block_ids if block_id not in staged]
+        if missing:
+            raise ResourceNotFoundError(message=f"The specified blocks are not staged: {missing}")
+        properties = self._store(path, b"".join(staged[block_id] for block_id in block_ids), overwrite, None, metadata)
+        del self._blocks[path]
+        return properties
+
+    async def discard_blocks(self, path: str, block_ids: list[str]) -> None:
+        """
+        Discards staged blocks of an object.
+
+        Args:
+            path (str): The path of the object.
+            block_ids (list[str]): The ids of the staged blocks to discard.
+        """
+        await self._round_trip("discard_blocks")
+        staged = self._blocks.get(path, {})
+        for block_id in block_ids:
+            staged.pop(block_id, None)
+        if not staged:
+            self._blocks.pop(path, None)
+
+    async def delete_object(self, path: str, if_match: str | None = None) -> bool:
+        """
+        Deletes an object.
+
+        Args:
+            path (str): The path of the object to be deleted.
+            if_match (str | None, optional): If set, only deletes the object if its current etag matches.
+                Defaults to None.
+
+        Returns:
+            bool: True if the object is successfully deleted.
+        """
+        await self._round_trip("delete_object")
+        self._remove(path, if_match)
+        return True
+
+    async def delete_objects(self, paths: list[str]) -> int:
+        """
+        Deletes several objects. Objects that don't exist are skipped.
+
+        Args:
+            paths (list[str]): The paths of the objects to be deleted.
+
+        Returns:
+            int: The number of objects that no longer exist.
+        """
+        await self._round_trip("delete_objects")
+        for path in paths:
+            if path in self._objects:
+                self._remove(path)
+        return len(paths)
+
+    async def list_objects(self, path: str) -> list[str]:
+        """
+        Lists the objects whose paths start with the specified prefix.
+
+        Args:
+            path (str): The prefix to filter the object paths.
+
+        Returns:
+            list[str]: The matching object paths.
+        """
+        await self._round_trip("list_objects")
+        return [self._names[i] for i in self._range(path)]
+
+    async def list_object_properties(self, prefix: str) -> AsyncIterator[ObjectProperties]:
+        """
+        Iterates over the properties of the objects whose paths start with the specified prefix.
+
+        Args:
+            prefix (str): The prefix to filter the object paths.
+
+        Yields:
+            ObjectProperties: The properties of every matching object.
+        """
+        await self._round_trip("list_object_properties")
+        for name in [self._names[i] for i in self._range(prefix)]:
+            if name in self._objects:
+                yield self._objects[name][1]
+
+    async def list_objects_page(self, prefix: str, limit: int, cursor: str | None = None) -> ObjectPage:
+        """
+        Lists a single page of the objects whose paths start with the specified prefix.
+
+        Args:
+            prefix (str): The prefix to filter the object paths.
+            limit (int): The maximum number of objects on the page.
+            cursor (str | None, optional): The continuation token returned with the previous page, which is the path
+                of the last object listed. Defaults to None, which lists the first page.
+
+        Returns:
+            ObjectPage: The properties of the objects on the page and the continuation token of the next page.
+        """
+        await self._round_trip("list_objects_page")
+        matching = self._range(prefix, cursor)
+        page = matching[:limit]
+        items = [self._objects[self._names[i]][1] for i in page]
+        return ObjectPage(items=items, cursor=items[-1].name if len(matching) > limit else None)
+
+    async def list_prefixes(self, prefix: str = "", delimiter: str = "/") -> list[str]:
+        """
+        Lists the distinct path segments directly under the specified prefix.
+
+        Args:
+            prefix (str, optional): The prefix to list segments under. Defaults to the root of the storage.
+            delimiter (str, optional): The path segment delimiter. Defaults to "/".
+
+        Returns:
+            list[str]: The matching prefixes, each ending with the delimiter.
+        """
+        await self._round_trip("list_prefixes")
+        prefixes: list[str] = []
+        for i in self._range(prefix):
+            rest = self._names[i][len(prefix) :]
+            if delimiter in rest:
+                segment = prefix + rest.split(delimiter, 1)[0] + delimiter
+                if not prefixes or prefixes[-1] != segment:
+                    prefixes.append(segment)
+        return prefixes
@@ -0,0 +1,558 @@
+from azure.core.exceptions import (
+    ResourceExistsError,
+    ResourceModifiedError,
+    ResourceNotFoundError,
+    ResourceNotModifiedError,
+)
+from .exceptions import InvalidPathError
+from .models import ObjectPage, ObjectProperties, ObjectStream
+from .paths import is_valid_path
+from typing import AsyncGenerator, AsyncIterator, BinaryIO
+import asyncio
+import datetime
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import stat
+import uuid
+
+
+class LocalFsStorage:
+    """
+    Stores objects as files under a root directory of the local file system.
+
+    Writes go to a temporary file first and are moved into place with a single rename, so readers never see a
+    partially written object. Object paths map directly onto file paths, "/" separating directories, and object
+    metadata is kept in an extended attribute of the file. Paths with empty, "." or ".." segments are rejected, so
+    no path can reach a file outside of its own directory. Staged blocks are kept as separate files, in a directory
+    of their object under the temporary directory, until they are committed.
+
+    Args:
+        root (str): The directory the objects are stored under.
+        chunk_size (int, optional): The size of the chunks objects are streamed in. Defaults to 1 MiB.
+    """
+
+    _tmp = ".httpdisk-tmp"
+    _metadata_attribute = "user.httpdisk.metadata"
+
+    def __init__(self, root: str, chunk_size: int = 1024 * 1024):
+        self.root = os.path.abspath(root)
+        self.chunk_size = chunk_size
+        self._tmp_dir = os.path.join(self.root, self._tmp)
+        self._lock_path = os.path.join(self._tmp_dir, ".lock")
+
+    async def context(self) -> AsyncGenerator[None, None]:
+        """
+        Creates the root directory if needed and yields control.
+        """
+        await asyncio.to_thread(os.makedirs, self._tmp_dir, exist_ok=True)
+        yield
+
+    def _file(self, path: str) -> str:
+        if not is_valid_path(path) or path.split("/", 1)[0] == self._tmp:
+            raise InvalidPathError(path)
+        return os.path.join(self.root, *path.split("/"))
+
+    @staticmethod
+    def _properties(path: str, result: os.stat_result, metadata: dict[str, str] | None = None) -> ObjectProperties:
+        return ObjectProperties(
+            name=path,
+            size=result.st_size,
+            etag=f'"{result.st_ino:x}-{result.st_mtime_ns:x}-{result.st_size:x}"',
+            last_modified=datetime.datetime.fromtimestamp(result.st_mtime, tz=datetime.timezone.utc),
+            metadata=metadata or {},
+        )
+
+    def _describe(self, path: str) -> ObjectProperties:
+        result = self._stat(path)
+        try:
+            metadata = json.loads(os.getxattr(self._file(path), self._metadata_attribute))
+        except OSError:
+            metadata = {}
+        return self._properties(path, result, metadata)
+
+    def _stat(self, path: str) -> os.stat_result:
+        try:
+            result = os.stat(self._file(path))
+        except (FileNotFoundError, NotADirectoryError) as e:
+            raise ResourceNotFoundError(message=f"The specified object does not exist: {path}") from e
+        if not stat.S_ISREG(result.st_mode):
+            raise ResourceNotFoundError(message=f"The specified object does not exist: {path}")
+        return result
+
+    def _directory(self, prefix: str) -> str | None:
+        prefix = prefix.removesuffix("/")
+        if not prefix:
+            return self.root
+        if not is_valid_path(prefix) or prefix.split("/", 1)[0] == self._tmp:
+            return None
+        return os.path.join(self.root, *prefix.split("/"))
+
+    def _blocks_dir(self, path: str) -> str:
+        self._file(path)
+        return os.path.join(self._tmp_dir, "blocks", hashlib.sha256(path.encode()).hexdigest())
+
+    def _block_file(self, path: str, block_id: str) -> str:
+        return os.path.join(self._blocks_dir(path), block_id.encode().hex())
+
+    def _open_tmp(self) -> tuple[str, BinaryIO]:
+        os.makedirs(self._tmp_dir, exist_ok=True)
+        tmp = os.path.join(self._tmp_dir, uuid.uuid4().hex)
+        return (tmp, open(tmp, "wb"))
+
+    async def get_object(self, path: str) -> bytes:
+        """
+        Retrieves the whole content of an object.
+
+        Args:
+            path (str): The path of the object to retrieve.
+
+        Returns:
+            bytes: The content of the object.
+        """
+        stream = await self.get_object_stream(path)
+        return b"".join([chunk async for chunk in stream.chunks])
+
+    async def get_object_stream(
+        self, path: str, offset: int | None = None, length: int | None = None, if_none_match: str | None = None
+    ) -> ObjectStream:
+        """
+        Opens a streaming download of an object, or of a byte range of it.
+
+        The file is only opened once the chunks are iterated over, so the stream can be served from its local path
+        instead without leaking a file descriptor.
+
+        Args:
+            path (str): The path of the object to retrieve.
+            offset (int | None, optional): The offset of the first byte to read. Defaults to the start of the object.
+            length (int | None, optional): The number of bytes to read. Defaults to the rest of the object.
+            if_none_match (str | None, optional): If set, only reads the object if its current etag differs.
+                Defaults to None.
+
+        Returns:
+            ObjectStream: The open download, along with the path of the file holding the object.
+
+        Raises:
+            ResourceNotModifiedError: If if_none_match matches the current etag of the object.
+        """
+        properties = await asyncio.to_thread(self._describe, path)
+        if if_none_match is not None and properties.etag == if_none_match:
+            raise ResourceNotModifiedError(message="The condition specified by if_none_match is not met.")
+        start = min(offset or 0, properties.size)
+        count = properties.size - start if length is None else min(length, properties.size - start)
+        return ObjectStream(
+            properties=properties,
+            offset=start,
+            length=count,
+            chunks=self._read_chunks(self._file(path), start, count),
+            local_path=self._file(path),
+        )
+
+    async def _read_chunks(self, file: str, offset: int, length: int) -> AsyncIterator[bytes]:
+        fd = await asyncio.to_thread(os.open, file, os.O_RDONLY)
+        try:
+            while length > 0:
+                chunk = await asyncio.to_thread(os.pread, fd, min(self.chunk_size, length), offset)
+                if not chunk:
+                    return
+                offset += len(chunk)
+                length -= len(chunk)
+                yield chunk
+        finally:
+            os.close(fd)
+
+    async def get_object_properties(self, path: str) -> ObjectProperties:
+        """
+        Retrieves the properties of an object.
+
+        Args:
+            path (str): The path of the object.
+
+        Returns:
+            ObjectProperties: The properties of the object.
+        """
+        return await asyncio.to_thread(self._describe, path)
+
+    async def create_object(
+        self,
+        path: str,
+        data: bytes,
+        overwrite: bool = False,
+        if_match: str | None = None,
+        metadata: dict[str, str] | None = None,
+    ) -> ObjectProperties:
+        """
+        Creates a new object atomically.
+
+        Args:
+            path (str): The path of the object.
+            data (bytes): The content of the object.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            if_match (str | None, optional): If set, only replaces the object if its current etag matches.
+                Defaults to None.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object. Defaults to None.
+
+        Returns:
+            ObjectProperties: The properties of the created object.
+        """
+
+        async def chunks() -> AsyncIterator[bytes]:
+            yield data
+
+        return await self._write(path, chunks(), overwrite, if_match, metadata)
+
+    async def create_object_stream(
+        self,
+        path: str,
+        chunks: AsyncIterator[bytes],
+        overwrite: bool = False,
+        metadata: dict[str, str] | None = None,
+    ) -> int:
+        """
+        Creates a new object atomically from a stream of chunks.
+
+        Args:
+            path (str): The path of the object.
+            chunks (AsyncIterator[bytes]): The content of the object, in order.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object, read once the
+                stream is exhausted. Defaults to None.
+
+        Returns:
+            int: The number of bytes stored.
+        """
+        return (await self._write(path, chunks, overwrite, None, metadata)).size
+
+    async def _write(
+        self,
+        path: str,
+        chunks: AsyncIterator[bytes],
+        overwrite: bool,
+        if_match: str | None,
+        metadata: dict[str, str] | None = None,
+    ) -> ObjectProperties:
+        """
+        Writes the chunks to a temporary file and moves it into place.
+
+        Renaming and linking keep the inode and the modification time, so the etag of the temporary file is the
+        etag of the created object.
+
+        Args:
+            path (str): The path of the object.
+            chunks (AsyncIterator[bytes]): The content of the object, in order.
+            overwrite (bool): Whether an existing object may be replaced.
+            if_match (str | None): The etag the existing object must have to be replaced.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object.
+                Defaults to None.
+
+        Returns:
+            ObjectProperties: The properties of the created object.
+
+        Raises:
+            ResourceExistsError: If the object exists and neither overwrite nor if_match is set.
+            ResourceModifiedError: If if_match does not match the etag of the existing object.
+        """
+        file = self._file(path)
+        tmp, handle = await asyncio.to_thread(self._open_tmp)
+        try:
+            try:
+                async for chunk in chunks:
+                    await asyncio.to_thread(handle.write, chunk)
+                await asyncio.to_thread(handle.flush)
+            finally:
+                await asyncio.to_thread(handle.close)
+            if metadata:
+                await asyncio.to_thread(os.setxattr, tmp, self._metadata_attribute, json.dumps(metadata).encode())
+            properties = self._properties(path, await asyncio.to_thread(os.stat, tmp), metadata)
+            await asyncio.to_thread(self._commit, path, file, tmp, overwrite, if_match)
+        finally:
+            if os.path.exists(tmp):
+                await asyncio.to_thread(os.unlink, tmp)
+        return properties
+
+    def _commit(self, path: str, file: str, tmp: str, overwrite: bool, if_match: str | None) -> None:
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        if if_match is not None:
+            with open(self._lock_path, "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    if self._properties(path, self._stat(path)).etag != if_match:
+                        raise ResourceModifiedError(message="The condition specified by if_match is not met.")
+                    os.replace(tmp, file)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+                return
+        if overwrite:
+            os.replace(tmp, file)
+            return
+        try:
+            os.link(tmp, file)
+        except FileExistsError as e:
+            raise ResourceExistsError(message=f"The specified object already exists: {path}") from e
+
+    async def stage_block(self, path: str, block_id: str, data: bytes) -> None:
+        """
+        Stages a block of an object, to be committed later along with the object's other blocks.
+
+        Args:
+            path (str): The path of the object.
+            block_id (str): The id of the block.
+            data (bytes): The content of the block.
+        """
+
+        def stage() -> None:
+            tmp, handle = self._open_tmp()
+            try:
+                with handle:
+                    handle.write(data)
+                os.makedirs(self._blocks_dir(path), exist_ok=True)
+                os.replace(tmp, self._block_file(path, block_id))
+            finally:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+
+        await asyncio.to_thread(stage)
+
+    async def list_staged_blocks(self, path: str) -> dict[str, int]:
+        """
+        Lists the blocks of an object that were staged but not committed yet.
+
+        Args:
+            path (str): The path of the object.
+
+        Returns:
+            dict[str, int]: The size of every staged block, by block id.
+        """
+
+        def list_blocks() -> dict[str, int]:
+            try:
+                entries = list(os.scandir(self._blocks_dir(path)))
+            except FileNotFoundError:
+                return {}
+            return {bytes.fromhex(entry.name).decode(): entry.stat().st_size for entry in entries}
+
+        return await asyncio.to_thread(list_blocks)
+
+    async def commit_blocks(
+        self,
+        path: str,
+        block_ids: list[str],
+        overwrite: bool = False,
+        metadata: dict[str, str] | None = None,
+    ) -> ObjectProperties:
+        """
+        Creates an object atomically from staged blocks, discarding every other staged block of the object.
+
+        Args:
+            path (str): The path of the object.
+            block_ids (list[str]): The ids of the staged blocks making up the object, in order.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object. Defaults to None.
+
+        Returns:
+            ObjectProperties: The properties of the created object.
+
+        Raises:
+            ResourceExistsError: If the object already exists and overwrite is False.
+            ResourceNotFoundError: If one of the blocks is not staged.
+        """
+        staged = await self.list_staged_blocks(path)
+        missing = [block_id for block_id in block_ids if block_id not in staged]
+        if missing:
+            raise ResourceNotFoundError(message=f"The specified blocks are not staged: {missing}")
+
+        async def chunks() -> AsyncIterator[bytes]:
+            for block_id in block_ids:
+                file = self._block_file(path, block_id)
+                async for chunk in self._read_chunks(file, 0, staged[block_id]):
+                    yield chunk
+
+        properties = await self._write(path, chunks(), overwrite, None, metadata)
+        await asyncio.to_thread(shutil.rmtree, self._blocks_dir(path), True)
+        return properties
+
+    async def discard_blocks(self, path: str, block_ids: list[str]) -> None:
+        """
+        Discards staged blocks of an object.
+
+        Args:
+            path (str): The path of the object.
+            block_ids (list[str]): The ids of the staged blocks to discard.
+        """
+
+        def discard() -> None:
+            for block_id in block_ids:
+                try:
+                    os.unlink(self._block_file(path, block_id))
+                except FileNotFoundError:
+                    pass
+            try:
+                os.rmdir(self._blocks_dir(path))
+            except OSError:
+                pass
+
+        await asyncio.to_thread(discard)
+
+    async def delete_object(self, path: str, if_match: str | None = None) -> bool:
+        """
+        Deletes an object, along with the directories it leaves empty.
+
+        Args:
+            path (str): The path of the object to be deleted.
+            if_match (str | None, optional): If set, only deletes the object if its current etag matches.
+                Defaults to None.
+
+        Returns:
+            bool: True if the object is successfully deleted.
+
+        Raises:
+            ResourceModifiedError: If if_match does not match the etag of the object.
+        """
+        await asyncio.to_thread(self._delete, path, if_match)
+        return True
+
+    def _delete(self, path: str, if_match: str | None = None) -> None:
+        file = self._file(path)
+        if if_match is not None:
+            with open(self._lock_path, "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    if self._properties(path, self._stat(path)).etag != if_match:
+                        raise ResourceModifiedError(message="The condition specified by if_match is not met.")
+                    os.unlink(file)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        else:
+            try:
+                os.unlink(file)
+            except (FileNotFoundError, NotADirectoryError) as e:
+                raise ResourceNotFoundError(message=f"The specified object does not exist: {path}") from e
+        directory = os.path.dirname(file)
+        while directory != self.root:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
+
+    async def delete_objects(self, paths: list[str]) -> int:
+        """
+        Deletes several objects. Objects that don't exist are skipped.
+
+        Args:
+            paths (list[str]): The paths of the objects to be deleted.
+
+        Returns:
+            int: The number of objects that no longer exist.
+        """
+        for path in paths:
+            try:
+                await asyncio.to_thread(self._delete, path)
+            except ResourceNotFoundError:
+                pass
+        return len(paths)
+
+    def _names(self, prefix: str) -> list[str]:
+        """
+        Collects the sorted paths of every object starting with the prefix.
+
+        Args:
+            prefix (str): The prefix to filter the object paths.
+
+        Returns:
+            list[str]: The matching object paths, in lexicographical order.
+        """
+        directory = self._directory(os.path.dirname(prefix))
+        if directory is None:
+            return []
+        names = []
+        for current, directories, files in os.walk(directory):
+            if current == self.root and self._tmp in directories:
+                directories.remove(self._tmp)
+            relative = os.path.relpath(current, self.root).replace(os.sep, "/")
+            for file in files:
+                name = file if relative == "." else f"{relative}/{file}"
+                if name.startswith(prefix):
+                    names.append(name)
+        return sorted(names)
+
+    async def list_objects(self, path: str) -> list[str]:
+        """
+        Lists the objects whose paths start with the specified prefix.
+
+        Args:
+            path (str): The prefix to filter the object paths.
+
+        Returns:
+            list[str]: The matching object paths.
+        """
+        return await asyncio.to_thread(self._names, path)
+
+    async def list_object_properties(self, prefix: str) -> AsyncIterator[ObjectProperties]:
+        """
+        Iterates over the properties of the objects whose paths start with the specified prefix.
+
+        Args:
+            prefix (str): The prefix to filter the object paths.
+
+        Yields:
+            ObjectProperties: The properties of every matching object.
+        """
+        for name in await asyncio.to_thread(self._names, prefix):
+            try:
+                yield await self.get_object_properties(name)
+            except ResourceNotFoundError:
+                continue
+
+    async def list_objects_page(self, prefix: str, limit: int, cursor: str | None = None) -> ObjectPage:
+        """
+        Lists a single page of the objects whose paths start with the specified prefix.
+
+        Args:
+            prefix (str): The prefix to filter the object paths.
+            limit (int): The maximum number of objects on the page.
+            cursor (str | None, optional): The continuation token returned with the previous page, which is the path
+                of the last object listed. Defaults to None, which lists the first page.
+
+        Returns:
+            ObjectPage: The properties of the objects on the page and the continuation token of the next page.
+        """
+        names = await asyncio.to_thread(self._names, prefix)
+        if cursor is not None:
+            names = [name for name in names if name > cursor]
+        items = []
+        for name in names[:limit]:
+            try:
+                items.append(await self.get_object_properties(name))
+            except ResourceNotFoundError:
+                continue
+        return ObjectPage(items=items, cursor=names[limit - 1] if len(names) > limit else None)
+
+    async def list_prefixes(self, prefix: str = "", delimiter: str = "/") -> list[str]:
+        """
+        Lists the directories directly under the specified prefix.
+
+        Args:
+            prefix (str, optional): The prefix to list directories under. Defaults to the root directory.
+            delimiter (str, optional): The path segment delimiter, only "/" is supported. Defaults to "/".
+
+        Returns:
+            list[str]: The paths of the directories, each ending with the delimiter.
+        """
+
+        def scan() -> list[str]:
+            directory = self._directory(prefix)
+            if directory is None or not os.path.isdir(directory):
+                return []
+            return sorted(
+                f"{prefix}{entry.name}{delimiter}"
+                for entry in os.scandir(directory)
+                if entry.is_dir() and entry.name != self._tmp
+            )
+
+        return await asyncio.to_thread(scan)
@@ -0,0 +1,72 @@
+from pydantic import BaseModel, ConfigDict
+from typing import AsyncIterator
+import datetime
+
+
+class ObjectProperties(BaseModel):
+    """
+    Represents the properties of a stored object.
+
+    Attributes:
+        name (str): The full path of the object.
+        size (int): The size of the object in bytes.
+        etag (str | None): The entity tag of the current version of the object.
+        last_modified (datetime.datetime | None): The time the object was last modified.
+        metadata (dict[str, str]): The user-defined metadata stored along with the object.
+    """
+    name: str
+    size: int
+    etag: str | None = None
+    last_modified: datetime.datetime | None = None
+    metadata: dict[str, str] = {}
+
+
+class ObjectPage(BaseModel):
+    """
+    Represents a single page of a listing of stored objects.
+
+    Attributes:
+        items (list[ObjectProperties]): The properties of the objects on the page.
+        cursor (str | None): The continuation token of the next page, or None if this is the last page.
+    """
+    items: list[ObjectProperties]
+    cursor: str | None = None
+
+
+class ObjectStream(BaseModel):
+    """
+    Represents an open download of a byte range of a stored object.
+
+    Attributes:
+        properties (ObjectProperties): The properties of the whole object.
+        offset (int): The offset of the first streamed byte.
+        length (int): The number of streamed bytes.
+        chunks (AsyncIterator[bytes]): The streamed content, in order.
+        local_path (str | None): A local file holding the whole object, which can be served directly instead of
+            iterating over the chunks, if the storage keeps one. It stays in place until the stream is closed.
+        encoding (str | None): The content coding the object is stored with, e.g. "gzip", if the whole object is
+            streamed and can be sent encoded as is.
+        encoded_chunks (AsyncIterator[bytes] | None): The encoded content, which can be iterated over instead of the
+            chunks if the encoding is set.
+        encoded_length (int | None): The number of encoded bytes, if the encoding is set.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    properties: ObjectProperties
+    offset: int
+    length: int
+    chunks: AsyncIterator[bytes]
+    local_path: str | None = None
+    encoding: str | None = None
+    encoded_chunks: AsyncIterator[bytes] | None = None
+    encoded_length: int | None = None
+
+    async def aclose(self) -> None:
+        """
+        Stops the download, releasing what the storage holds for it, such as open files. Streams iterated to the end
+        release it on their own, and so do abandoned streams once they are garbage collected.
+        """
+        for chunks in (self.chunks, self.encoded_chunks):
+            aclose = getattr(chunks, "aclose", None)
+            if aclose is not None:
+                await aclose()
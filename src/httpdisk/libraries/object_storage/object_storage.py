@@ -1,8 +1,20 @@
-from typing import Protocol, Any
+from typing import Protocol, Any, AsyncGenerator, AsyncIterator
+from .models import ObjectPage, ObjectProperties, ObjectStream
 
 class ObjectStorageProtocol(Protocol):
     """A protocol defining the interface for object storage operations."""
 
+    def context(self) -> AsyncGenerator[None, None]:
+        """Run the storage for the lifetime of the application, opening its clients before the single yield and
+        closing them after it.
+
+        Yields:
+            None: Once the storage is ready to be used.
+
+        """
+
+        pass
+
     async def get_object(self, path: str) -> Any:
         """Retrieve an object from the storage.
 
@@ -16,30 +28,182 @@ class ObjectStorageProtocol(Protocol):
 
         pass
 
-    async def create_object(self, path: str, data: bytes, overwrite: bool = False) -> bool:
+    async def get_object_stream(
+        self, path: str, offset: int | None = None, length: int | None = None, if_none_match: str | None = None
+    ) -> ObjectStream:
+        """Open a streaming download of an object, or of a byte range of it.
+
+        Args:
+            path (str): The path of the object.
+            offset (int | None, optional): The offset of the first byte to download. Defaults to the start of
+                the object.
+            length (int | None, optional): The number of bytes to download. Defaults to the rest of the object.
+            if_none_match (str | None, optional): Only download the object if its current etag differs.
+                Defaults to None.
+
+        Returns:
+            ObjectStream: The open download.
+
+        Raises:
+            ResourceNotModifiedError: If if_none_match matches the current etag of the object.
+
+        """
+
+        pass
+
+    async def get_object_properties(self, path: str) -> ObjectProperties:
+        """Retrieve the properties of an object without downloading its content.
+
+        Args:
+            path (str): The path of the object.
+
+        Returns:
+            ObjectProperties: The properties of the object.
+
+        """
+
+        pass
+
+    async def create_object(
+        self,
+        path: str,
+        data: bytes,
+        overwrite: bool = False,
+        if_match: str | None = None,
+        metadata: dict[str, str] | None = None,
+    ) -> ObjectProperties:
         """Create an object in the storage.
 
         Args:
             path (str): The path of the object.
             data (bytes): The data to be stored in the object.
             overwrite (bool, optional): Whether to overwrite the object if it already exists. Defaults to False.
+            if_match (str | None, optional): Only replace the object if its current etag matches. Defaults to None.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object, keys being
+                identifiers and values ASCII strings. Defaults to None.
+
+        Returns:
+            ObjectProperties: The properties of the created object.
+
+        """
+
+        pass
+
+    async def create_object_stream(
+        self,
+        path: str,
+        chunks: AsyncIterator[bytes],
+        overwrite: bool = False,
+        metadata: dict[str, str] | None = None,
+    ) -> int:
+        """Create an object in the storage from an asynchronous stream of chunks.
+
+        Only one chunk is held in memory at a time, the object becomes visible once the whole stream is stored.
+
+        Args:
+            path (str): The path of the object.
+            chunks (AsyncIterator[bytes]): The chunks to be stored in the object, in order.
+            overwrite (bool, optional): Whether to overwrite the object if it already exists. Defaults to False.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object. It is only read
+                once the stream is exhausted, so the stream may complete it. Defaults to None.
+
+        Returns:
+            int: The number of bytes stored.
+
+        """
+
+        pass
+
+    async def stage_block(self, path: str, block_id: str, data: bytes) -> None:
+        """Stage a block of an object, to be committed later along with the object's other blocks.
+
+        Staged blocks are not visible as part of the object until they are committed. Staging a block with the id of
+        an already staged block replaces it.
+
+        Args:
+            path (str): The path of the object.
+            block_id (str): The id of the block. Every block of an object must have an id of the same length.
+            data (bytes): The content of the block.
+
+        """
+
+        pass
+
+    async def list_staged_blocks(self, path: str) -> dict[str, int]:
+        """List the blocks of an object that were staged but not committed yet.
+
+        Args:
+            path (str): The path of the object.
+
+        Returns:
+            dict[str, int]: The size of every staged block, by block id.
+
+        """
+
+        pass
+
+    async def commit_blocks(
+        self,
+        path: str,
+        block_ids: list[str],
+        overwrite: bool = False,
+        metadata: dict[str, str] | None = None,
+    ) -> ObjectProperties:
+        """Create an object from staged blocks, concatenated in the given order.
+
+        Every other staged block of the object is discarded.
+
+        Args:
+            path (str): The path of the object.
+            block_ids (list[str]): The ids of the staged blocks making up the object, in order.
+            overwrite (bool, optional): Whether to overwrite the object if it already exists. Defaults to False.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object. Defaults to None.
 
         Returns:
-            bool: True if the object was created successfully, False otherwise.
+            ObjectProperties: The properties of the created object.
 
         """
 
         pass
 
-    async def delete_object(self, path: str) -> bool:
+    async def discard_blocks(self, path: str, block_ids: list[str]) -> None:
+        """Discard staged blocks of an object that will never be committed.
+
+        Args:
+            path (str): The path of the object.
+            block_ids (list[str]): The ids of the staged blocks to discard. Ids of blocks that are not staged are
+                skipped.
+
+        """
+
+        pass
+
+    async def delete_object(self, path: str, if_match: str | None = None) -> bool:
         """Delete an object from the storage.
 
         Args:
             path (str): The path of the object.
+            if_match (str | None, optional): Only delete the object if its current etag matches. Defaults to None.
 
         Returns:
             bool: True if the object was deleted successfully, False otherwise.
 
+        Raises:
+            ResourceModifiedError: If if_match is set and does not match the current etag of the object.
+
+        """
+
+        pass
+
+    async def delete_objects(self, paths: list[str]) -> int:
+        """Delete several objects from the storage at once. Objects that don't exist are skipped.
+
+        Args:
+            paths (list[str]): The paths of the objects.
+
+        Returns:
+            int: The number of objects that no longer exist.
+
         """
 
         pass
@@ -55,4 +219,49 @@ class ObjectStorageProtocol(Protocol):
 
         """
 
-        pass
\ No newline at end of file
+        pass
+
+    def list_object_properties(self, prefix: str) -> AsyncIterator[ObjectProperties]:
+        """Iterate over the properties of the objects whose paths start with the given prefix.
+
+        Implementations are async generators, so the iteration starts without awaiting the call.
+
+        Args:
+            prefix (str): The prefix to filter the object paths.
+
+        Yields:
+            ObjectProperties: The properties of the matching objects.
+
+        """
+
+        pass
+
+    async def list_objects_page(self, prefix: str, limit: int, cursor: str | None = None) -> ObjectPage:
+        """List a single page of the objects whose paths start with the given prefix.
+
+        Args:
+            prefix (str): The prefix to filter the object paths.
+            limit (int): The maximum number of objects on the page.
+            cursor (str | None, optional): The continuation token returned with the previous page. Defaults to None,
+                which lists the first page.
+
+        Returns:
+            ObjectPage: The properties of the objects on the page and the continuation token of the next page.
+
+        """
+
+        pass
+
+    async def list_prefixes(self, prefix: str = "", delimiter: str = "/") -> list[str]:
+        """List the distinct path segments directly under the given prefix, like directories in a file system.
+
+        Args:
+            prefix (str, optional): The prefix to list segments under. Defaults to the root of the storage.
+            delimiter (str, optional): The path segment delimiter. Defaults to "/".
+
+        Returns:
+            list[str]: The matching prefixes, each ending with the delimiter.
+
+        """
+
+        pass
@@ -0,0 +1,12 @@
+def is_valid_path(path: str) -> bool:
+    """
+    Tells whether an object path is relative and made of proper segments only, so it names the same object on every
+    backend and cannot resolve outside of its prefix.
+
+    Args:
+        path (str): The object path, "/" separating its segments.
+
+    Returns:
+        bool: False if the path is empty, starts with "/", or has an empty, "." or ".." segment, True otherwise.
+    """
+    return all(segment not in ("", ".", "..") for segment in path.split("/"))
@@ -0,0 +1,594 @@
+from .exceptions import StorageTimeoutError, StorageUnavailableError
+from .object_storage import ObjectStorageProtocol
+from .models import ObjectPage, ObjectProperties, ObjectStream
+from azure.core.exceptions import (
+    HttpResponseError,
+    ResourceNotFoundError,
+    ServiceRequestError,
+    ServiceResponseError,
+)
+from collections import deque
+from pydantic import BaseModel, Field
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, TypeVar
+import asyncio
+import random
+
+_T = TypeVar("_T")
+
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+# Statuses of requests the storage turned away without processing them.
+REJECTED_STATUS_CODES = frozenset({429, 503})
+
+
+class ResiliencePolicy(BaseModel):
+    """
+    Represents how the operations of an object storage are bounded in time, retried and hedged.
+
+    Attributes:
+        deadline (float): The number of seconds an operation may take, retries included.
+        deadlines (dict[str, float]): The deadlines of single operations, by operation name, e.g.
+            {"create_object": 120}, overriding the default deadline.
+        max_attempts (int): The maximum number of attempts of an operation.
+        backoff_base (float): The upper bound in seconds of the random delay before the first retry, doubled for every
+            further retry.
+        backoff_max (float): The upper bound in seconds of the random delay before any retry.
+        hedge_percentile (float | None): The percentile of the latency of a read, e.g. 95, after which a duplicate of
+            the read is sent if it did not finish yet. Defaults to None, which disables hedging.
+        hedge_min_samples (int): The number of latencies of a read recorded before it is hedged.
+        hedge_window (int): The number of most recent latencies of a read the percentile is computed over.
+    """
+    deadline: float = Field(default=30.0, gt=0)
+    deadlines: dict[str, float] = {}
+    max_attempts: int = Field(default=4, ge=1)
+    backoff_base: float = Field(default=0.1, gt=0)
+    backoff_max: float = Field(default=5.0, gt=0)
+    hedge_percentile: float | None = Field(default=None, gt=0, lt=100)
+    hedge_min_samples: int = Field(default=100, ge=1)
+    hedge_window: int = Field(default=1000, ge=1)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Tells whether an error of the object storage may go away on its own, so the operation is worth retrying.
+
+    Args:
+        error (BaseException): The error an operation raised.
+
+    Returns:
+        bool: True for connection failures, timeouts, throttling and server errors, False otherwise, e.g. for missing
+            objects and failed conditions.
+    """
+    if isinstance(error, (ServiceRequestError, ServiceResponseError, ConnectionError, TimeoutError)):
+        return True
+    return isinstance(error, HttpResponseError) and error.status_code in RETRYABLE_STATUS_CODES
+
+
+def is_ambiguous(error: BaseException) -> bool:
+    """
+    Tells whether a retryable error leaves it unknown if the storage applied the operation, e.g. because the
+    connection was lost after the request was sent.
+
+    Args:
+        error (BaseException): The error an operation raised.
+
+    Returns:
+        bool: False for requests that were never sent or were rejected before being processed, True for every other
+            retryable error.
+    """
+    if isinstance(error, ServiceRequestError):
+        return False
+    if isinstance(error, HttpResponseError) and error.status_code in REJECTED_STATUS_CODES:
+        return False
+    return is_retryable(error)
+
+
+class ResilientObjectStorage:
+    """
+    Bounds the operations of another object storage in time, retries them and hedges slow reads.
+
+    Every operation has to finish within its deadline, retries included, or raises a StorageTimeoutError. Operations
+    failing with a retryable error are retried after a random delay growing exponentially with every attempt, as long
+    as the delay fits in the deadline. Operations that keep failing raise a StorageUnavailableError, with the last
+    error as its cause. Errors that are not retryable, such as missing objects or failed conditions, are raised
+    unchanged on the first attempt.
+
+    Conditional writes, i.e. creations that must not overwrite, replacements conditioned on an etag and commits of
+    staged blocks, would fail their condition if they were retried after an attempt that was applied but whose
+    response was lost. After such an ambiguous failure they are only retried once the state of the object shows the
+    attempt had no effect, and raise a StorageUnavailableError otherwise. Deletions retried after an ambiguous failure
+    count a missing object as deleted.
+
+    Streamed uploads consume their chunks, so they are never retried and have no deadline. Downloads are bounded and
+    retried until the stream is opened, while streaming their content only turns retryable errors into
+    StorageUnavailableError. Listings of object properties are retried until their first object is yielded.
+
+    If hedging is enabled, a read that takes longer than the configured percentile of the recent latencies of that
+    operation is sent a second time, the first response is used and the other request is cancelled.
+
+    Args:
+        storage (ObjectStorageProtocol): The object storage to call.
+        policy (ResiliencePolicy | None, optional): The deadlines, retries and hedging of the operations. Defaults to
+            the default policy.
+        seed (int | None, optional): The seed of the random retry delays, for reproducible runs. Defaults to None.
+    """
+
+    def __init__(self, storage: ObjectStorageProtocol, policy: ResiliencePolicy | None = None, seed: int | None = None):
+        self.storage = storage
+        self.policy = policy or ResiliencePolicy()
+        self._random = random.Random(seed)
+        self._latencies: dict[str, deque[float]] = {}
+
+    async def context(self) -> AsyncGenerator[None, None]:
+        """
+        Runs the context of the underlying storage.
+        """
+        async for _ in self.storage.context():
+            yield
+
+    async def _call(
+        self,
+        operation: str,
+        call: Callable[[], Awaitable[_T]],
+        retry: bool = True,
+        hedge: bool = False,
+        bounded: bool = True,
+        unapplied: Callable[[], Awaitable[bool]] | None = None,
+    ) -> _T:
+        """
+        Calls an operation of the underlying storage within its deadline, retrying and hedging it if allowed.
+
+        Args:
+            operation (str): The name of the operation.
+            call (Callable[[], Awaitable[_T]]): Sends the operation once.
+            retry (bool, optional): Whether the operation may be retried. Defaults to True.
+            hedge (bool, optional): Whether the operation may be sent twice at once. Defaults to False.
+            bounded (bool, optional): Whether the operation is bounded by its deadline. Defaults to True.
+            unapplied (Callable[[], Awaitable[bool]] | None, optional): Tells whether an attempt that failed
+                ambiguously surely had no effect, for operations that must not be applied twice. Such attempts are
+                only retried if it returns True. Defaults to None, for operations that may be applied twice.
+
+        Returns:
+            _T: The result of the first successful attempt.
+
+        Raises:
+            StorageTimeoutError: If the deadline passed.
+            StorageUnavailableError: If every attempt failed with a retryable error, or an attempt failed ambiguously
+                and may have been applied.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.policy.deadlines.get(operation, self.policy.deadline) if bounded else None
+        attempts = self.policy.max_attempts if retry else 1
+        attempt = 0
+        while True:
+            attempt += 1
+            timeout = asyncio.timeout_at(deadline)
+            try:
+                async with timeout:
+                    if hedge and self.policy.hedge_percentile is not None:
+                        return await self._hedged(operation, call)
+                    return await call()
+            except Exception as e:
+                if timeout.expired():
+                    raise StorageTimeoutError(operation, attempt) from e
+                if not is_retryable(e):
+                    raise
+                delay = self._backoff(attempt)
+                if attempt == attempts or (deadline is not None and loop.time() + delay >= deadline):
+                    raise StorageUnavailableError(operation, attempt) from e
+                if unapplied is not None and is_ambiguous(e) and not await self._unapplied(unapplied, deadline):
+                    raise StorageUnavailableError(operation, attempt) from e
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    async def _unapplied(unapplied: Callable[[], Awaitable[bool]], deadline: float | None) -> bool:
+        """
+        Checks whether an attempt that failed ambiguously surely had no effect, within the deadline of the operation.
+
+        Args:
+            unapplied (Callable[[], Awaitable[bool]]): Checks the state of the object.
+            deadline (float | None): The deadline of the operation, in loop time.
+
+        Returns:
+            bool: True if the attempt had no effect, False if it may have been applied or the check failed.
+        """
+        try:
+            async with asyncio.timeout_at(deadline):
+                return await unapplied()
+        except Exception:
+            return False
+
+    def _backoff(self, attempt: int) -> float:
+        """
+        Draws the delay before the next attempt of an operation, uniformly up to an exponentially growing bound.
+
+        Args:
+            attempt (int): The number of the attempt that failed, starting at 1.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        return self._random.uniform(0, min(self.policy.backoff_max, self.policy.backoff_base * 2 ** (attempt - 1)))
+
+    def _hedge_delay(self, operation: str) -> float | None:
+        """
+        Computes the time after which a read is sent a second time, from the recent latencies of the operation.
+
+        Args:
+            operation (str): The name of the operation.
+
+        Returns:
+            float | None: The delay in seconds, or None if too few latencies were recorded.
+        """
+        latencies = self._latencies.get(operation)
+        percentile = self.policy.hedge_percentile
+        if percentile is None or latencies is None or len(latencies) < self.policy.hedge_min_samples:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(int(len(ordered) * percentile / 100), len(ordered) - 1)]
+
+    async def _hedged(self, operation: str, call: Callable[[], Awaitable[_T]]) -> _T:
+        """
+        Sends a read, and a duplicate of it if it did not finish within the hedging delay, recording its latency.
+
+        Args:
+            operation (str): The name of the operation.
+            call (Callable[[], Awaitable[_T]]): Sends the read once.
+
+        Returns:
+            _T: The first successful response.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        delay = self._hedge_delay(operation)
+        pending = {asyncio.ensure_future(call())}
+        errors: list[BaseException] = []
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                pending.add(asyncio.ensure_future(call()))
+            while True:
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        for other in done - {task}:
+                            if other.exception() is None:
+                                await self._discard(other.result())
+                        latencies = self._latencies.setdefault(operation, deque(maxlen=self.policy.hedge_window))
+                        latencies.append(loop.time() - started)
+                        return task.result()
+                    errors.append(error)
+                if not pending:
+                    raise errors[0]
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _etag_unchanged(self, path: str, etag: str) -> Callable[[], Awaitable[bool]]:
+        async def check() -> bool:
+            return (await self.storage.get_object_properties(path)).etag == etag
+
+        return check
+
+    def _missing(self, path: str) -> Callable[[], Awaitable[bool]]:
+        async def check() -> bool:
+            try:
+                await self.storage.get_object_properties(path)
+            except ResourceNotFoundError:
+                return True
+            return False
+
+        return check
+
+    def _staged(self, path: str, block_ids: list[str]) -> Callable[[], Awaitable[bool]]:
+        # Committing discards every staged block, so blocks that are still staged were not committed.
+        async def check() -> bool:
+            return bool(block_ids) and set(block_ids) <= (await self.storage.list_staged_blocks(path)).keys()
+
+        return check
+
+    @staticmethod
+    async def _discard(result: Any) -> None:
+        """
+        Closes the download a losing read opened, if any.
+
+        Args:
+            result (Any): The result of the read.
+        """
+        close = getattr(getattr(result, "chunks", None), "aclose", None)
+        if close is not None:
+            await close()
+
+    @staticmethod
+    async def _translated(operation: str, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """
+        Streams the content of a download, turning retryable errors into StorageUnavailableError.
+
+        Args:
+            operation (str): The name of the operation that opened the download.
+            chunks (AsyncIterator[bytes]): The content of the download.
+
+        Yields:
+            bytes: The chunks of the download, in order.
+        """
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            if is_retryable(e):
+                raise StorageUnavailableError(operation, 1) from e
+            raise
+
+    async def get_object(self, path: str) -> Any:
+        """
+        Retrieves an object.
+
+        Args:
+            path (str): The path of the object to retrieve.
+
+        Returns:
+            Any: The object, as returned by the underlying storage.
+        """
+        return await self._call("get_object", lambda: self.storage.get_object(path), hedge=True)
+
+    async def get_object_stream(
+        self, path: str, offset: int | None = None, length: int | None = None, if_none_match: str | None = None
+    ) -> ObjectStream:
+        """
+        Opens a streaming download of an object, or of a byte range of it.
+
+        Args:
+            path (str): The path of the object to retrieve.
+            offset (int | None, optional): The offset of the first byte to download. Defaults to the start of the
+                object.
+            length (int | None, optional): The number of bytes to download. Defaults to the rest of the object.
+            if_none_match (str | None, optional): If set, only downloads the object if its current etag differs.
+                Defaults to None.
+
+        Returns:
+            ObjectStream: The open download, yielding the content chunk by chunk.
+        """
+        stream = await self._call(
+            "get_object_stream",
+            lambda: self.storage.get_object_stream(path, offset, length, if_none_match),
+            hedge=True,
+        )
+        update = {"chunks": self._translated("get_object_stream", stream.chunks)}
+        if stream.encoded_chunks is not None:
+            update["encoded_chunks"] = self._translated("get_object_stream", stream.encoded_chunks)
+        return stream.model_copy(update=update)
+
+    async def get_object_properties(self, path: str) -> ObjectProperties:
+        """
+        Retrieves the properties of an object.
+
+        Args:
+            path (str): The path of the object.
+
+        Returns:
+            ObjectProperties: The properties of the object.
+        """
+        return await self._call("get_object_properties", lambda: self.storage.get_object_properties(path), hedge=True)
+
+    async def create_object(
+        self,
+        path: str,
+        data: bytes,
+        overwrite: bool = False,
+        if_match: str | None = None,
+        metadata: dict[str, str] | None = None,
+    ) -> ObjectProperties:
+        """
+        Creates a new object.
+
+        Args:
+            path (str): The path of the object in the storage.
+            data (bytes): The content of the object.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            if_match (str | None, optional): If set, only replaces the object if its current etag matches.
+                Defaults to None.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object. Defaults to None.
+
+        Returns:
+            ObjectProperties: The properties of the created object.
+        """
+        unapplied = None
+        if if_match is not None:
+            unapplied = self._etag_unchanged(path, if_match)
+        elif not overwrite:
+            unapplied = self._missing(path)
+        return await self._call(
+            "create_object",
+            lambda: self.storage.create_object(path, data, overwrite, if_match, metadata),
+            unapplied=unapplied,
+        )
+
+    async def create_object_stream(
+        self,
+        path: str,
+        chunks: AsyncIterator[bytes],
+        overwrite: bool = False,
+        metadata: dict[str, str] | None = None,
+    ) -> int:
+        """
+        Creates a new object from a stream of chunks, without retrying it, as the chunks are consumed.
+
+        Args:
+            path (str): The path of the object in the storage.
+            chunks (AsyncIterator[bytes]): The chunks to be uploaded as the object content, in order.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object. Defaults to None.
+
+        Returns:
+            int: The number of bytes uploaded.
+        """
+        return await self._call(
+            "create_object_stream",
+            lambda: self.storage.create_object_stream(path, chunks, overwrite, metadata),
+            retry=False,
+            bounded=False,
+        )
+
+    async def stage_block(self, path: str, block_id: str, data: bytes) -> None:
+        """
+        Stages a block of an object.
+
+        Args:
+            path (str): The path of the object the block belongs to.
+            block_id (str): The id of the block.
+            data (bytes): The content of the block.
+        """
+        await self._call("stage_block", lambda: self.storage.stage_block(path, block_id, data))
+
+    async def list_staged_blocks(self, path: str) -> dict[str, int]:
+        """
+        Lists the blocks staged for an object and not committed yet.
+
+        Args:
+            path (str): The path of the object.
+
+        Returns:
+            dict[str, int]: The size of every staged block, by block id.
+        """
+        return await self._call("list_staged_blocks", lambda: self.storage.list_staged_blocks(path))
+
+    async def commit_blocks(
+        self, path: str, block_ids: list[str], overwrite: bool = False, metadata: dict[str, str] | None = None
+    ) -> ObjectProperties:
+        """
+        Creates an object from staged blocks.
+
+        Args:
+            path (str): The path of the object.
+            block_ids (list[str]): The ids of the staged blocks making up the object, in order.
+            overwrite (bool, optional): If set to True, overwrites the existing object with the same path.
+                Defaults to False.
+            metadata (dict[str, str] | None, optional): The metadata to store along with the object. Defaults to None.
+
+        Returns:
+            ObjectProperties: The properties of the created object.
+        """
+        return await self._call(
+            "commit_blocks",
+            lambda: self.storage.commit_blocks(path, block_ids, overwrite, metadata),
+            unapplied=self._staged(path, block_ids),
+        )
+
+    async def discard_blocks(self, path: str, block_ids: list[str]) -> None:
+        """
+        Discards blocks staged for an object.
+
+        Args:
+            path (str): The path of the object.
+            block_ids (list[str]): The ids of the blocks to discard.
+        """
+        await self._call("discard_blocks", lambda: self.storage.discard_blocks(path, block_ids))
+
+    async def delete_object(self, path: str, if_match: str | None = None) -> bool:
+        """
+        Deletes an object.
+
+        Args:
+            path (str): The path of the object to delete.
+            if_match (str | None, optional): If set, only deletes the object if its current etag matches.
+                Defaults to None.
+
+        Returns:
+            bool: True if the object was deleted.
+        """
+        ambiguous = False
+
+        async def delete() -> bool:
+            nonlocal ambiguous
+            try:
+                return await self.storage.delete_object(path, if_match)
+            except ResourceNotFoundError:
+                if ambiguous:
+                    return True
+                raise
+            except Exception as e:
+                ambiguous = ambiguous or is_ambiguous(e)
+                raise
+
+        return await self._call("delete_object", delete)
+
+    async def delete_objects(self, paths: list[str]) -> int:
+        """
+        Deletes several objects at once.
+
+        Args:
+            paths (list[str]): The paths of the objects to delete.
+
+        Returns:
+            int: The number of objects deleted.
+        """
+        return await self._call("delete_objects", lambda: self.storage.delete_objects(paths))
+
+    async def list_objects(self, path: str) -> list[str]:
+        """
+        Lists the paths of the objects whose paths start with the specified prefix.
+
+        Args:
+            path (str): The prefix to filter the object paths.
+
+        Returns:
+            list[str]: The matching object paths.
+        """
+        return await self._call("list_objects", lambda: self.storage.list_objects(path))
+
+    async def list_object_properties(self, prefix: str) -> AsyncIterator[ObjectProperties]:
+        """
+        Iterates over the properties of the objects whose paths start with the specified prefix, retrying the listing
+        until its first object is yielded.
+
+        Args:
+            prefix (str): The prefix to filter the object paths.
+
+        Yields:
+            ObjectProperties: The properties of every matching object.
+        """
+        for attempt in range(1, self.policy.max_attempts + 1):
+            yielded = False
+            try:
+                async for properties in self.storage.list_object_properties(prefix):
+                    yielded = True
+                    yield properties
+                return
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                if yielded or attempt == self.policy.max_attempts:
+                    raise StorageUnavailableError("list_object_properties", attempt) from e
+            await asyncio.sleep(self._backoff(attempt))
+
+    async def list_objects_page(self, prefix: str, limit: int, cursor: str | None = None) -> ObjectPage:
+        """
+        Lists a single page of the objects whose paths start with the specified prefix.
+
+        Args:
+            prefix (str): The prefix to filter the object paths.
+            limit (int): The maximum number of objects on the page.
+            cursor (str | None, optional): The continuation token returned with the previous page. Defaults to None,
+                which lists the first page.
+
+        Returns:
+            ObjectPage: The properties of the objects on the page and the continuation token of the next page.
+        """
+        return await self._call(
+            "list_objects_page", lambda: self.storage.list_objects_page(prefix, limit, cursor), hedge=True
+        )
+
+    async def list_prefixes(self, prefix: str = "", delimiter: str = "/") -> list[str]:
+        """
+        Lists the distinct path segments directly under the specified prefix.
+
+        Args:
+            prefix (str, optional): The prefix to list segments under. Defaults to the root of the storage.
+            delimiter (str, optional): The path segment delimiter. Defaults to "/".
+
+        Returns:
+            list[str]: The matching prefixes, each ending with the delimiter.
+        """
+        return await self._call("list_prefixes", lambda: self.storage.list_prefixes(prefix, delimiter))
@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+
+
+class ContentReference(BaseModel):
+    """
+    Represents a piece of content stored once and shared by every file with the same digest.
+
+    Attributes:
+        digest (str): The SHA-256 digest of the content, in hexadecimal.
+        object (str): The path of the object holding the content.
+        size (int): The size of the content in bytes.
+        count (int): The number of files referencing the content.
+    """
+    digest: str
+    object: str
+    size: int
+    count: int = 1
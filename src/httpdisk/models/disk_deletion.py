@@ -0,0 +1,36 @@
+from pydantic import BaseModel
+from enum import Enum
+import datetime
+
+
+class DiskDeletionState(str, Enum):
+    """
+    The state of a disk deletion job.
+    """
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class DiskDeletionStatus(BaseModel):
+    """
+    Represents the progress of a disk deletion job.
+
+    Attributes:
+        user_id (str): The ID of the user whose disk is being deleted.
+        state (DiskDeletionState): The state of the job.
+        deleted (int): The number of objects deleted so far.
+        started (datetime.datetime): The time the deletion was requested.
+        finished (datetime.datetime | None): The time the job completed or failed.
+        error (str | None): The reason the job failed.
+        leased_until (datetime.datetime | None): The time until which the process running the job holds it, so no
+            other process resumes it meanwhile.
+    """
+    user_id: str
+    state: DiskDeletionState = DiskDeletionState.PENDING
+    deleted: int = 0
+    started: datetime.datetime
+    finished: datetime.datetime | None = None
+    error: str | None = None
+    leased_until: datetime.datetime | None = None
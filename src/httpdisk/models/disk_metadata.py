@@ -1,11 +1,21 @@
 from pydantic import BaseModel
+import datetime
+import os
+
+DEFAULT_TOTAL_SPACE = int(os.getenv("DISK_TOTAL_SPACE", 10 * 1024 * 1024 * 1024))
 
 class DiskMetadata(BaseModel):
     """
     Represents the metadata of a disk.
 
     Attributes:
+        user_email (str | None): The email of the disk's owner.
         total_space (int): The total space of the disk in bytes.
+        used_space (int): The space taken up by the files on the disk in bytes, kept up to date on every write.
+        pending (dict[str, datetime.datetime]): The writes and deletes of files that started but did not update
+            used_space yet, by operation ID, with the time they started.
     """
-    total_space: int
-    
\ No newline at end of file
+    user_email: str | None = None
+    total_space: int = DEFAULT_TOTAL_SPACE
+    used_space: int = 0
+    pending: dict[str, datetime.datetime] = {}
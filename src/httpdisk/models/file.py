@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from fastapi import File, UploadFile
+from enum import Enum
 
 class UploadFileForm(BaseModel):
     """
@@ -10,4 +11,27 @@ class UploadFileForm(BaseModel):
         file_name (str): The name of the file.
     """
     file: UploadFile = File(...)
-    file_name: str
\ No newline at end of file
+    file_name: str
+
+class UploadStatus(str, Enum):
+    """
+    The outcome of uploading a single file.
+    """
+    SUCCESS = "success"
+    CONFLICT = "conflict"
+    QUOTA_EXCEEDED = "quota_exceeded"
+    UNAVAILABLE = "unavailable"
+    INVALID_NAME = "invalid_name"
+    ERROR = "error"
+
+
+class UploadResult(BaseModel):
+    """
+    Represents the result of uploading a single file.
+
+    Attributes:
+        filename (str): The name the file was uploaded under.
+        status (UploadStatus): The outcome of the upload.
+    """
+    filename: str
+    status: UploadStatus
@@ -0,0 +1,70 @@
+from pydantic import BaseModel, computed_field
+import datetime
+
+
+class UploadSession(BaseModel):
+    """
+    Represents a resumable upload of a single file, sent as numbered chunks of a fixed size.
+
+    Attributes:
+        id (str): The ID of the session.
+        user_id (str): The ID of the user uploading the file.
+        filename (str): The name the file is stored under once the session is committed.
+        size (int): The size of the whole file in bytes.
+        chunk_size (int): The size of every chunk but the last one in bytes.
+        created (datetime.datetime): The time the session was created.
+        expires (datetime.datetime): The time after which the session and its chunks are discarded.
+        chunk_count (int): The number of chunks the file is sent in.
+    """
+    id: str
+    user_id: str
+    filename: str
+    size: int
+    chunk_size: int
+    created: datetime.datetime
+    expires: datetime.datetime
+
+    @computed_field  # type: ignore[misc]
+    @property
+    def chunk_count(self) -> int:
+        return -(-self.size // self.chunk_size)
+
+    def chunk_length(self, index: int) -> int:
+        """
+        Returns the size of a chunk.
+
+        Args:
+            index (int): The number of the chunk, starting from 0.
+
+        Returns:
+            int: The size of the chunk in bytes.
+        """
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+
+class UploadSessionStatus(BaseModel):
+    """
+    Represents the progress of a resumable upload.
+
+    Attributes:
+        session (UploadSession): The upload session.
+        received (list[int]): The numbers of the chunks that were received, in ascending order.
+        missing (list[int]): The numbers of the chunks that are still to be sent, in ascending order.
+    """
+    session: UploadSession
+    received: list[int]
+    missing: list[int]
+
+
+class UploadSessionRequest(BaseModel):
+    """
+    Represents a request to start a resumable upload.
+
+    Attributes:
+        filename (str): The name to store the file under.
+        size (int): The size of the whole file in bytes.
+        chunk_size (int | None): The size of every chunk but the last one in bytes, or None for the default.
+    """
+    filename: str
+    size: int
+    chunk_size: int | None = None
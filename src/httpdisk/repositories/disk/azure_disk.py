@@ -1,18 +1,96 @@
-from ...libraries.object_storage.azure_blob_storage import AzureBlobStorage
+from ...libraries.object_storage.object_storage import ObjectStorageProtocol
 import logging
-from azure.core.exceptions import ResourceExistsError
+from azure.core.exceptions import (
+    HttpResponseError,
+    ResourceExistsError,
+    ResourceModifiedError,
+    ResourceNotFoundError,
+    ResourceNotModifiedError,
+)
 from .consts import MANGLED
+from .content_store import ContentStore
+from .exceptions import QuotaExceededError
+from ...libraries.object_storage.exceptions import StorageUnavailableError
 from ...models.disk_metadata import DiskMetadata
+from ...libraries.object_storage.models import ObjectPage, ObjectProperties, ObjectStream
+from ...libraries.cache.ttl_cache import TTLCache
+import asyncio
+import base64
 import datetime
+import json
+import os
+import random
+import time
+import uuid
+from typing import AsyncIterator, Awaitable, Callable
 
 logger = logging.getLogger(__name__)
 
+PENDING_OPERATION_TIMEOUT = float(os.getenv("DISK_PENDING_OPERATION_TIMEOUT", 6 * 60 * 60))
+
 
 class AzureDiskRepository:
+    """
+    Manages the objects stored on Azure disks.
+
+    Every write and delete of a disk's object updates the used space counter kept in the disk's metadata, and writes
+    that would exceed the disk's total space are rejected before they reach the storage. Writes and deletes are
+    recorded as pending in the metadata before they reach the storage, until they update the counter, so the counter
+    is only recounted while no write or delete is in flight.
+
+    Listing pages are cached, keyed by disk, page size and cursor, and every page of a disk is invalidated by the
+    writes and deletes going through this repository.
+
+    Parsed disk metadata is cached along with its etag and the time it was last known to be current. Within the
+    freshness window it is used as is, afterwards it is revalidated with a conditional download, and every metadata
+    write updates it. Metadata writes are conditional on the etag, so a stale entry only costs a retry. Concurrent
+    updates of the metadata of a disk are applied together, in a single write, and writes that lose the race against
+    another process are retried after a random, growing delay. If the metadata keeps being modified concurrently, a
+    StorageUnavailableError is raised. A write or delete that was done but could not end its pending operation keeps
+    trying to end it in the background, rather than failing.
+
+    In deduplicating mode, streamed objects are written to the content store and the disk only keeps a reference
+    to their content. References are resolved on every read, whether or not the mode is enabled, and disks are
+    charged the full size of the objects they reference.
+
+    Missing objects are reported through the return values, while a StorageUnavailableError of the storage is raised
+    as is, so callers can tell an outage from an object that does not exist.
+
+    Args:
+        storage (ObjectStorageProtocol): The object storage the disks are stored in.
+        listing_cache (TTLCache[tuple[str, int, str | None], ObjectPage] | None, optional): The cache of disk listing
+            pages, shared with the disk manager. Defaults to a cache private to this repository.
+        metadata_cache (TTLCache[str, tuple[DiskMetadata, str | None, float]] | None, optional): The cache of disk
+            metadata with its etag and validation time, by disk name, shared with the disk manager. Defaults to a
+            cache private to this repository.
+        metadata_freshness (float, optional): The number of seconds cached metadata is used without revalidation.
+            Defaults to 5.
+        deduplicate (bool, optional): Whether streamed objects are stored once per distinct content. Defaults to False.
+    """
+
     _metadata = f"{MANGLED}METADATA.json"
+    _metadata_update_attempts = 10
+    _metadata_backoff_base = 0.01
+    _metadata_backoff_max = 1.0
+    _listing_page_size = 5000
 
-    def __init__(self, storage: AzureBlobStorage):
+    def __init__(
+        self,
+        storage: ObjectStorageProtocol,
+        listing_cache: TTLCache[tuple[str, int, str | None], ObjectPage] | None = None,
+        metadata_cache: TTLCache[str, tuple[DiskMetadata, str | None, float]] | None = None,
+        metadata_freshness: float = 5,
+        deduplicate: bool = False,
+    ):
         self.storage = storage
+        self.listing_cache = listing_cache if listing_cache is not None else TTLCache("disk_listing", 1024, 30)
+        self.metadata_cache = metadata_cache if metadata_cache is not None else TTLCache("disk_metadata", 4096, 300)
+        self.metadata_freshness = metadata_freshness
+        self.deduplicate = deduplicate
+        self.contents = ContentStore(storage)
+        self._metadata_updates: dict[str, list[tuple[Callable[[DiskMetadata], None], asyncio.Future[None]]]]
+        self._metadata_updates = {}
+        self._background: set[asyncio.Task[None]] = set()
 
     async def get_object(self, path: str) -> bytes | None:
         """
@@ -22,13 +100,74 @@ class AzureDiskRepository:
             path (str): The path of the object to retrieve.
 
         Returns:
-            bytes | None: The content of the object as bytes, or None if the object does not exist or an error occurs.
+            bytes | None: The content of the object as bytes, or None if the object does not exist.
+
+        Raises:
+            StorageUnavailableError: If the storage could not be reached.
         """
+        stream = await self.get_object_stream(path)
+        if stream is None:
+            return None
+        return b"".join([chunk async for chunk in stream.chunks])
+
+    async def get_object_stream(
+        self, path: str, offset: int | None = None, length: int | None = None
+    ) -> ObjectStream | None:
+        """
+        Opens a streaming download of the object at the specified path, or of a byte range of it.
+
+        Args:
+            path (str): The path of the object to retrieve.
+            offset (int | None, optional): The offset of the first byte to download. Defaults to the start of
+                the object.
+            length (int | None, optional): The number of bytes to download. Defaults to the rest of the object.
+
+        Returns:
+            ObjectStream | None: The open download, or None if the object does not exist.
+
+        Raises:
+            StorageUnavailableError: If the storage could not be reached.
+        """
+        ranged = bool(offset) or length is not None
         try:
-            data = await self.storage.get_object(path)
-        except Exception as e:
+            if self.deduplicate and ranged:
+                properties = await self.storage.get_object_properties(path)
+                if ContentStore.digest(properties) is not None:
+                    return await self.contents.open(properties, offset, length)
+            try:
+                stream = await self.storage.get_object_stream(path, offset, length)
+            except HttpResponseError as e:
+                # References are stored as empty objects, so the storage cannot serve a range of them itself. This is
+                # how references left by a previous deduplicating mode are found when ranges are not checked first.
+                if not ranged or e.status_code != 416:
+                    raise
+                properties = await self.storage.get_object_properties(path)
+                if ContentStore.digest(properties) is None:
+                    raise
+                return await self.contents.open(properties, offset, length)
+            if ContentStore.digest(stream.properties) is not None:
+                return await self.contents.open(stream.properties, offset, length)
+            return stream
+        except ResourceNotFoundError:
+            return None
+
+    async def get_object_properties(self, path: str) -> ObjectProperties | None:
+        """
+        Retrieves the properties of the object at the specified path without downloading its content.
+
+        Args:
+            path (str): The path of the object.
+
+        Returns:
+            ObjectProperties | None: The properties of the object, or None if the object does not exist.
+
+        Raises:
+            StorageUnavailableError: If the storage could not be reached.
+        """
+        try:
+            return ContentStore.resolve(await self.storage.get_object_properties(path))
+        except ResourceNotFoundError:
             return None
-        return await data.readall()
 
     async def create_object(self, path: str, data: bytes, overwrite: bool = False) -> bool:
         """
@@ -41,15 +180,119 @@ class AzureDiskRepository:
 
         Returns:
             bool: True if the object was created successfully, False otherwise.
+
+        Raises:
+            StorageUnavailableError: If the storage could not be reached.
         """
-        try:
+
+        async def write(limit: int | None) -> int:
+            if limit is not None and len(data) > limit:
+                raise QuotaExceededError(path)
             await self.storage.create_object(path, data, overwrite)
+            return len(data)
+
+        try:
+            await self._accounted_write(path, overwrite, len(data), write)
         except ResourceExistsError as ree:
             return False
+        except StorageUnavailableError:
+            raise
         except Exception as e:
             logger.critical({"time": datetime.datetime.now(), "message": "Failed to create an object", "exception": e})
 
             return False
+        self._invalidate_listing(path)
+        return True
+
+    async def create_object_stream(
+        self,
+        path: str,
+        chunks: AsyncIterator[bytes],
+        overwrite: bool = False,
+        size: int | None = None,
+        digest: str | None = None,
+    ) -> bool:
+        """
+        Creates an object at the specified path in the Azure disk storage from a stream of chunks.
+
+        In deduplicating mode, content that is already stored is only referenced and the chunks are not read.
+
+        Args:
+            path (str): The path where the object should be created.
+            chunks (AsyncIterator[bytes]): The chunks to be stored in the object, in order.
+            overwrite (bool, optional): Whether to overwrite the object if it already exists. Defaults to False.
+            size (int | None, optional): The expected size of the object, used to check the disk's quota before
+                anything is written. Defaults to None, in which case the quota is checked while streaming.
+            digest (str | None, optional): The SHA-256 digest of the content in hexadecimal, if known up front, which
+                lets already stored content be referenced without uploading it. Defaults to None.
+
+        Returns:
+            bool: True if the object was created successfully, False otherwise.
+
+        Raises:
+            FileExistsError: If the object already exists and overwrite is False.
+            QuotaExceededError: If the object does not fit in the space left on the disk.
+            StorageUnavailableError: If the storage could not be reached.
+        """
+
+        async def write(limit: int | None) -> int:
+            limited = chunks if limit is None else self._limit_chunks(path, chunks, limit)
+            if self.deduplicate and self._is_accounted(path):
+                return await self._write_reference(path, limited, overwrite, limit, digest)
+            return await self.storage.create_object_stream(path, limited, overwrite)
+
+        try:
+            await self._accounted_write(path, overwrite, size, write)
+        except ResourceExistsError as ree:
+            raise FileExistsError(path) from ree
+        except (QuotaExceededError, StorageUnavailableError):
+            raise
+        except Exception as e:
+            logger.critical({"time": datetime.datetime.now(), "message": "Failed to create an object", "exception": e})
+
+            return False
+        self._invalidate_listing(path)
+        return True
+
+    async def commit_object_blocks(self, path: str, block_ids: list[str], size: int, overwrite: bool = False) -> bool:
+        """
+        Creates an object at the specified path from blocks staged in the object storage, reserving its size on the
+        disk before the blocks are committed.
+
+        Objects committed from staged blocks always hold their content themselves, even in deduplicating mode.
+
+        Args:
+            path (str): The path where the object should be created.
+            block_ids (list[str]): The ids of the staged blocks making up the object, in order.
+            size (int): The total size of the blocks.
+            overwrite (bool, optional): Whether to overwrite the object if it already exists. Defaults to False.
+
+        Returns:
+            bool: True if the object was created successfully, False otherwise.
+
+        Raises:
+            FileExistsError: If the object already exists and overwrite is False.
+            QuotaExceededError: If the object does not fit in the space left on the disk.
+            StorageUnavailableError: If the storage could not be reached.
+        """
+
+        async def write(limit: int | None) -> int:
+            if limit is not None and size > limit:
+                raise QuotaExceededError(path)
+            properties = await self.storage.commit_blocks(path, block_ids, overwrite)
+            return properties.size
+
+        try:
+            await self._accounted_write(path, overwrite, size, write)
+        except ResourceExistsError as ree:
+            raise FileExistsError(path) from ree
+        except (QuotaExceededError, StorageUnavailableError):
+            raise
+        except Exception as e:
+            logger.critical({"time": datetime.datetime.now(), "message": "Failed to commit an object", "exception": e})
+
+            return False
+        self._invalidate_listing(path)
         return True
 
     async def delete_object(self, path: str) -> bool:
@@ -61,9 +304,29 @@ class AzureDiskRepository:
 
         Returns:
             bool: True if the object is successfully deleted, False otherwise.
+
+        Raises:
+            StorageUnavailableError: If the storage could not be reached.
         """
         try:
-            return await self.storage.delete_object(path)
+            if not self._is_accounted(path):
+                return await self.storage.delete_object(path)
+            disk_name = self._disk_name(path)
+            properties = await self.storage.get_object_properties(path)
+            operation = await self._begin_operation(disk_name)
+            try:
+                deleted = await self.storage.delete_object(path)
+            except BaseException:
+                await self._end_operation(disk_name, operation, 0)
+                raise
+            self._invalidate_listing(path)
+            await self._end_operation(disk_name, operation, -ContentStore.resolve(properties).size)
+            await self._release(properties)
+            return deleted
+        except ResourceNotFoundError:
+            return False
+        except StorageUnavailableError:
+            raise
         except Exception as e:
             logger.critical({"time": datetime.datetime.now(), "message": "Failed to delete an object", "exception": e})
         return False
@@ -76,70 +339,555 @@ class AzureDiskRepository:
             path (str): The path to list objects from.
 
         Returns:
-            list[str]: A list of object names.
+            list[str]: A list of object names, relative to the path.
 
         Raises:
-            Exception: If there is an error listing objects.
+            StorageUnavailableError: If the storage could not be reached.
+        """
+        names: list[str] = []
+        cursor = None
+        while True:
+            page = await self.list_objects_page(path, self._listing_page_size, cursor)
+            names.extend(item.name for item in page.items)
+            if page.cursor is None:
+                return names
+            cursor = page.cursor
+
+    async def list_objects_page(self, path: str, limit: int, cursor: str | None = None) -> ObjectPage:
         """
-        blobs = []
+        Lists a single page of objects in the Azure disk storage container, answering from the listing cache when
+        possible.
+
+        Internal objects of the disk are left out, and further pages of the storage are listed until the page holds
+        limit objects or the listing ends, so pages are only short at the end of the listing. The continuation token
+        is opaque and points right after the last object on the page.
+
+        Args:
+            path (str): The path to list objects from.
+            limit (int): The maximum number of objects on the page.
+            cursor (str | None, optional): The continuation token returned with the previous page. Defaults to None,
+                which lists the first page.
+
+        Returns:
+            ObjectPage: The objects on the page, named relative to the path, and the continuation token of the next
+                page.
+
+        Raises:
+            ValueError: If the continuation token is not one returned by this repository.
+            StorageUnavailableError: If the storage could not be reached.
+        """
+        key = (path, limit, cursor)
+        cached = self.listing_cache.get(key)
+        if cached is not None:
+            return cached
+
+        storage_cursor, after = self._decode_cursor(cursor)
+        items: list[ObjectProperties] = []
+        next_cursor = None
+        while True:
+            page = await self.storage.list_objects_page(f"{path}/", limit, storage_cursor)
+            visible = [item for item in page.items if MANGLED not in item.name and (after is None or item.name > after)]
+            after = None
+            taken = visible[: limit - len(items)]
+            items.extend(taken)
+            if len(visible) > len(taken):
+                # The page of the storage is only partly listed, the next page lists it again after the last object.
+                next_cursor = self._encode_cursor(storage_cursor, taken[-1].name)
+                break
+            if page.cursor is None:
+                break
+            storage_cursor = page.cursor
+            if len(items) == limit:
+                next_cursor = self._encode_cursor(storage_cursor, None)
+                break
+
+        result = ObjectPage(
+            items=[
+                ContentStore.resolve(item).model_copy(update={"name": item.name[len(path) + 1 :]}) for item in items
+            ],
+            cursor=next_cursor,
+        )
+        self.listing_cache.set(key, result)
+        return result
+
+    @staticmethod
+    def _encode_cursor(storage_cursor: str | None, after: str | None) -> str:
+        """
+        Builds the continuation token of a listing page.
+
+        Args:
+            storage_cursor (str | None): The continuation token of the storage page to list from.
+            after (str | None): The path of the last object listed from that storage page, if any.
+
+        Returns:
+            str: The opaque continuation token.
+        """
+        return base64.urlsafe_b64encode(json.dumps([storage_cursor, after]).encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str | None) -> tuple[str | None, str | None]:
+        """
+        Reads a continuation token built by _encode_cursor.
+
+        Args:
+            cursor (str | None): The continuation token, or None for the first page.
+
+        Returns:
+            tuple[str | None, str | None]: The continuation token of the storage page to list from, and the path of
+                the last object already listed from it.
+
+        Raises:
+            ValueError: If the continuation token is malformed.
+        """
+        if cursor is None:
+            return (None, None)
         try:
-            blob_list = self.storage.container_client.list_blobs(name_starts_with=path)
-            async for blob in blob_list:
-                logger.critical(f"Blob: {blob.name}")
-                if not MANGLED in blob.name:
-                    blobs.append(blob.name.split("/")[-1])
-        except Exception as e:
-            logger.critical({"time": datetime.datetime.now(), "message": "Failed to list objects", "exception": e})
-        return blobs
+            storage_cursor, after = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError) as e:
+            raise ValueError("Invalid cursor") from e
+        if not all(value is None or isinstance(value, str) for value in (storage_cursor, after)):
+            raise ValueError("Invalid cursor")
+        return (storage_cursor, after)
 
     async def get_used_total_space(self, disk_name: str) -> tuple[int, int]:
         """
-        Retrieves the used and total space of a disk.
+        Retrieves the used and total space of a disk from the disk's metadata.
 
         Args:
             disk_name (str): The name of the disk.
 
         Returns:
-            tuple[int, int]: A tuple containing the used space and total space of the disk.
+            tuple[int, int]: A tuple containing the used space and total space of the disk, or (0, 0) if the disk does
+                not exist.
+
+        Raises:
+            StorageUnavailableError: If the storage could not be reached.
         """
         try:
-            blobs = self.storage.container_client.list_blobs(name_starts_with=disk_name)
-        except Exception as e:
-            logger.critical({"time": datetime.datetime.now(), "message": "Failed to get used up space", "exception": e})
+            metadata, _ = await self._read_metadata(disk_name)
+        except ResourceNotFoundError:
             return (0, 0)
 
-        used_space = 0
-        async for b in blobs:
-            used_space += b.size
+        return (metadata.used_space, metadata.total_space)
+
+    async def reconcile_used_space(self, disk_name: str) -> int | None:
+        """
+        Recounts the space taken up by the objects on a disk and corrects the counter in the disk's metadata.
 
-        total_space = await self._get_total_space(disk_name)
+        The objects are only recounted while no write or delete of the disk is pending, since those may already show
+        in the listing without being counted yet, or the other way around. Pending operations older than
+        PENDING_OPERATION_TIMEOUT are taken for interrupted ones and dropped. The counter is only corrected if the
+        metadata did not change while the objects were being counted, which every write or delete starting in the
+        meantime does.
 
-        return (used_space, total_space)
+        Args:
+            disk_name (str): The name of the disk.
 
-    async def _get_total_space(self, disk_name: str) -> int:
+        Returns:
+            int | None: The recounted used space, or None if a write or delete was pending, the metadata changed in
+                the meantime or an error occurs.
         """
-        Retrieves the total space of a disk.
+        try:
+            metadata, etag = await self._read_metadata(disk_name, revalidate=True)
+            now = datetime.datetime.now(tz=datetime.timezone.utc)
+            interrupted = [
+                operation
+                for operation, started in metadata.pending.items()
+                if (now - started).total_seconds() > PENDING_OPERATION_TIMEOUT
+            ]
+            if len(interrupted) < len(metadata.pending):
+                return None
+            used_space = 0
+            async for properties in self.storage.list_object_properties(f"{disk_name}/"):
+                if self._is_accounted(properties.name):
+                    used_space += ContentStore.resolve(properties).size
+
+            if used_space != metadata.used_space or interrupted:
+                logger.warning({
+                    "time": datetime.datetime.now(),
+                    "message": "Correcting used space drift",
+                    "disk": disk_name,
+                    "drift": used_space - metadata.used_space,
+                    "interrupted": len(interrupted),
+                })
+                metadata.used_space = used_space
+                metadata.pending = {}
+                await self._write_metadata(disk_name, metadata, etag)
+        except ResourceModifiedError:
+            return None
+        except Exception as e:
+            logger.critical(
+                {"time": datetime.datetime.now(), "message": "Failed to reconcile used space", "exception": e}
+            )
+            return None
+        return used_space
+
+    @staticmethod
+    def _copy_metadata(metadata: DiskMetadata) -> DiskMetadata:
+        # Faster than a deep copy, the pending operations being the only mutable field.
+        return metadata.model_copy(update={"pending": dict(metadata.pending)})
+
+    def _metadata_path(self, disk_name: str) -> str:
+        return f"{disk_name}/{self._metadata}"
+
+    @staticmethod
+    def _disk_name(path: str) -> str:
+        return path.split("/", 1)[0]
+
+    @staticmethod
+    def _is_accounted(path: str) -> bool:
+        return "/" in path and MANGLED not in path
+
+    def _invalidate_listing(self, path: str) -> None:
+        """
+        Drops every cached listing page of the disk the object belongs to, including listings of its folders.
+
+        Args:
+            path (str): The path of the object.
+        """
+        if not self._is_accounted(path):
+            return
+        disk_name = self._disk_name(path)
+        self.listing_cache.invalidate_matching(lambda key: self._disk_name(key[0]) == disk_name)
+
+    async def _read_metadata(self, disk_name: str, revalidate: bool = False) -> tuple[DiskMetadata, str | None]:
+        """
+        Reads the metadata of a disk, from the cache if it is fresh, otherwise downloading it only if it changed.
 
         Args:
             disk_name (str): The name of the disk.
+            revalidate (bool, optional): If set to True, checks the cached metadata is current even if it is fresh.
+                Defaults to False.
 
         Returns:
-            int: The total space of the disk.
+            tuple[DiskMetadata, str | None]: A copy of the metadata the caller may modify, and the etag of the
+                metadata object it was read from.
+        """
+        cached = self.metadata_cache.get(disk_name)
+        etag = None
+        if cached is not None:
+            metadata, etag, validated = cached
+            if not revalidate and time.monotonic() - validated < self.metadata_freshness:
+                return (self._copy_metadata(metadata), etag)
+        try:
+            stream = await self.storage.get_object_stream(self._metadata_path(disk_name), if_none_match=etag)
+        except ResourceNotModifiedError:
+            self.metadata_cache.set(disk_name, (metadata, etag, time.monotonic()))
+            return (self._copy_metadata(metadata), etag)
+        except ResourceNotFoundError:
+            self.metadata_cache.invalidate(disk_name)
+            raise
+        data = b"".join([chunk async for chunk in stream.chunks])
+        metadata = DiskMetadata.model_validate_json(data)
+        self.metadata_cache.set(disk_name, (self._copy_metadata(metadata), stream.properties.etag, time.monotonic()))
+        return (metadata, stream.properties.etag)
+
+    async def _write_metadata(self, disk_name: str, metadata: DiskMetadata, etag: str | None) -> None:
+        """
+        Replaces the metadata of a disk if it was not modified since it was read, and caches the written metadata.
+
+        Args:
+            disk_name (str): The name of the disk.
+            metadata (DiskMetadata): The new metadata.
+            etag (str | None): The etag of the metadata object the metadata was read from.
+
+        Raises:
+            ResourceModifiedError: If the metadata object was modified since it was read.
+        """
+        try:
+            properties = await self.storage.create_object(
+                self._metadata_path(disk_name), metadata.model_dump_json().encode(), if_match=etag
+            )
+        except ResourceModifiedError:
+            self.metadata_cache.invalidate(disk_name)
+            raise
+        self.metadata_cache.set(disk_name, (self._copy_metadata(metadata), properties.etag, time.monotonic()))
+
+    async def _update_metadata(self, disk_name: str, update: Callable[[DiskMetadata], None]) -> None:
+        """
+        Applies an update to the metadata of a disk, along with the other updates of the disk waiting to be applied,
+        retrying if the metadata is modified concurrently.
+
+        The update is applied even if the caller is cancelled in the meantime.
+
+        Args:
+            disk_name (str): The name of the disk.
+            update (Callable[[DiskMetadata], None]): Modifies the metadata in place, may raise to abort the update.
+
+        Raises:
+            StorageUnavailableError: If the metadata kept being modified concurrently, or the storage could not be
+                reached.
+        """
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        queue = self._metadata_updates.get(disk_name)
+        if queue is None:
+            queue = self._metadata_updates[disk_name] = []
+            self._spawn(self._apply_metadata_updates(disk_name, queue))
+        queue.append((update, future))
+        # Cancelling the wait leaves the update queued, as it is applied by a task of its own.
+        await future
+
+    async def _apply_metadata_updates(
+        self,
+        disk_name: str,
+        queue: list[tuple[Callable[[DiskMetadata], None], asyncio.Future[None]]],
+    ) -> None:
+        """
+        Applies the queued updates of the metadata of a disk in batches, one write per batch, until the queue is empty.
+
+        Args:
+            disk_name (str): The name of the disk.
+            queue (list[tuple[Callable[[DiskMetadata], None], asyncio.Future[None]]]): The updates to apply,
+                along with the futures receiving their results. Updates queued while a batch is written are applied
+                in the next batch.
+        """
+        try:
+            while queue:
+                batch = queue[:]
+                queue.clear()
+                try:
+                    await self._apply_metadata_batch(disk_name, batch)
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+        finally:
+            del self._metadata_updates[disk_name]
+
+    async def _apply_metadata_batch(
+        self, disk_name: str, batch: list[tuple[Callable[[DiskMetadata], None], asyncio.Future[None]]]
+    ) -> None:
+        """
+        Applies a batch of updates of the metadata of a disk in a single write. Updates that raise are left out of the
+        write and fail on their own.
+
+        Args:
+            disk_name (str): The name of the disk.
+            batch (list[tuple[Callable[[DiskMetadata], None], asyncio.Future[None]]]): The updates to apply,
+                along with the futures receiving their results.
 
         Raises:
-            None
+            StorageUnavailableError: If the metadata kept being modified concurrently.
+        """
+        for attempt in range(1, self._metadata_update_attempts + 1):
+            metadata, etag = await self._read_metadata(disk_name)
+            errors: dict[int, Exception] = {}
+            for index, (update, _) in enumerate(batch):
+                # A single update that raises is not written at all, so it may modify the metadata it was read as.
+                updated = self._copy_metadata(metadata) if len(batch) > 1 else metadata
+                try:
+                    update(updated)
+                except Exception as e:
+                    errors[index] = e
+                    continue
+                metadata = updated
+            try:
+                if len(errors) < len(batch):
+                    await self._write_metadata(disk_name, metadata, etag)
+            except ResourceModifiedError as e:
+                if attempt == self._metadata_update_attempts:
+                    raise StorageUnavailableError("update_metadata", attempt) from e
+                bound = min(self._metadata_backoff_max, self._metadata_backoff_base * 2 ** (attempt - 1))
+                await asyncio.sleep(random.uniform(0, bound))
+                continue
+            for index, (_, future) in enumerate(batch):
+                if future.done():
+                    continue
+                if index in errors:
+                    future.set_exception(errors[index])
+                else:
+                    future.set_result(None)
+            return
 
+    def _spawn(self, coroutine: Awaitable[None]) -> None:
         """
+        Runs a coroutine in the background, keeping a reference to it until it is done.
+
+        Args:
+            coroutine (Awaitable[None]): The coroutine to run.
+        """
+        task = asyncio.ensure_future(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _begin_operation(self, disk_name: str) -> str:
+        """
+        Records a write or delete of an object of a disk as pending, before it reaches the storage.
+
+        Args:
+            disk_name (str): The name of the disk.
+
+        Returns:
+            str: The ID of the operation, to be passed to _end_operation.
+        """
+        operation = uuid.uuid4().hex
+
+        def begin(metadata: DiskMetadata) -> None:
+            metadata.pending[operation] = datetime.datetime.now(tz=datetime.timezone.utc)
+
+        await self._update_metadata(disk_name, begin)
+        return operation
+
+    async def _end_operation(self, disk_name: str, operation: str, delta: int) -> None:
+        """
+        Applies the change in used space of a pending write or delete and ends it. If the metadata cannot be updated,
+        the operation keeps being ended in the background, as the write or delete itself is done.
+
+        Args:
+            disk_name (str): The name of the disk.
+            operation (str): The ID of the operation.
+            delta (int): The number of bytes the operation added to the disk, negative if it freed space.
+        """
+
+        def end(metadata: DiskMetadata) -> None:
+            metadata.used_space = max(metadata.used_space + delta, 0)
+            metadata.pending.pop(operation, None)
+
         try:
-            metadata = await self.get_object(f"{disk_name}/{self._metadata}")
+            await self._update_metadata(disk_name, end)
         except Exception as e:
-            logger.critical({"time": datetime.datetime.now(), "message": "Failed to get used up space", "exception": e})
-            return 0
+            logger.critical(
+                {"time": datetime.datetime.now(), "message": "Failed to end a disk operation", "exception": e}
+            )
+            self._spawn(self._retry_end_operation(disk_name, end))
+
+    async def _retry_end_operation(self, disk_name: str, end: Callable[[DiskMetadata], None]) -> None:
+        """
+        Keeps trying to end a pending operation, after a growing delay, until it succeeds or the attempts run out. An
+        operation that cannot be ended is ignored by the reconciler once it is older than PENDING_OPERATION_TIMEOUT.
+
+        Args:
+            disk_name (str): The name of the disk.
+            end (Callable[[DiskMetadata], None]): Ends the operation.
+        """
+        error: Exception | None = None
+        for attempt in range(1, self._metadata_update_attempts + 1):
+            await asyncio.sleep(min(self._metadata_backoff_max * 2 ** (attempt - 1), 60))
+            try:
+                await self._update_metadata(disk_name, end)
+                return
+            except ResourceNotFoundError:
+                return
+            except Exception as e:
+                error = e
+        logger.critical(
+            {"time": datetime.datetime.now(), "message": "Gave up ending a disk operation", "exception": error}
+        )
+
+    async def _accounted_write(
+        self, path: str, overwrite: bool, size: int | None, write: Callable[[int | None], Awaitable[int]]
+    ) -> int:
+        """
+        Performs a write of an object, keeping the used space counter of its disk up to date.
 
+        The write is recorded as pending in the disk's metadata until it updates the counter. If the size of the object
+        is known up front, the space is reserved in the same update, before anything is written, so concurrent writes
+        cannot exceed the disk's total space together.
+
+        Args:
+            path (str): The path of the object.
+            overwrite (bool): Whether the write may replace an existing object.
+            size (int | None): The expected size of the object, if known.
+            write (Callable[[int | None], Awaitable[int]]): Performs the write, given the maximum number of bytes it
+                may store, and returns the number of bytes stored.
+
+        Returns:
+            int: The number of bytes stored.
+
+        Raises:
+            QuotaExceededError: If the object does not fit in the space left on the disk.
+        """
+        if not self._is_accounted(path):
+            return await write(None)
+
+        disk_name = self._disk_name(path)
+        previous = None
+        if overwrite:
+            try:
+                previous = await self.storage.get_object_properties(path)
+            except ResourceNotFoundError:
+                previous = None
+        previous_size = ContentStore.resolve(previous).size if previous is not None else 0
+
+        operation = uuid.uuid4().hex
+        reserved = 0
+        limit = 0
+
+        def reserve(metadata: DiskMetadata) -> None:
+            nonlocal reserved, limit
+            limit = metadata.total_space - metadata.used_space + previous_size
+            reserved = 0
+            if size is not None:
+                if size > limit:
+                    raise QuotaExceededError(path)
+                reserved = size - previous_size
+                metadata.used_space += reserved
+            metadata.pending[operation] = datetime.datetime.now(tz=datetime.timezone.utc)
+
+        await self._update_metadata(disk_name, reserve)
+
+        try:
+            stored = await write(limit)
+        except BaseException:
+            await self._end_operation(disk_name, operation, -reserved)
+            raise
+        await self._end_operation(disk_name, operation, stored - previous_size - reserved)
+        if previous is not None:
+            await self._release(previous)
+        return stored
+
+    async def _write_reference(
+        self, path: str, chunks: AsyncIterator[bytes], overwrite: bool, limit: int | None, digest: str | None
+    ) -> int:
+        """
+        Stores the content in the content store, unless it is already stored, and writes a reference to it.
+
+        Args:
+            path (str): The path of the object.
+            chunks (AsyncIterator[bytes]): The content of the object, in order.
+            overwrite (bool): Whether the write may replace an existing object.
+            limit (int | None): The maximum size of the content.
+            digest (str | None): The digest of the content, if known up front.
+
+        Returns:
+            int: The size of the content.
+
+        Raises:
+            QuotaExceededError: If the already stored content is larger than the limit.
+        """
+        reference = await self.contents.acquire(digest) if digest is not None else None
+        if reference is not None and limit is not None and reference.size > limit:
+            await self.contents.release(reference.digest)
+            raise QuotaExceededError(path)
+        if reference is None:
+            reference = await self.contents.store(chunks, digest)
+        try:
+            await self.storage.create_object(path, b"", overwrite, metadata=ContentStore.reference_metadata(reference))
+        except BaseException:
+            await self.contents.release(reference.digest)
+            raise
+        return reference.size
+
+    async def _release(self, properties: ObjectProperties) -> None:
+        """
+        Releases the content a deleted or replaced object referenced, if any.
+
+        Args:
+            properties (ObjectProperties): The properties the object had.
+        """
+        digest = ContentStore.digest(properties)
+        if digest is None:
+            return
         try:
-            metadata_model = DiskMetadata.model_validate_json(metadata)
+            await self.contents.release(digest)
         except Exception as e:
-            logger.critical({"time": datetime.datetime.now(), "message": "Failed to validate metadata", "exception": e})
-            return 0
+            logger.critical({"time": datetime.datetime.now(), "message": "Failed to release content", "exception": e})
 
-        return metadata_model.total_space
+    @staticmethod
+    async def _limit_chunks(path: str, chunks: AsyncIterator[bytes], limit: int) -> AsyncIterator[bytes]:
+        received = 0
+        async for chunk in chunks:
+            received += len(chunk)
+            if received > limit:
+                raise QuotaExceededError(path)
+            yield chunk
@@ -1,24 +1,89 @@
-from ...libraries.object_storage.azure_blob_storage import AzureBlobStorage
+from ...libraries.object_storage.object_storage import ObjectStorageProtocol
 from .consts import MANGLED
+from .content_store import ContentStore
+from ...models.disk_metadata import DiskMetadata
+from ...libraries.cache.ttl_cache import TTLCache
+from ...libraries.object_storage.models import ObjectPage, ObjectProperties
+from ...models.disk_deletion import DiskDeletionState, DiskDeletionStatus
+from typing import AsyncGenerator
+import asyncio
+import contextlib
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+from ...libraries.object_storage.exceptions import StorageUnavailableError
 import logging
-import json
 import datetime
+import os
+import time
 
 logger = logging.getLogger(__name__)
 
+DELETION_BATCH_SIZE = int(os.getenv("DISK_DELETION_BATCH_SIZE", 256))
+DELETION_CONCURRENCY = int(os.getenv("DISK_DELETION_CONCURRENCY", 4))
+DELETION_MAX_PASSES = int(os.getenv("DISK_DELETION_MAX_PASSES", 3))
+DELETION_LEASE = float(os.getenv("DISK_DELETION_LEASE", 60))
+
 
 class AzureDiskManager:
     """
     Manages the creation, deletion, and existence checking of Azure disks.
 
+    Disks are deleted by background jobs. Every job is recorded in a marker object outside of the disk, so jobs
+    interrupted by a shutdown or a crash are resumed on the next startup. A job lists and deletes the disk's objects
+    in passes until none is left, and fails if objects are still left after DELETION_MAX_PASSES passes. Failed jobs
+    are resumed on the next startup and whenever the user tries to create the disk again. Objects referencing
+    deduplicated content are deleted one by one, releasing the content they referenced.
+
+    A job leases its marker for DELETION_LEASE seconds and renews the lease with every page it deletes, so when
+    several processes share the storage, e.g. the workers of a server, only one of them resumes it. The others wait
+    for the lease to expire, taking the job over if its process stopped without handing it back.
+
     Args:
-        storage (AzureBlobStorage): The Azure Blob Storage instance used for disk operations.
+        storage (ObjectStorageProtocol): The object storage used for disk operations.
+        listing_cache (TTLCache[tuple[str, int, str | None], ObjectPage] | None, optional): The cache of disk listing
+            pages shared with the disk repository, invalidated when a disk is created or deleted. Defaults to None.
+        existence_cache (TTLCache[str, bool] | None, optional): The cache of disks known to exist. Defaults to a cache
+            private to this manager.
+        metadata_cache (TTLCache[str, tuple[DiskMetadata, str | None, float]] | None, optional): The cache of disk
+            metadata shared with the disk repository, filled when a disk is created and invalidated when it is
+            deleted. Defaults to None.
     """
 
     _metadata = f"{MANGLED}METADATA.json"
+    _deletions = f"{MANGLED}DELETIONS/"
 
-    def __init__(self, storage: AzureBlobStorage):
+    def __init__(
+        self,
+        storage: ObjectStorageProtocol,
+        listing_cache: TTLCache[tuple[str, int, str | None], ObjectPage] | None = None,
+        existence_cache: TTLCache[str, bool] | None = None,
+        metadata_cache: TTLCache[str, tuple[DiskMetadata, str | None, float]] | None = None,
+    ):
         self.storage = storage
+        self.listing_cache = listing_cache
+        self.existence_cache = existence_cache if existence_cache is not None else TTLCache("disk_existence", 4096, 60)
+        self.metadata_cache = metadata_cache
+        self.contents = ContentStore(storage)
+        self._deletion_jobs: dict[str, asyncio.Task] = {}
+        self._deletion_statuses: dict[str, DiskDeletionStatus] = {}
+
+    async def context(self) -> AsyncGenerator[None, None]:
+        """
+        Resumes the disk deletion jobs left unfinished by a previous run, and stops the running jobs on shutdown.
+        """
+        try:
+            async for properties in self.storage.list_object_properties(self._deletions):
+                self._start_deletion(properties.name[len(self._deletions) :], claim=True)
+        except Exception as e:
+            logger.critical(
+                {"time": datetime.datetime.now(), "message": "Failed to resume disk deletions", "exception": e}
+            )
+        yield
+        jobs = list(self._deletion_jobs.values())
+        for job in jobs:
+            job.cancel()
+        for job in jobs:
+            with contextlib.suppress(asyncio.CancelledError):
+                await job
 
     async def create_disk(self, user_id: str, user_email: str) -> bool:
         """
@@ -29,48 +94,315 @@ class AzureDiskManager:
             user_email (str): The email address of the user.
 
         Returns:
-            bool: True if the disk creation is successful, False otherwise.
+            bool: True if the disk creation is successful, False otherwise, e.g. while a previous disk of the user is
+                still being deleted.
+
+        Raises:
+            StorageUnavailableError: If the storage could not be reached.
         """
         try:
-            await self.storage.create_object(f"{user_id}/{self._metadata}", json.dumps({"user_email": user_email}))
+            deletion = await self.get_deletion_status(user_id)
+            if deletion is not None and deletion.state != DiskDeletionState.COMPLETED:
+                if deletion.state == DiskDeletionState.FAILED:
+                    self._start_deletion(user_id, claim=True)
+                return False
+            metadata = DiskMetadata(user_email=user_email)
+            properties = await self.storage.create_object(
+                f"{user_id}/{self._metadata}", metadata.model_dump_json().encode()
+            )
+        except StorageUnavailableError:
+            raise
         except Exception as e:
             logger.critical({"time": datetime.datetime.now(), "message": "Failed to create a disk", "exception": e})
             return False
+        finally:
+            self._invalidate_listing(user_id)
+        self.existence_cache.set(user_id, True)
+        if self.metadata_cache is not None:
+            self.metadata_cache.set(user_id, (metadata, properties.etag, time.monotonic()))
         return True
 
     async def delete_disk(self, user_id: str) -> bool:
         """
-        Deletes the disk associated with the specified user.
+        Starts a background job deleting the disk associated with the specified user.
+
+        The disk stops existing right away, its objects are deleted in batches afterwards. If the disk cannot be
+        marked as deleted, the job's marker is removed again, so it does not keep the user from creating a disk.
 
         Args:
             user_id (str): The ID of the user.
 
         Returns:
-            bool: True if the disk deletion is successful, False otherwise.
+            bool: True if the deletion was started, False if the disk does not exist or an error occurs.
+
+        Raises:
+            StorageUnavailableError: If the storage could not be reached.
         """
+        metadata_path = f"{user_id}/{self._metadata}"
+        try:
+            await self.storage.get_object_properties(metadata_path)
+        except ResourceNotFoundError:
+            return False
+        status = DiskDeletionStatus(
+            user_id=user_id, started=datetime.datetime.now(tz=datetime.timezone.utc), leased_until=self._lease()
+        )
+        self.existence_cache.invalidate(user_id)
+        if self.metadata_cache is not None:
+            self.metadata_cache.invalidate(user_id)
         try:
-            object = await self.storage.list_objects(user_id)
-            for o in object:
-                await self.storage.delete_object(o)
+            await self.storage.create_object(self._deletion_marker(user_id), status.model_dump_json().encode(), True)
+            try:
+                await self.storage.delete_object(metadata_path)
+            except ResourceNotFoundError:
+                # Deleted by a concurrent call, the job still deletes whatever objects are left.
+                pass
+            except Exception:
+                await self._discard_marker(user_id)
+                raise
+        except StorageUnavailableError:
+            raise
         except Exception as e:
             logger.critical({"time": datetime.datetime.now(), "message": "Failed to delete a disk", "exception": e})
 
             return False
+        finally:
+            self._invalidate_listing(user_id)
+        self._deletion_statuses[user_id] = status
+        self._start_deletion(user_id)
         return True
 
+    async def get_deletion_status(self, user_id: str) -> DiskDeletionStatus | None:
+        """
+        Retrieves the progress of the deletion of the specified user's disk.
+
+        Args:
+            user_id (str): The ID of the user.
+
+        Returns:
+            DiskDeletionStatus | None: The progress of the most recent deletion, or None if the disk was not deleted
+                recently.
+
+        Raises:
+            StorageUnavailableError: If the storage could not be reached.
+        """
+        if user_id in self._deletion_statuses:
+            return self._deletion_statuses[user_id]
+        try:
+            stream = await self.storage.get_object_stream(self._deletion_marker(user_id))
+            data = b"".join([chunk async for chunk in stream.chunks])
+        except ResourceNotFoundError:
+            return None
+        return DiskDeletionStatus.model_validate_json(data)
+
     async def if_exists(self, user_id: str) -> bool:
         """
-        Checks if a disk exists for the specified user.
+        Checks if a disk exists for the specified user with a single properties call on the disk's metadata.
+
+        Positive answers are cached, as disks are only created and deleted through this manager.
 
         Args:
             user_id (str): The ID of the user.
 
         Returns:
             bool: True if a disk exists for the user, False otherwise.
+
+        Raises:
+            StorageUnavailableError: If the storage could not be reached.
         """
+        if self.existence_cache.get(user_id):
+            return True
         try:
-            object = await self.storage.list_objects(user_id)
-            return bool(object)
-        except Exception as e:
-            logger.critical({"time": datetime.datetime.now(), "message": "Failed to check a disk", "exception": e})
+            await self.storage.get_object_properties(f"{user_id}/{self._metadata}")
+        except ResourceNotFoundError:
             return False
+        self.existence_cache.set(user_id, True)
+        return True
+
+    def _deletion_marker(self, user_id: str) -> str:
+        return f"{self._deletions}{user_id}"
+
+    def _lease(self) -> datetime.datetime:
+        return datetime.datetime.now(tz=datetime.timezone.utc) + datetime.timedelta(seconds=DELETION_LEASE)
+
+    async def _claim_deletion(self, user_id: str) -> DiskDeletionStatus | None:
+        """
+        Takes over the job deleting the specified user's disk by leasing its marker, waiting for the lease of another
+        process to expire first.
+
+        Args:
+            user_id (str): The ID of the user.
+
+        Returns:
+            DiskDeletionStatus | None: The progress of the job, or None if the job completed meanwhile or its marker
+                could not be leased.
+        """
+        marker = self._deletion_marker(user_id)
+        while True:
+            try:
+                stream = await self.storage.get_object_stream(marker)
+                status = DiskDeletionStatus.model_validate_json(b"".join([chunk async for chunk in stream.chunks]))
+                now = datetime.datetime.now(tz=datetime.timezone.utc)
+                if status.leased_until is not None and status.leased_until > now:
+                    await asyncio.sleep((status.leased_until - now).total_seconds())
+                    continue
+                status.leased_until = self._lease()
+                await self.storage.create_object(
+                    marker, status.model_dump_json().encode(), True, stream.properties.etag
+                )
+            except ResourceNotFoundError:
+                return None
+            except ResourceModifiedError:
+                # Leased or updated by another process meanwhile.
+                continue
+            except Exception as e:
+                logger.critical(
+                    {"time": datetime.datetime.now(), "message": "Failed to claim a disk deletion", "exception": e}
+                )
+                return None
+            return status
+
+    async def _discard_marker(self, user_id: str) -> None:
+        """
+        Removes the marker of a deletion that could not be started, logging instead of raising if that fails too.
+
+        Args:
+            user_id (str): The ID of the user.
+        """
+        try:
+            await self.storage.delete_object(self._deletion_marker(user_id))
+        except ResourceNotFoundError:
+            pass
+        except Exception as e:
+            logger.critical(
+                {"time": datetime.datetime.now(), "message": "Failed to discard a deletion marker", "exception": e}
+            )
+
+    def _start_deletion(self, user_id: str, claim: bool = False) -> None:
+        if user_id in self._deletion_jobs:
+            return
+        job = asyncio.create_task(self._delete_objects(user_id, claim))
+        self._deletion_jobs[user_id] = job
+        job.add_done_callback(lambda _: self._deletion_jobs.pop(user_id, None))
+
+    async def _delete_objects(self, user_id: str, claim: bool) -> None:
+        """
+        Deletes every object of the specified user's disk, a batch per listing page with a bounded number of batches
+        in flight, and records the progress in the job's marker.
+
+        The disk is listed again once every batch of a pass finished, and the job fails if objects are still left after
+        DELETION_MAX_PASSES passes, or as soon as a batch fails. A job stopped by a shutdown hands its lease back.
+
+        Args:
+            user_id (str): The ID of the user.
+            claim (bool): Whether the job has to lease its marker first, as it was started by another process.
+        """
+        if claim:
+            claimed = await self._claim_deletion(user_id)
+            if claimed is None:
+                return
+            status = claimed
+        else:
+            status = (
+                self._deletion_statuses.get(user_id)
+                or await self.get_deletion_status(user_id)
+                or DiskDeletionStatus(user_id=user_id, started=datetime.datetime.now(tz=datetime.timezone.utc))
+            )
+        status.state = DiskDeletionState.RUNNING
+        status.finished = None
+        status.error = None
+        self._deletion_statuses[user_id] = status
+        slots = asyncio.Semaphore(DELETION_CONCURRENCY)
+
+        batches: list[asyncio.Task] = []
+
+        async def delete_reference(item: ObjectProperties, digest: str) -> None:
+            try:
+                await self.storage.delete_object(item.name, if_match=item.etag)
+            except (ResourceModifiedError, ResourceNotFoundError):
+                return
+            status.deleted += 1
+            await self.contents.release(digest)
+
+        async def delete_batch(items: list[ObjectProperties]) -> None:
+            try:
+                paths = []
+                references = []
+                for item in items:
+                    digest = ContentStore.digest(item) if item.metadata else None
+                    if digest is not None:
+                        references.append((item, digest))
+                    else:
+                        paths.append(item.name)
+                if paths:
+                    status.deleted += await self.storage.delete_objects(paths)
+                if references:
+                    await asyncio.gather(*(delete_reference(item, digest) for item, digest in references))
+            finally:
+                slots.release()
+
+        try:
+            for sweep in range(1, DELETION_MAX_PASSES + 1):
+                cursor = None
+                while True:
+                    page = await self.storage.list_objects_page(f"{user_id}/", DELETION_BATCH_SIZE, cursor)
+                    if page.items:
+                        await slots.acquire()
+                        for batch in batches:
+                            if batch.done():
+                                # Raises the error of a failed batch right away.
+                                batch.result()
+                        batches.append(asyncio.create_task(delete_batch(page.items)))
+                    status.leased_until = self._lease()
+                    await self.storage.create_object(
+                        self._deletion_marker(user_id), status.model_dump_json().encode(), True
+                    )
+                    if page.cursor is None:
+                        break
+                    cursor = page.cursor
+                await asyncio.gather(*batches)
+                batches.clear()
+                remaining = await self.storage.list_objects_page(f"{user_id}/", 1)
+                if not remaining.items:
+                    break
+                if sweep == DELETION_MAX_PASSES:
+                    raise RuntimeError(f"Objects left after {sweep} deletion passes")
+            await self.storage.delete_object(self._deletion_marker(user_id))
+            status.state = DiskDeletionState.COMPLETED
+        except asyncio.CancelledError:
+            status.state = DiskDeletionState.PENDING
+            status.leased_until = None
+            await self._record_status(status)
+            raise
+        except Exception as e:
+            logger.critical({"time": datetime.datetime.now(), "message": "Failed to delete a disk", "exception": e})
+            status.state = DiskDeletionState.FAILED
+            status.error = str(e)
+        finally:
+            for batch in batches:
+                batch.cancel()
+            self._invalidate_listing(user_id)
+        status.finished = datetime.datetime.now(tz=datetime.timezone.utc)
+        if status.state == DiskDeletionState.FAILED:
+            status.leased_until = None
+            await self._record_status(status)
+
+    async def _record_status(self, status: DiskDeletionStatus) -> None:
+        """
+        Records a failed or stopped job in its marker, so every process knows to resume it, logging instead of raising
+        if that fails too.
+
+        Args:
+            status (DiskDeletionStatus): The progress of the job.
+        """
+        try:
+            await self.storage.create_object(
+                self._deletion_marker(status.user_id), status.model_dump_json().encode(), True
+            )
+        except Exception as e:
+            logger.critical(
+                {"time": datetime.datetime.now(), "message": "Failed to record a disk deletion", "exception": e}
+            )
+
+    def _invalidate_listing(self, user_id: str) -> None:
+        if self.listing_cache is not None:
+            self.listing_cache.invalidate_matching(lambda key: key[0].split("/", 1)[0] == user_id)
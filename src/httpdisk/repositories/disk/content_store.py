@@ -0,0 +1,240 @@
+from ...libraries.object_storage.object_storage import ObjectStorageProtocol
+from ...libraries.object_storage.models import ObjectProperties, ObjectStream
+from ...models.content_reference import ContentReference
+from .consts import MANGLED
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from typing import AsyncIterator
+import asyncio
+import contextlib
+import datetime
+import hashlib
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class ContentStore:
+    """
+    Stores file content once per digest and counts the files referencing it.
+
+    Content is uploaded to an object with a unique name, and the reference record of its digest names that object
+    and counts the files referencing it. Reference records are only ever changed conditionally on their etag, so
+    concurrent uploads and deletions of the same content never lose a reference, and the content object is only
+    deleted once its record was removed while the last reference was being released.
+
+    A file referencing stored content is an empty object whose metadata names the content.
+
+    Args:
+        storage (ObjectStorageProtocol): The object storage the content is stored in.
+    """
+
+    _contents = f"{MANGLED}CONTENTS/"
+    _references = f"{MANGLED}REFERENCES/"
+    _update_attempts = 10
+    _digest_key = "httpdisk_digest"
+    _content_key = "httpdisk_content"
+    _size_key = "httpdisk_size"
+
+    def __init__(self, storage: ObjectStorageProtocol):
+        self.storage = storage
+
+    @classmethod
+    def digest(cls, properties: ObjectProperties) -> str | None:
+        """
+        Returns the digest of the content a file references.
+
+        Args:
+            properties (ObjectProperties): The properties of the file's object.
+
+        Returns:
+            str | None: The digest of the referenced content, or None if the object holds its content itself.
+        """
+        return properties.metadata.get(cls._digest_key)
+
+    @classmethod
+    def resolve(cls, properties: ObjectProperties) -> ObjectProperties:
+        """
+        Returns the properties of a file as seen by its owner, with the size of the content it references.
+
+        Args:
+            properties (ObjectProperties): The properties of the file's object.
+
+        Returns:
+            ObjectProperties: The properties of the file.
+        """
+        if cls.digest(properties) is None:
+            return properties
+        return properties.model_copy(update={"size": int(properties.metadata[cls._size_key]), "metadata": {}})
+
+    @classmethod
+    def reference_metadata(cls, reference: ContentReference) -> dict[str, str]:
+        """
+        Returns the metadata of a file referencing the content.
+
+        Args:
+            reference (ContentReference): The referenced content.
+
+        Returns:
+            dict[str, str]: The metadata to store the file's object with.
+        """
+        return {
+            cls._digest_key: reference.digest,
+            cls._content_key: reference.object,
+            cls._size_key: str(reference.size),
+        }
+
+    async def open(
+        self, properties: ObjectProperties, offset: int | None = None, length: int | None = None
+    ) -> ObjectStream:
+        """
+        Opens a streaming download of the content a file references, or of a byte range of it.
+
+        Args:
+            properties (ObjectProperties): The properties of the file's object.
+            offset (int | None, optional): The offset of the first byte to download. Defaults to the start of the file.
+            length (int | None, optional): The number of bytes to download. Defaults to the rest of the file.
+
+        Returns:
+            ObjectStream: The open download, carrying the properties of the file.
+        """
+        stream = await self.storage.get_object_stream(properties.metadata[self._content_key], offset, length)
+        return stream.model_copy(update={"properties": self.resolve(properties)})
+
+    async def acquire(self, digest: str) -> ContentReference | None:
+        """
+        Adds a reference to already stored content, without transferring it again.
+
+        Args:
+            digest (str): The digest of the content.
+
+        Returns:
+            ContentReference | None: The referenced content, or None if no content with the digest is stored.
+
+        Raises:
+            ResourceModifiedError: If the reference record kept being modified concurrently.
+        """
+        for _ in range(self._update_attempts):
+            current = await self._read(digest)
+            if current is None:
+                return None
+            reference, etag = current
+            reference.count += 1
+            try:
+                await self._write(reference, etag)
+            except (ResourceModifiedError, ResourceNotFoundError):
+                continue
+            return reference
+        raise ResourceModifiedError(message=f"The reference record of {digest} kept being modified.")
+
+    async def store(self, chunks: AsyncIterator[bytes], digest: str | None = None) -> ContentReference:
+        """
+        Stores content and adds a reference to it, hashing it while it is being uploaded.
+
+        If the same content turns out to be stored already, the reference is added to it instead and the uploaded
+        copy is deleted.
+
+        Args:
+            chunks (AsyncIterator[bytes]): The content, in order.
+            digest (str | None, optional): The digest of the content, if known up front. Defaults to None.
+
+        Returns:
+            ContentReference: The referenced content.
+        """
+        hasher = hashlib.sha256()
+
+        async def hashed() -> AsyncIterator[bytes]:
+            async for chunk in chunks:
+                await asyncio.to_thread(hasher.update, chunk)
+                yield chunk
+
+        name = f"{self._contents}{uuid.uuid4().hex}"
+        size = await self.storage.create_object_stream(name, chunks if digest is not None else hashed())
+        try:
+            reference = await self._register(digest or hasher.hexdigest(), name, size)
+        except BaseException:
+            with contextlib.suppress(Exception):
+                await self.storage.delete_object(name)
+            raise
+        if reference.object != name:
+            try:
+                await self.storage.delete_object(name)
+            except Exception as e:
+                logger.critical(
+                    {"time": datetime.datetime.now(), "message": "Failed to delete duplicate content", "exception": e}
+                )
+        return reference
+
+    async def release(self, digest: str) -> None:
+        """
+        Removes a reference to stored content, deleting the content once nothing references it.
+
+        Args:
+            digest (str): The digest of the content.
+
+        Raises:
+            ResourceModifiedError: If the reference record kept being modified concurrently.
+        """
+        for _ in range(self._update_attempts):
+            current = await self._read(digest)
+            if current is None:
+                logger.warning(
+                    {"time": datetime.datetime.now(), "message": "Released content is not stored", "digest": digest}
+                )
+                return
+            reference, etag = current
+            try:
+                if reference.count > 1:
+                    reference.count -= 1
+                    await self._write(reference, etag)
+                    return
+                await self.storage.delete_object(self._reference_path(digest), if_match=etag)
+            except (ResourceModifiedError, ResourceNotFoundError):
+                continue
+            await self.storage.delete_object(reference.object)
+            return
+        raise ResourceModifiedError(message=f"The reference record of {digest} kept being modified.")
+
+    def _reference_path(self, digest: str) -> str:
+        return f"{self._references}{digest}"
+
+    async def _read(self, digest: str) -> tuple[ContentReference, str | None] | None:
+        try:
+            stream = await self.storage.get_object_stream(self._reference_path(digest))
+            data = b"".join([chunk async for chunk in stream.chunks])
+        except ResourceNotFoundError:
+            return None
+        return (ContentReference.model_validate_json(data), stream.properties.etag)
+
+    async def _write(self, reference: ContentReference, etag: str | None) -> None:
+        await self.storage.create_object(
+            self._reference_path(reference.digest), reference.model_dump_json().encode(), if_match=etag
+        )
+
+    async def _register(self, digest: str, name: str, size: int) -> ContentReference:
+        """
+        Adds a reference to the content with the digest, recording the uploaded object as its content unless the
+        same content is already stored.
+
+        Args:
+            digest (str): The digest of the uploaded content.
+            name (str): The path of the object the content was uploaded to.
+            size (int): The size of the content.
+
+        Returns:
+            ContentReference: The referenced content.
+
+        Raises:
+            ResourceModifiedError: If the reference record kept being modified concurrently.
+        """
+        for _ in range(self._update_attempts):
+            reference = await self.acquire(digest)
+            if reference is not None:
+                return reference
+            reference = ContentReference(digest=digest, object=name, size=size)
+            try:
+                await self.storage.create_object(self._reference_path(digest), reference.model_dump_json().encode())
+            except ResourceExistsError:
+                continue
+            return reference
+        raise ResourceModifiedError(message=f"The reference record of {digest} kept being modified.")
@@ -1,4 +1,5 @@
 from typing import Protocol
+from ...models.disk_deletion import DiskDeletionStatus
 
 class DiskManagerProtocol(Protocol):
     """Interface for managing disks."""
@@ -16,13 +17,24 @@ class DiskManagerProtocol(Protocol):
         pass
 
     async def delete_disk(self, user_id: str) -> bool:
-        """Delete the disk for the specified user.
+        """Start deleting the disk for the specified user in the background.
 
         Args:
             user_id (str): The ID of the user.
 
         Returns:
-            bool: True if the disk is deleted successfully, False otherwise.
+            bool: True if the deletion was started successfully, False otherwise.
+        """
+        pass
+
+    async def get_deletion_status(self, user_id: str) -> DiskDeletionStatus | None:
+        """Get the progress of the deletion of the disk for the specified user.
+
+        Args:
+            user_id (str): The ID of the user.
+
+        Returns:
+            DiskDeletionStatus | None: The progress of the deletion, or None if the disk was not deleted recently.
         """
         pass
 
@@ -1,4 +1,5 @@
-from typing import Protocol
+from typing import Protocol, AsyncIterator
+from ...libraries.object_storage.models import ObjectPage, ObjectProperties, ObjectStream
 
 
 class DiskProtocol(Protocol):
@@ -15,6 +16,33 @@ class DiskProtocol(Protocol):
         """
         pass
 
+    async def get_object_stream(
+        self, path: str, offset: int | None = None, length: int | None = None
+    ) -> ObjectStream | None:
+        """Open a streaming download of the object at the specified path, or of a byte range of it.
+
+        Args:
+            path (str): The path of the object.
+            offset (int | None, optional): The offset of the first byte to download. Defaults to the start of
+                the object.
+            length (int | None, optional): The number of bytes to download. Defaults to the rest of the object.
+
+        Returns:
+            ObjectStream | None: The open download, or None if the object doesn't exist.
+        """
+        pass
+
+    async def get_object_properties(self, path: str) -> ObjectProperties | None:
+        """Retrieve the properties of the object at the specified path.
+
+        Args:
+            path (str): The path of the object.
+
+        Returns:
+            ObjectProperties | None: The properties of the object, or None if the object doesn't exist.
+        """
+        pass
+
     async def create_object(self, path: str, data: bytes, overwrite: bool = False) -> bool:
         """Create a new object at the specified path.
 
@@ -28,6 +56,46 @@ class DiskProtocol(Protocol):
         """
         pass
 
+    async def create_object_stream(
+        self, path: str, chunks: AsyncIterator[bytes], overwrite: bool = False, size: int | None = None
+    ) -> bool:
+        """Create a new object at the specified path from an asynchronous stream of chunks.
+
+        Args:
+            path (str): The path of the object.
+            chunks (AsyncIterator[bytes]): The chunks to be stored in the object, in order.
+            overwrite (bool, optional): Whether to overwrite an existing object with the same path. Defaults to False.
+            size (int | None, optional): The expected size of the object, if known. Defaults to None.
+
+        Returns:
+            bool: True if the object was created successfully, False otherwise.
+
+        Raises:
+            FileExistsError: If the object already exists and overwrite is False.
+            QuotaExceededError: If the object does not fit in the space left on the disk.
+            StorageUnavailableError: If the storage could not be reached.
+        """
+        pass
+
+    async def commit_object_blocks(self, path: str, block_ids: list[str], size: int, overwrite: bool = False) -> bool:
+        """Create a new object at the specified path from blocks staged in the object storage.
+
+        Args:
+            path (str): The path of the object.
+            block_ids (list[str]): The ids of the staged blocks making up the object, in order.
+            size (int): The total size of the blocks.
+            overwrite (bool, optional): Whether to overwrite an existing object with the same path. Defaults to False.
+
+        Returns:
+            bool: True if the object was created successfully, False otherwise.
+
+        Raises:
+            FileExistsError: If the object already exists and overwrite is False.
+            QuotaExceededError: If the object does not fit in the space left on the disk.
+            StorageUnavailableError: If the storage could not be reached.
+        """
+        pass
+
     async def delete_object(self, path: str) -> bool:
         """Delete the object at the specified path.
 
@@ -50,8 +118,21 @@ class DiskProtocol(Protocol):
         """
         pass
 
+    async def list_objects_page(self, path: str, limit: int, cursor: str | None = None) -> ObjectPage:
+        """List a single page of the objects at the specified path.
+
+        Args:
+            path (str): The path to list objects from.
+            limit (int): The maximum number of objects on the page.
+            cursor (str | None, optional): The continuation token returned with the previous page. Defaults to None.
+
+        Returns:
+            ObjectPage: The objects on the page and the continuation token of the next page.
+        """
+        pass
+
     async def get_used_total_space(self, disk_name: str) -> tuple[int, int]:
-        """Get the used and total space of a disk.
+        """Get the used and total space of a disk, as recorded in the disk's metadata.
 
         Args:
             disk_name (str): The name of the disk.
@@ -60,3 +141,14 @@ class DiskProtocol(Protocol):
             tuple[int, int]: A tuple containing the used space and total space in bytes.
         """
         pass
+
+    async def reconcile_used_space(self, disk_name: str) -> int | None:
+        """Recount the space taken up by the objects on a disk and correct the recorded used space.
+
+        Args:
+            disk_name (str): The name of the disk.
+
+        Returns:
+            int | None: The recounted used space, or None if it could not be recorded.
+        """
+        pass
@@ -0,0 +1,2 @@
+class QuotaExceededError(Exception):
+    """Raised when a write would take up more space than is left on the disk."""
@@ -0,0 +1,60 @@
+from ...libraries.object_storage.object_storage import ObjectStorageProtocol
+from .consts import MANGLED
+from .disk_protocol import DiskProtocol
+from typing import AsyncGenerator
+import asyncio
+import contextlib
+import datetime
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_INTERVAL = float(os.getenv("DISK_USAGE_RECONCILE_INTERVAL", 60 * 60))
+
+
+class DiskUsageReconciler:
+    """
+    Periodically recounts the used space of every disk in the background and corrects drift of the counters kept in
+    the disks' metadata, e.g. after a crash between a write and the counter update.
+
+    Args:
+        storage (ObjectStorageProtocol): The object storage the disks are stored in.
+        disk_repository (DiskProtocol): The disk repository keeping the counters.
+        interval (float, optional): The number of seconds between two passes. Defaults to RECONCILE_INTERVAL.
+    """
+
+    def __init__(
+        self, storage: ObjectStorageProtocol, disk_repository: DiskProtocol, interval: float = RECONCILE_INTERVAL
+    ):
+        self.storage = storage
+        self.disk_repository = disk_repository
+        self.interval = interval
+
+    async def context(self) -> AsyncGenerator[None, None]:
+        """
+        Runs the reconciliation loop for as long as the application is running.
+        """
+        task = asyncio.create_task(self._run())
+        yield
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    async def reconcile(self) -> None:
+        """
+        Performs a single reconciliation pass over every disk.
+        """
+        for prefix in await self.storage.list_prefixes():
+            if MANGLED not in prefix:
+                await self.disk_repository.reconcile_used_space(prefix.rstrip("/"))
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.critical(
+                    {"time": datetime.datetime.now(), "message": "Failed to reconcile disks", "exception": e}
+                )
@@ -0,0 +1,121 @@
+from ..disk.azure_disk import AzureDiskRepository
+from ..disk.consts import MANGLED
+from ...libraries.object_storage.exceptions import InvalidPathError
+from ...libraries.object_storage.models import ObjectProperties, ObjectStream
+from ...libraries.object_storage.paths import is_valid_path
+from typing import AsyncIterator
+
+
+class AzureFileRepository:
+    """
+    Manages the files stored on users' Azure disks.
+
+    Filenames that are not plain relative paths, or that name the disk's internal objects, are rejected with an
+    InvalidPathError, so a file of one disk can never resolve to an object elsewhere.
+
+    Args:
+        disk_repository (AzureDiskRepository): The disk repository the files are stored in.
+    """
+
+    def __init__(self, disk_repository: AzureDiskRepository):
+        self.disk_repository = disk_repository
+
+    @property
+    def deduplicates(self) -> bool:
+        """
+        Whether files are stored once per distinct content, in which case passing their digest up front lets
+        already stored content be referenced without uploading it again.
+        """
+        return self.disk_repository.deduplicate
+
+    @staticmethod
+    def _path(user_id: str, filename: str) -> str:
+        if not is_valid_path(filename) or MANGLED in filename:
+            raise InvalidPathError(filename)
+        return f"{user_id}/{filename}"
+
+    async def create_file(
+        self,
+        user_id: str,
+        filename: str,
+        chunks: AsyncIterator[bytes],
+        size: int | None = None,
+        digest: str | None = None,
+    ) -> bool:
+        """
+        Creates a file on the user's disk from a stream of chunks.
+
+        Args:
+            user_id (str): The ID of the user.
+            filename (str): The name of the file.
+            chunks (AsyncIterator[bytes]): The content of the file, in order.
+            size (int | None, optional): The size of the file, if known up front. Defaults to None.
+            digest (str | None, optional): The SHA-256 digest of the file in hexadecimal, if known up front.
+                Defaults to None.
+
+        Returns:
+            bool: True if the file was created successfully, False otherwise.
+
+        Raises:
+            FileExistsError: If a file with the same name already exists.
+            QuotaExceededError: If the file does not fit in the space left on the user's disk.
+        """
+        return await self.disk_repository.create_object_stream(
+            self._path(user_id, filename), chunks, size=size, digest=digest
+        )
+
+    async def delete_file(self, user_id: str, filename: str) -> bool:
+        """
+        Deletes a file from the user's disk.
+
+        Args:
+            user_id (str): The ID of the user.
+            filename (str): The name of the file.
+
+        Returns:
+            bool: True if the file was deleted successfully, False otherwise.
+        """
+        return await self.disk_repository.delete_object(self._path(user_id, filename))
+
+    async def read_file(self, user_id: str, filename: str) -> bytes | None:
+        """
+        Reads a file from the user's disk.
+
+        Args:
+            user_id (str): The ID of the user.
+            filename (str): The name of the file.
+
+        Returns:
+            bytes | None: The content of the file, or None if the file doesn't exist.
+        """
+        return await self.disk_repository.get_object(self._path(user_id, filename))
+
+    async def read_file_stream(
+        self, user_id: str, filename: str, offset: int | None = None, length: int | None = None
+    ) -> ObjectStream | None:
+        """
+        Opens a streaming download of a file from the user's disk, or of a byte range of it.
+
+        Args:
+            user_id (str): The ID of the user.
+            filename (str): The name of the file.
+            offset (int | None, optional): The offset of the first byte to download. Defaults to the start of the file.
+            length (int | None, optional): The number of bytes to download. Defaults to the rest of the file.
+
+        Returns:
+            ObjectStream | None: The open download, or None if the file doesn't exist.
+        """
+        return await self.disk_repository.get_object_stream(self._path(user_id, filename), offset, length)
+
+    async def get_file_properties(self, user_id: str, filename: str) -> ObjectProperties | None:
+        """
+        Retrieves the properties of a file from the user's disk.
+
+        Args:
+            user_id (str): The ID of the user.
+            filename (str): The name of the file.
+
+        Returns:
+            ObjectProperties | None: The properties of the file, or None if the file doesn't exist.
+        """
+        return await self.disk_repository.get_object_properties(self._path(user_id, filename))
@@ -0,0 +1,92 @@
+from typing import Protocol, AsyncIterator
+from ...libraries.object_storage.models import ObjectProperties, ObjectStream
+
+
+class FileRepositoryProtocol(Protocol):
+    """Interface for managing files stored on users' disks.
+
+    Attributes:
+        deduplicates (bool): Whether files are stored once per distinct content, in which case passing their digest
+            up front lets already stored content be referenced without uploading it again.
+    """
+
+    deduplicates: bool
+
+    async def create_file(
+        self,
+        user_id: str,
+        filename: str,
+        chunks: AsyncIterator[bytes],
+        size: int | None = None,
+        digest: str | None = None,
+    ) -> bool:
+        """Create a file on the user's disk from a stream of chunks.
+
+        Args:
+            user_id (str): The ID of the user.
+            filename (str): The name of the file.
+            chunks (AsyncIterator[bytes]): The content of the file, in order.
+            size (int | None, optional): The size of the file, if known up front. Defaults to None.
+            digest (str | None, optional): The SHA-256 digest of the file in hexadecimal, if known up front.
+                Defaults to None.
+
+        Returns:
+            bool: True if the file was created successfully, False otherwise.
+
+        Raises:
+            FileExistsError: If a file with the same name already exists.
+            QuotaExceededError: If the file does not fit in the space left on the user's disk.
+        """
+        pass
+
+    async def delete_file(self, user_id: str, filename: str) -> bool:
+        """Delete a file from the user's disk.
+
+        Args:
+            user_id (str): The ID of the user.
+            filename (str): The name of the file.
+
+        Returns:
+            bool: True if the file was deleted successfully, False otherwise.
+        """
+        pass
+
+    async def read_file(self, user_id: str, filename: str) -> bytes | None:
+        """Read a file from the user's disk.
+
+        Args:
+            user_id (str): The ID of the user.
+            filename (str): The name of the file.
+
+        Returns:
+            bytes | None: The content of the file, or None if the file doesn't exist.
+        """
+        pass
+
+    async def read_file_stream(
+        self, user_id: str, filename: str, offset: int | None = None, length: int | None = None
+    ) -> ObjectStream | None:
+        """Open a streaming download of a file from the user's disk, or of a byte range of it.
+
+        Args:
+            user_id (str): The ID of the user.
+            filename (str): The name of the file.
+            offset (int | None, optional): The offset of the first byte to download. Defaults to the start of the file.
+            length (int | None, optional): The number of bytes to download. Defaults to the rest of the file.
+
+        Returns:
+            ObjectStream | None: The open download, or None if the file doesn't exist.
+        """
+        pass
+
+    async def get_file_properties(self, user_id: str, filename: str) -> ObjectProperties | None:
+        """Retrieve the properties of a file from the user's disk.
+
+        Args:
+            user_id (str): The ID of the user.
+            filename (str): The name of the file.
+
+        Returns:
+            ObjectProperties | None: The properties of the file, or None if the file doesn't exist.
+        """
+        pass
@@ -0,0 +1,323 @@
+from ...libraries.object_storage.exceptions import InvalidPathError
+from ...libraries.object_storage.object_storage import ObjectStorageProtocol
+from ...libraries.object_storage.paths import is_valid_path
+from ...libraries.cache.ttl_cache import TTLCache
+from ...models.upload_session import UploadSession, UploadSessionStatus
+from ..disk.azure_disk import AzureDiskRepository
+from ..disk.consts import MANGLED
+from ..disk.exceptions import QuotaExceededError
+from .exceptions import IncompleteUploadError
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+from typing import AsyncGenerator
+import asyncio
+import contextlib
+import datetime
+import logging
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_SESSION_TTL = float(os.getenv("UPLOAD_SESSION_TTL", 24 * 60 * 60))
+UPLOAD_SESSION_SWEEP_INTERVAL = float(os.getenv("UPLOAD_SESSION_SWEEP_INTERVAL", 15 * 60))
+UPLOAD_SESSION_CHUNK_SIZE = int(os.getenv("UPLOAD_SESSION_CHUNK_SIZE", 8 * 1024 * 1024))
+UPLOAD_SESSION_MAX_CHUNK_SIZE = int(os.getenv("UPLOAD_SESSION_MAX_CHUNK_SIZE", 16 * 1024 * 1024))
+# Chunks are held in memory until they are staged, so at most this many are received at once in every process.
+UPLOAD_SESSION_CHUNK_CONCURRENCY = int(os.getenv("UPLOAD_SESSION_CHUNK_CONCURRENCY", 8))
+
+
+class AzureUploadSessionRepository:
+    """
+    Manages resumable uploads of files to users' Azure disks.
+
+    Every chunk of an upload is staged as a block of the file's object, and committing the session commits the
+    block list, so chunks are stored exactly once and the file only appears once it is complete. Blocks of a session
+    are named after the session, so sessions for the same file do not overwrite each other's chunks, although
+    committing one discards the blocks of the others.
+
+    Sessions are recorded as objects of the storage, so every process serving the users sees them, and cached in
+    process once read, since they never change. Sessions expire a fixed time after they were created, and a
+    background loop deletes the records of expired sessions and discards their blocks.
+
+    Args:
+        storage (ObjectStorageProtocol): The object storage the disks are stored in.
+        disk_repository (AzureDiskRepository): The disk repository the committed files are accounted in.
+        ttl (float, optional): The number of seconds a session lives for. Defaults to UPLOAD_SESSION_TTL.
+        sweep_interval (float, optional): The number of seconds between two deletions of expired sessions.
+            Defaults to UPLOAD_SESSION_SWEEP_INTERVAL.
+        chunk_size (int, optional): The chunk size of sessions created without one. Defaults to
+            UPLOAD_SESSION_CHUNK_SIZE.
+        max_chunk_size (int, optional): The largest chunk size a session may be created with. Defaults to
+            UPLOAD_SESSION_MAX_CHUNK_SIZE.
+    """
+
+    _sessions = f"{MANGLED}UPLOADS/"
+    _min_chunk_size = 64 * 1024
+    _max_chunk_count = 50000
+
+    def __init__(
+        self,
+        storage: ObjectStorageProtocol,
+        disk_repository: AzureDiskRepository,
+        ttl: float = UPLOAD_SESSION_TTL,
+        sweep_interval: float = UPLOAD_SESSION_SWEEP_INTERVAL,
+        chunk_size: int = UPLOAD_SESSION_CHUNK_SIZE,
+        max_chunk_size: int = UPLOAD_SESSION_MAX_CHUNK_SIZE,
+    ):
+        self.storage = storage
+        self.disk_repository = disk_repository
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.chunk_size = chunk_size
+        self.max_chunk_size = max_chunk_size
+        self._cache: TTLCache[str, UploadSession] = TTLCache("upload_sessions", 1024, 60)
+
+    async def context(self) -> AsyncGenerator[None, None]:
+        """
+        Runs the loop deleting expired sessions for as long as the application is running.
+        """
+        task = asyncio.create_task(self._run())
+        yield
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    @staticmethod
+    def _path(user_id: str, filename: str) -> str:
+        if not is_valid_path(filename) or MANGLED in filename:
+            raise InvalidPathError(filename)
+        return f"{user_id}/{filename}"
+
+    def _record_path(self, session_id: str) -> str:
+        return f"{self._sessions}{session_id}"
+
+    @staticmethod
+    def _block_id(session: UploadSession, index: int) -> str:
+        return f"{session.id}{index:08d}"
+
+    async def create_session(
+        self, user_id: str, filename: str, size: int, chunk_size: int | None = None
+    ) -> UploadSession:
+        """
+        Starts a resumable upload of a file, checking up front that the file does not exist and fits on the disk.
+
+        Args:
+            user_id (str): The ID of the user.
+            filename (str): The name the file is stored under once the session is committed.
+            size (int): The size of the whole file in bytes.
+            chunk_size (int | None, optional): The size of every chunk but the last one in bytes. Defaults to the
+                repository's default chunk size.
+
+        Returns:
+            UploadSession: The created session.
+
+        Raises:
+            ValueError: If the size or the chunk size is out of bounds, or the filename is invalid.
+            FileExistsError: If a file with the same name already exists.
+            QuotaExceededError: If the file does not fit in the space left on the user's disk.
+        """
+        chunk_size = chunk_size or self.chunk_size
+        if size < 0 or not self._min_chunk_size <= chunk_size <= self.max_chunk_size:
+            raise ValueError("Invalid size or chunk size")
+        if -(-size // chunk_size) > self._max_chunk_count:
+            raise ValueError(f"A file may be sent in at most {self._max_chunk_count} chunks")
+
+        path = self._path(user_id, filename)
+        if await self.disk_repository.get_object_properties(path) is not None:
+            raise FileExistsError(path)
+        used_space, total_space = await self.disk_repository.get_used_total_space(user_id)
+        if size > total_space - used_space:
+            raise QuotaExceededError(path)
+
+        created = datetime.datetime.now(tz=datetime.timezone.utc)
+        session = UploadSession(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            filename=filename,
+            size=size,
+            chunk_size=chunk_size,
+            created=created,
+            expires=created + datetime.timedelta(seconds=self.ttl),
+        )
+        await self.storage.create_object(self._record_path(session.id), session.model_dump_json().encode())
+        self._cache.set(session.id, session)
+        return session
+
+    async def _get_session(self, user_id: str, session_id: str) -> UploadSession | None:
+        """
+        Reads a session, from the cache if it was read before.
+
+        Args:
+            user_id (str): The ID of the user the session must belong to.
+            session_id (str): The ID of the session.
+
+        Returns:
+            UploadSession | None: The session, or None if the user has no such session or it expired.
+        """
+        session = self._cache.get(session_id)
+        if session is None:
+            if not session_id.isalnum():
+                return None
+            try:
+                session = await self._read_record(self._record_path(session_id))
+            except ResourceNotFoundError:
+                return None
+            self._cache.set(session_id, session)
+        if session.user_id != user_id or session.expires <= datetime.datetime.now(tz=datetime.timezone.utc):
+            return None
+        return session
+
+    async def _status(self, session: UploadSession) -> UploadSessionStatus:
+        staged = await self.storage.list_staged_blocks(self._path(session.user_id, session.filename))
+        received = []
+        missing = []
+        for index in range(session.chunk_count):
+            if staged.get(self._block_id(session, index)) == session.chunk_length(index):
+                received.append(index)
+            else:
+                missing.append(index)
+        return UploadSessionStatus(session=session, received=received, missing=missing)
+
+    async def get_status(self, user_id: str, session_id: str) -> UploadSessionStatus | None:
+        """
+        Retrieves the progress of a resumable upload from the blocks staged so far.
+
+        Args:
+            user_id (str): The ID of the user.
+            session_id (str): The ID of the session.
+
+        Returns:
+            UploadSessionStatus | None: The progress of the upload, or None if the user has no such session or it
+                expired.
+        """
+        session = await self._get_session(user_id, session_id)
+        if session is None:
+            return None
+        return await self._status(session)
+
+    async def put_chunk(self, user_id: str, session_id: str, index: int, data: bytes) -> bool:
+        """
+        Stages a chunk of a resumable upload as a block of the file's object.
+
+        Args:
+            user_id (str): The ID of the user.
+            session_id (str): The ID of the session.
+            index (int): The number of the chunk, starting from 0.
+            data (bytes): The content of the chunk.
+
+        Returns:
+            bool: True if the chunk was stored, False if the user has no such session or it expired.
+
+        Raises:
+            ValueError: If the number or the size of the chunk does not match the session.
+        """
+        session = await self._get_session(user_id, session_id)
+        if session is None:
+            return False
+        if not 0 <= index < session.chunk_count:
+            raise ValueError(f"The chunk number must be between 0 and {session.chunk_count - 1}")
+        if len(data) != session.chunk_length(index):
+            raise ValueError(f"Chunk {index} must be {session.chunk_length(index)} bytes long")
+        await self.storage.stage_block(
+            self._path(session.user_id, session.filename), self._block_id(session, index), data
+        )
+        return True
+
+    async def commit_session(self, user_id: str, session_id: str) -> bool:
+        """
+        Commits the staged blocks of a resumable upload as the file, charging its size to the disk, and deletes the
+        session.
+
+        Args:
+            user_id (str): The ID of the user.
+            session_id (str): The ID of the session.
+
+        Returns:
+            bool: True if the file was created, False if the user has no such session or an error occurs.
+
+        Raises:
+            IncompleteUploadError: If some of the chunks were not received.
+            FileExistsError: If a file with the same name already exists.
+            QuotaExceededError: If the file does not fit in the space left on the user's disk.
+        """
+        session = await self._get_session(user_id, session_id)
+        if session is None:
+            return False
+        status = await self._status(session)
+        if status.missing:
+            raise IncompleteUploadError(status.missing)
+
+        block_ids = [self._block_id(session, index) for index in range(session.chunk_count)]
+        path = self._path(session.user_id, session.filename)
+        if not await self.disk_repository.commit_object_blocks(path, block_ids, session.size):
+            return False
+        await self._delete_record(session.id)
+        return True
+
+    async def abort_session(self, user_id: str, session_id: str) -> bool:
+        """
+        Ends a resumable upload without creating the file, discarding its staged blocks.
+
+        Args:
+            user_id (str): The ID of the user.
+            session_id (str): The ID of the session.
+
+        Returns:
+            bool: True if the session was ended, False if the user has no such session.
+        """
+        session = await self._get_session(user_id, session_id)
+        if session is None:
+            return False
+        await self._discard(session)
+        await self._delete_record(session.id)
+        return True
+
+    async def expire_sessions(self) -> int:
+        """
+        Deletes every expired session and discards its staged blocks.
+
+        Returns:
+            int: The number of sessions deleted.
+        """
+        expired = 0
+        cutoff = datetime.datetime.now(tz=datetime.timezone.utc) - datetime.timedelta(seconds=self.ttl)
+        async for properties in self.storage.list_object_properties(self._sessions):
+            if properties.last_modified is None or properties.last_modified > cutoff:
+                continue
+            try:
+                session = await self._read_record(properties.name)
+                await self._discard(session)
+                await self.storage.delete_object(properties.name, if_match=properties.etag)
+            except (ResourceNotFoundError, ResourceModifiedError):
+                continue
+            self._cache.invalidate(session.id)
+            expired += 1
+        return expired
+
+    async def _read_record(self, path: str) -> UploadSession:
+        stream = await self.storage.get_object_stream(path)
+        return UploadSession.model_validate_json(b"".join([chunk async for chunk in stream.chunks]))
+
+    async def _discard(self, session: UploadSession) -> None:
+        block_ids = [self._block_id(session, index) for index in range(session.chunk_count)]
+        await self.storage.discard_blocks(self._path(session.user_id, session.filename), block_ids)
+
+    async def _delete_record(self, session_id: str) -> None:
+        self._cache.invalidate(session_id)
+        try:
+            await self.storage.delete_object(self._record_path(session_id))
+        except ResourceNotFoundError:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                expired = await self.expire_sessions()
+            except Exception as e:
+                logger.critical(
+                    {"time": datetime.datetime.now(), "message": "Failed to expire upload sessions", "exception": e}
+                )
+                continue
+            if expired:
+                logger.info({"time": datetime.datetime.now(), "message": "Expired upload sessions", "count": expired})
@@ -0,0 +1,6 @@
+class IncompleteUploadError(Exception):
+    """Raised when an upload session is committed before all of its chunks were received."""
+
+    def __init__(self, missing: list[int]):
+        super().__init__(f"Missing chunks: {missing}")
+        self.missing = missing
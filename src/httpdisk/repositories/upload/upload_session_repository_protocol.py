@@ -0,0 +1,88 @@
+from typing import Protocol
+from ...models.upload_session import UploadSession, UploadSessionStatus
+
+
+class UploadSessionRepositoryProtocol(Protocol):
+    """Interface for managing resumable uploads of files to users' disks."""
+
+    async def create_session(
+        self, user_id: str, filename: str, size: int, chunk_size: int | None = None
+    ) -> UploadSession:
+        """Start a resumable upload of a file.
+
+        Args:
+            user_id (str): The ID of the user.
+            filename (str): The name the file is stored under once the session is committed.
+            size (int): The size of the whole file in bytes.
+            chunk_size (int | None, optional): The size of every chunk but the last one in bytes. Defaults to the
+                repository's default chunk size.
+
+        Returns:
+            UploadSession: The created session.
+
+        Raises:
+            ValueError: If the size or the chunk size is out of bounds.
+            FileExistsError: If a file with the same name already exists.
+            QuotaExceededError: If the file does not fit in the space left on the user's disk.
+        """
+        pass
+
+    async def get_status(self, user_id: str, session_id: str) -> UploadSessionStatus | None:
+        """Retrieve the progress of a resumable upload.
+
+        Args:
+            user_id (str): The ID of the user.
+            session_id (str): The ID of the session.
+
+        Returns:
+            UploadSessionStatus | None: The progress of the upload, or None if the user has no such session or it
+                expired.
+        """
+        pass
+
+    async def put_chunk(self, user_id: str, session_id: str, index: int, data: bytes) -> bool:
+        """Store a chunk of a resumable upload. Chunks may be sent in any order and concurrently, and sending a chunk
+        again replaces it.
+
+        Args:
+            user_id (str): The ID of the user.
+            session_id (str): The ID of the session.
+            index (int): The number of the chunk, starting from 0.
+            data (bytes): The content of the chunk.
+
+        Returns:
+            bool: True if the chunk was stored, False if the user has no such session or it expired.
+
+        Raises:
+            ValueError: If the number or the size of the chunk does not match the session.
+        """
+        pass
+
+    async def commit_session(self, user_id: str, session_id: str) -> bool:
+        """Create the file from the chunks of a resumable upload and end the session.
+
+        Args:
+            user_id (str): The ID of the user.
+            session_id (str): The ID of the session.
+
+        Returns:
+            bool: True if the file was created, False if the user has no such session or an error occurs.
+
+        Raises:
+            IncompleteUploadError: If some of the chunks were not received.
+            FileExistsError: If a file with the same name already exists.
+            QuotaExceededError: If the file does not fit in the space left on the user's disk.
+        """
+        pass
+
+    async def abort_session(self, user_id: str, session_id: str) -> bool:
+        """End a resumable upload without creating the file, discarding its chunks.
+
+        Args:
+            user_id (str): The ID of the user.
+            session_id (str): The ID of the session.
+
+        Returns:
+            bool: True if the session was ended, False if the user has no such session.
+        """
+        pass
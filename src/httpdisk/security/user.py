@@ -1,15 +1,47 @@
 import os
+import time
 from fastapi_sso.sso.base import OpenID
 from fastapi import HTTPException, Security
 from fastapi.security import APIKeyCookie
 from jose import jwt
+from ..libraries.cache.ttl_cache import TTLCache
 
 SECRET_KEY = "<SMAD<MNSA<DNM"
 
-async def get_logged_user(cookie: str = Security(APIKeyCookie(name="token"))) -> OpenID:
-    """Get user's JWT stored in cookie 'token', parse it and return the user's OpenID."""
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 1024))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", 300))
+
+
+class LoggedUser(OpenID):
+    """
+    The OpenID of a logged-in user, whose ID is always known.
+
+    Attributes:
+        id (str): The unique identifier of the user.
+    """
+    id: str
+
+
+_verified_tokens: TTLCache[str, LoggedUser] = TTLCache("verified_tokens", TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
+async def get_logged_user(cookie: str = Security(APIKeyCookie(name="token"))) -> LoggedUser:
+    """
+    Get user's JWT stored in cookie 'token', parse it and return the user's OpenID.
+
+    Verified tokens are cached along with the OpenID built from them, never past the token's expiration. Tokens
+    without a user ID are rejected.
+    """
+    user = _verified_tokens.get(cookie)
+    if user is not None:
+        return user
     try:
         claims = jwt.decode(cookie, key=SECRET_KEY, algorithms=["HS256"])
-        return OpenID(**claims["pld"])
+        user = LoggedUser(**claims["pld"])
     except Exception as error:
-        raise HTTPException(status_code=401, detail="Invalid authentication credentials") from error
\ No newline at end of file
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials") from error
+    ttl = TOKEN_CACHE_TTL
+    if "exp" in claims:
+        ttl = min(ttl, float(claims["exp"]) - time.time())
+    if ttl > 0:
+        _verified_tokens.set(cookie, user, ttl)
+    return user